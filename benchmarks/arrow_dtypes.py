@@ -0,0 +1,62 @@
+"""
+Benchmark of reading STRING and ARRAY columns as Arrow-backed dtypes.
+
+Writes a DataFrame with string and array columns once and reads it with and without `arrow_dtypes`,
+reporting read time, memory of the read DataFrame and the time of its DDL schema.
+
+Usage:
+    python benchmarks/arrow_dtypes.py [rows]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pp_exec_env.schema import (
+    read_arrow_with_schema,
+    read_parquet_with_schema,
+    write_arrow_with_schema,
+    write_parquet_with_schema
+)
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    lengths = np.random.randint(0, 8, rows)
+    values = np.arange(lengths.sum())
+    return pd.DataFrame({
+        "_time": np.arange(rows) * 60,
+        "message": np.array([f"request {idx}" for idx in range(rows)], dtype=object),
+        "values": [part.tolist() for part in np.split(values, np.cumsum(lengths)[:-1])]
+    })
+
+
+def main(rows: int = 1_000_000):
+    df = make_frame(rows)
+    folder = tempfile.mkdtemp()
+    schema_path, data_path = os.path.join(folder, "_SCHEMA"), os.path.join(folder, "data")
+    try:
+        print(f"{rows} rows")
+        for name, write, read in [("parquet", write_parquet_with_schema, read_parquet_with_schema),
+                                  ("arrow", write_arrow_with_schema, read_arrow_with_schema)]:
+            write(df, schema_path, data_path)
+            for arrow_dtypes in (False, True):
+                started = time.perf_counter()
+                result = read(schema_path, data_path, arrow_dtypes=arrow_dtypes)
+                elapsed = time.perf_counter() - started
+                memory = result.memory_usage(deep=True).sum() / 1024 ** 2
+                result.schema._initial_schema = {}  # DDL of the columns, not of the _SCHEMA file
+                started = time.perf_counter()
+                result.schema.ddl
+                ddl_elapsed = time.perf_counter() - started
+                print(f"{name:>8}, arrow dtypes {arrow_dtypes!s:>5}: read {elapsed:.2f}s, {memory:.0f} MB, "
+                      f"DDL {ddl_elapsed * 1000:.1f}ms")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
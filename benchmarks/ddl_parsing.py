@@ -0,0 +1,71 @@
+"""
+Micro-benchmark of DDL parsing and _SCHEMA file reads.
+
+Compares the previous comma split plus per-field regex parser with the single-pass tokenizer,
+both uncached and cached, on a wide schema.
+
+Usage:
+    python benchmarks/ddl_parsing.py [columns]
+"""
+import os
+import re
+import sys
+import tempfile
+import timeit
+
+from pp_exec_env import schema as schema_module
+
+TYPES = ["BIGINT", "DOUBLE", "STRING", "INT", "BOOLEAN", "TIMESTAMP", "ARRAY<STRING>", "DECIMAL(10,2)"]
+LEGACY_FIELD_REGEX = re.compile("^`(.*)?` ([A-Z]+)(<[A-Z]+>)?( NOT NULL)?$")
+
+
+def make_ddl(columns: int) -> str:
+    return ",".join(f"`field_{idx}` {TYPES[idx % len(TYPES)]}" for idx in range(columns))
+
+
+def legacy_ddl_to_pd_schema(ddl: str):
+    schema, ddl_schema = {}, {}
+    for field in schema_module.DECIMAL_REGEX.sub("DOUBLE", ddl).split(","):
+        field_name, field_type, array_type, _ = LEGACY_FIELD_REGEX.match(field).groups()
+        field_name = field_name.replace("``", "`")
+        _field_type = field_type
+        if array_type:
+            field_type = None
+            _field_type = f"{_field_type}{array_type}"
+        schema[field_name] = schema_module.DDL_TO_PANDAS.get(field_type, schema_module.OBJ_TYPE)
+        ddl_schema[field_name] = _field_type
+    return schema, ddl_schema
+
+
+def legacy_read_schema(schema_path: str):
+    with open(schema_path) as file:
+        return legacy_ddl_to_pd_schema(file.read())
+
+
+def uncached_ddl_to_pd_schema(ddl: str):
+    schema_module._parse_ddl.cache_clear()
+    return schema_module.ddl_to_pd_schema(ddl)
+
+
+def main(columns: int = 5000, number: int = 50):
+    ddl = make_ddl(columns)
+    assert legacy_ddl_to_pd_schema(ddl) == schema_module.ddl_to_pd_schema(ddl)
+
+    with tempfile.TemporaryDirectory() as directory:
+        schema_path = os.path.join(directory, "_SCHEMA")
+        with open(schema_path, "w") as file:
+            file.write(ddl)
+
+        def bench(function, *args):
+            return timeit.timeit(lambda: function(*args), number=number) / number * 1000
+
+        print(f"{columns} columns, {len(ddl)} characters")
+        print(f"legacy parse:       {bench(legacy_ddl_to_pd_schema, ddl):.2f} ms")
+        print(f"tokenizer parse:    {bench(uncached_ddl_to_pd_schema, ddl):.2f} ms")
+        print(f"cached parse:       {bench(schema_module.ddl_to_pd_schema, ddl):.2f} ms")
+        print(f"legacy read_schema: {bench(legacy_read_schema, schema_path):.2f} ms")
+        print(f"cached read_schema: {bench(schema_module.read_schema, schema_path):.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
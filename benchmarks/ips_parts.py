@@ -0,0 +1,55 @@
+"""
+Benchmark of single-file and partitioned parquet results in the InterProcessing Storage.
+
+Writes and reads the same DataFrame as a single `data` file and as datasets of part files
+written and read by several threads.
+
+Usage:
+    python benchmarks/ips_parts.py [rows] [part_rows] [workers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pp_exec_env.schema import read_parquet_with_schema, write_parquet_with_schema
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "_time": np.arange(rows) * 60,
+        "value": np.random.rand(rows),
+        "host": np.array([f"host{idx % 100}" for idx in range(rows)], dtype=object)
+    })
+
+
+def measure(df: pd.DataFrame, folder: str, **kwargs):
+    schema_path, data_path = os.path.join(folder, "_SCHEMA"), os.path.join(folder, "data")
+    started = time.perf_counter()
+    write_parquet_with_schema(df, schema_path, data_path, **kwargs)
+    written = time.perf_counter()
+    read_parquet_with_schema(schema_path, data_path)
+    return written - started, time.perf_counter() - written
+
+
+def main(rows: int = 5_000_000, part_rows: int = 500_000, workers: int = 4):
+    df = make_frame(rows)
+    folder = tempfile.mkdtemp()
+    try:
+        print(f"{rows} rows, {os.cpu_count()} CPUs")
+        for name, kwargs in [("single file", {}),
+                             (f"{part_rows} rows per part", {"part_rows": part_rows, "workers": workers}),
+                             ("partitioned by day", {"partition_by": "_time", "partition_interval": 86400,
+                                                     "workers": workers})]:
+            write, read = measure(df, folder, **kwargs)
+            print(f"{name:>24}: write {write:.2f}s, read {read:.2f}s")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
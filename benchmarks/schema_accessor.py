@@ -0,0 +1,47 @@
+"""
+Micro-benchmark of SchemaAccessor overhead.
+
+Measures the cost of creating the accessor for a new DataFrame (e.g. when a command calls `add_special_ddl`
+on an intermediate DataFrame) and the cost of the first and repeated `ddl` requests.
+
+Usage:
+    python benchmarks/schema_accessor.py [columns] [rows]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+import pp_exec_env  # noqa: F401, registers the accessor
+
+
+def make_frame(columns: int, rows: int) -> pd.DataFrame:
+    data = {}
+    for idx in range(columns):
+        if idx % 2:
+            data[f"c{idx}"] = np.arange(rows)
+        else:
+            data[f"c{idx}"] = np.array([f"value{i}" for i in range(rows)], dtype=object)
+    return pd.DataFrame(data)
+
+
+def main(columns: int = 2000, rows: int = 1000, number: int = 10):
+    df = make_frame(columns, rows)
+
+    def new_accessor():
+        df.copy(deep=False).schema.add_special_ddl("c0", "STRING")
+
+    def first_ddl():
+        df.copy(deep=False).schema.ddl  # noqa
+
+    df.schema.ddl  # noqa, warm up the cache of the original DataFrame
+
+    print(f"{columns} columns, {rows} rows")
+    print(f"accessor creation: {timeit.timeit(new_accessor, number=number) / number * 1000:.2f} ms")
+    print(f"first ddl:         {timeit.timeit(first_ddl, number=number) / number * 1000:.2f} ms")
+    print(f"repeated ddl:      {timeit.timeit(lambda: df.schema.ddl, number=number) / number * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,58 @@
+"""
+Benchmark of reading low-cardinality STRING columns as `category`.
+
+Writes a log-shaped DataFrame once and reads it with and without dictionary encoding
+of STRING columns, reporting read time and memory of the read DataFrame.
+
+Usage:
+    python benchmarks/string_dictionary.py [rows] [max_ratio]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pp_exec_env.schema import (
+    read_arrow_with_schema,
+    read_parquet_with_schema,
+    write_arrow_with_schema,
+    write_parquet_with_schema
+)
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    hosts = np.array([f"host-{idx:03d}.example.com" for idx in range(200)], dtype=object)
+    statuses = np.array(["200", "301", "404", "500"], dtype=object)
+    return pd.DataFrame({
+        "_time": np.arange(rows) * 60,
+        "host": hosts[np.random.randint(0, len(hosts), rows)],
+        "status": statuses[np.random.randint(0, len(statuses), rows)],
+        "message": np.array([f"request {idx}" for idx in range(rows)], dtype=object)
+    })
+
+
+def main(rows: int = 2_000_000, max_ratio: float = 0.5):
+    df = make_frame(rows)
+    folder = tempfile.mkdtemp()
+    schema_path, data_path = os.path.join(folder, "_SCHEMA"), os.path.join(folder, "data")
+    try:
+        print(f"{rows} rows")
+        for name, write, read in [("parquet", write_parquet_with_schema, read_parquet_with_schema),
+                                  ("arrow", write_arrow_with_schema, read_arrow_with_schema)]:
+            write(df, schema_path, data_path)
+            for ratio in (0, max_ratio):
+                started = time.perf_counter()
+                result = read(schema_path, data_path, dictionary_ratio=ratio)
+                elapsed = time.perf_counter() - started
+                memory = result.memory_usage(deep=True).sum() / 1024 ** 2
+                print(f"{name:>8}, dictionary ratio {ratio}: read {elapsed:.2f}s, {memory:.0f} MB")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, float), sys.argv[1:])))
@@ -1,5 +1,6 @@
-from pp_exec_env.dataframe import SchemaAccessor
 from pp_exec_env.config import load_config
 
 
 config = load_config()
+
+from pp_exec_env.dataframe import SchemaAccessor  # Uses config, so it is imported after it is loaded
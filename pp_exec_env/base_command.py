@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from typing import Optional, Set
 
 import execution_environment.base_command as eebc
 import pandas as pd
@@ -18,6 +19,12 @@ class BaseCommand(eebc.BaseCommand):
     Each Command should also define a `transform` method that takes
     a pd.DataFrame as its only argument and returns a pd.DataFrame.
     Inside transform developer is free to define any transformations with the given DataFrame.
+
+    Optionally, a Command may define `required_columns` method, so that
+    only the columns it actually uses are read from the InterProcessing Storage.
+    Reads are narrowed only if every command after `sys_read_interproc` in the pipeline defines it,
+    the system commands that write results require all the columns.
+    Otherwise columns are read only through the explicit `columns` keyword of `sys_read_interproc`.
     """
     @property
     @abstractmethod
@@ -27,3 +34,20 @@ class BaseCommand(eebc.BaseCommand):
     @abstractmethod
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         pass
+
+    def required_columns(self, output_columns: Optional[Set[str]]) -> Optional[Set[str]]:
+        """
+        Get the columns of the input DataFrame that are required to produce the given output columns.
+        CommandExecutor uses it to read only the required columns from the InterProcessing Storage.
+
+        The default implementation is conservative: the Command may use any column of its input.
+        E.g. a Command that adds column `b` computed from column `a` would return
+        `None if output_columns is None else (output_columns - {"b"}) | {"a"}`.
+
+        Args:
+            output_columns: Columns of the output DataFrame that are used by the rest of the pipeline.
+                            None means that all of them are used.
+        Returns:
+            A set of required input columns. None means that all of them are required.
+        """
+        return None
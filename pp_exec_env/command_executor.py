@@ -1,27 +1,173 @@
 import configparser
 import importlib.util
+import json
 import logging
 import os
 import sys
-from typing import Dict, List, Type, Callable
+import threading
+import time
+import tracemalloc
+from collections.abc import MutableMapping
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from types import ModuleType
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type, Callable
 
 import execution_environment.command_executor as eece
 import pandas as pd
 from threadpoolctl import threadpool_limits
 
 from pp_exec_env import config
-from pp_exec_env.base_command import BaseCommand
+from pp_exec_env.base_command import BaseCommand, Syntax
+from pp_exec_env.dataframe import share_frame
+from pp_exec_env.manifest import MANIFEST_FILE, PluginManifest, plugin_signature
+from pp_exec_env.profiling import CommandProfiler, MemoryWatchdog, format_step, process_rss, total_time, traced_peaks
 from pp_exec_env.sys_commands import (
     SysWriteResultCommand,
     SysWriteInterProcCommand,
     SysReadInterProcCommand,
+    WrittenFrame,
+    interproc_stats,
     LPP, SPP, IPS
 )
+from pp_exec_env.writer import BackgroundWriter
 
 FOLLOW_LINKS = config["plugins"]["follow_symlinks"]
+LAZY_LOADING = config.getboolean("plugins", "lazy_loading")
+MANIFEST = config.getboolean("plugins", "manifest")
+MANIFEST_PATH = config["plugins"]["manifest_path"]  # Empty means MANIFEST_FILE in the commands directory
+HOT_RELOAD = config.getboolean("plugins", "hot_reload")
+HOT_RELOAD_INTERVAL = config.getfloat("plugins", "hot_reload_interval")  # Seconds between checks
+PROFILING = config.getboolean("profiling", "enabled")
+PROFILING_MEMORY = config["profiling"]["memory"]
+PROFILING_SAMPLE_SIZE = config.getint("profiling", "memory_sample_size")
+PROFILING_PROGRESS = config.getboolean("profiling", "progress")
+MEMORY_BUDGET = config.getint("memory", "job_budget_mb") * 1024 * 1024  # 0 means no budget
+MEMORY_BUDGET_INTERVAL = config.getfloat("memory", "job_budget_interval")  # Seconds between RSS samples
+TRACEMALLOC_SAMPLE_RATE = config.getfloat("memory", "tracemalloc_sample_rate")
+TRACEMALLOC_FRAMES = config.getint("memory", "tracemalloc_frames")
+SUBSEARCH_WORKERS = config.getint("subsearch", "workers")  # 1 means sequential evaluation by the commands
+SUBSEARCH_DEDUPLICATION = config.getboolean("subsearch", "deduplication")
 SYS_WRITE_RESULT = config["system_commands"]["sys_write_result_name"]
 SYS_WRITE_IPS = config["system_commands"]["sys_write_interproc_name"]
 SYS_READ_IPS = config["system_commands"]["sys_read_interproc_name"]
+PROJECTION_PUSHDOWN = config.getboolean("system_commands", "projection_pushdown")
+INTERPROC_HANDOFF = config.getboolean("system_commands", "interproc_handoff")
+ASYNC_WRITES = config.getboolean("system_commands", "async_writes")
+
+
+class CommandRegistry(MutableMapping):
+    """
+    Dictionary of command names and their classes, where user commands can be registered lazily.
+    A lazy command is registered by its plugin path and is imported on the first access by its name,
+    so import errors of a plugin surface only when the plugin is used.
+    Iterating over the names does not import anything, while `values` and `items` import every lazy command.
+
+    Example Usage:
+
+    >>> registry = CommandRegistry({"a": int}, loader=lambda name, path: float)
+    >>> registry.register({"b": "/path/to/b"})
+    >>> sorted(registry), registry.is_loaded("b")
+    (['a', 'b'], False)
+    >>> registry["b"], registry.is_loaded("b")
+    (<class 'float'>, True)
+    """
+
+    def __init__(self, classes: Optional[Dict[str, Type[BaseCommand]]] = None,
+                 loader: Callable[[str, str], Optional[Type[BaseCommand]]] = None):
+        """
+        Args:
+            classes: Dictionary of already imported command classes.
+            loader: Function that imports a command class given its name and plugin path.
+                    It returns None if the plugin has to be ignored.
+        """
+        self._classes = dict(classes or {})
+        self._paths: Dict[str, str] = {}  # Plugin paths of lazy commands, kept after they are imported
+        self._loader = loader
+        self._lock = threading.RLock()
+
+    def register(self, paths: Dict[str, str]):
+        """
+        Register lazy commands.
+
+        Args:
+            paths: Dictionary with command names as keys and plugin paths as values.
+        """
+        with self._lock:
+            for name, path in paths.items():
+                self._classes.pop(name, None)
+                self._paths[name] = path
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._classes
+
+    def plugin_path(self, name: str) -> Optional[str]:
+        """
+        Get the plugin path of a lazy command or None if the command was not registered as lazy.
+        """
+        return self._paths.get(name)
+
+    def reload(self, name: str, cls: Type[BaseCommand]):
+        """
+        Replace the class of an imported lazy command, keeping its plugin path.
+        """
+        with self._lock:
+            if name not in self._paths:
+                raise KeyError(name)
+            self._classes[name] = cls
+
+    def load_all(self):
+        """
+        Import all lazy commands.
+        """
+        for name in list(self._paths):
+            self.get(name)
+
+    def __getitem__(self, name: str) -> Type[BaseCommand]:
+        if name in self._classes:
+            return self._classes[name]
+
+        with self._lock:
+            if name in self._classes:  # Imported by another thread
+                return self._classes[name]
+            cls = self._loader(name, self._paths[name])  # Import errors are raised, the plugin stays registered
+            if cls is None:
+                del self._paths[name]
+                raise KeyError(name)
+            self._classes[name] = cls
+            return cls
+
+    def __setitem__(self, name: str, cls: Type[BaseCommand]):
+        with self._lock:
+            self._paths.pop(name, None)
+            self._classes[name] = cls
+
+    def __delitem__(self, name: str):
+        with self._lock:
+            if self._paths.pop(name, None) is None:
+                del self._classes[name]
+            else:
+                self._classes.pop(name, None)
+
+    def __contains__(self, name) -> bool:
+        return name in self._classes or name in self._paths
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._classes) + [name for name in self._paths if name not in self._classes])
+
+    def __len__(self) -> int:
+        return len(self._classes) + sum(name not in self._classes for name in self._paths)
+
+    def values(self):
+        self.load_all()
+        return self._classes.values()
+
+    def items(self):
+        self.load_all()
+        return self._classes.items()
+
+    def __repr__(self) -> str:
+        lazy = sorted(name for name in self._paths if name not in self._classes)
+        return f"{type(self).__name__}({self._classes}, lazy={lazy})"
 
 
 class CommandExecutor(eece.CommandExecutor):
@@ -30,24 +176,59 @@ class CommandExecutor(eece.CommandExecutor):
     This should be used by a Worker of Python Computing Node in order to execute PostProcessing commands.
 
     Attributes:
-        command_classes: a dictionary of command name and their classes
+        command_classes: a `CommandRegistry` of command names and their classes
+        manifest: `PluginManifest` used to get the syntax of user commands without importing them, or None
+        commands_directory: Path to the folder that contains plugins
+        profile: List of step profiles of the last job, including subsearches. See `pp_exec_env.profiling`
         progress_message: Function for Worker-Server IPC logging
-        current_depth: Subsearch depth in the current state of CommandExecutor
+        current_depth: Subsearch depth in the current state of CommandExecutor, tracked per thread
     """
 
     logger = logging.getLogger(config["logging"]["base_logger"])
 
+    @property
+    def current_depth(self) -> int:
+        return getattr(self._local, "depth", 0)
+
+    @current_depth.setter
+    def current_depth(self, depth: int):
+        self._local.depth = depth
+
     def __init__(self, storages: dict[str, str], commands_directory: str, progress_message: Callable):
         self.logger.info("Initialization started")
+        self._local = threading.local()  # Subsearches can be evaluated by several threads
+        self._subsearch_uses: Dict[str, int] = {}  # Remaining uses of each distinct subsearch of the current job
+        self._subsearch_results: Dict[str, Tuple] = {}  # Evaluated subsearches: (DataFrame, seconds, times served)
+        self._subsearch_lock = threading.Lock()
+
         self.logger.info("Importing system commands")
-        self.command_classes = self._import_sys_commands(local_storage=storages[LPP],
-                                                         shared_storage=storages[SPP],
-                                                         ips=storages[IPS])
+        self.command_classes = CommandRegistry(self._import_sys_commands(local_storage=storages[LPP],
+                                                                         shared_storage=storages[SPP],
+                                                                         ips=storages[IPS]),
+                                               loader=self._import_user_command)
         self.progress_message = progress_message
         self.current_depth = 0  # Initial Subsearch depth.
-
-        self.logger.info("Importing user commands")
-        self.command_classes.update(self._import_user_commands(commands_directory))
+        self.profile: List[Dict] = []
+        self._job_rss = None  # Process RSS at the start of the current job
+        self._watchdog: Optional[MemoryWatchdog] = None  # Enforces the memory budget of the current job
+        self.writer = BackgroundWriter()  # Background writes of storage commands, see `ASYNC_WRITES`
+
+        self.commands_directory = commands_directory
+        self.manifest = None
+        if MANIFEST:
+            self.manifest = PluginManifest(MANIFEST_PATH or os.path.join(commands_directory, MANIFEST_FILE))
+
+        self.logger.info("Discovering user commands")
+        plugin_paths = self._discover_user_commands(commands_directory)
+        self.command_classes.register(plugin_paths)
+        if not LAZY_LOADING:
+            self.logger.info("Importing user commands")
+            self.command_classes.load_all()
+
+        self._plugin_signatures = {}  # Plugin files state, used for hot reload
+        self._last_reload_check = time.monotonic()
+        if HOT_RELOAD:
+            self._plugin_signatures = {name: plugin_signature(path) for name, path in plugin_paths.items()}
 
         self.logger.info("Initialization finished")
 
@@ -114,49 +295,583 @@ class CommandExecutor(eece.CommandExecutor):
         """
         command_classes = {}
 
+        for name, path in CommandExecutor._discover_user_commands(commands_directory, follow_links).items():
+            cls = CommandExecutor._import_user_command(name, path)
+            if cls is not None:
+                command_classes[name] = cls
+
+        return command_classes
+
+    @staticmethod
+    def _discover_user_commands(commands_directory: str, follow_links: bool = FOLLOW_LINKS) -> Dict[str, str]:
+        """
+        Find user-defined commands in the given folder without importing them.
+        See `_import_user_commands` for the rules applied to the plugins.
+
+        Args:
+            commands_directory: Path to the folder that contains plugins.
+            follow_links: If True, symbolic links will be treated as plugins as well.
+        Returns:
+            A dictionary with command names as keys and plugin paths as values
+
+        Example Usage:
+
+        >>> from pp_exec_env.command_executor import CommandExecutor
+        >>> import os
+        >>> CommandExecutor._discover_user_commands(os.path.join(os.curdir, "tests", "resources", "commands"),
+        ...                                         follow_links=False)
+        {'join': './tests/resources/commands/join', 'sum': './tests/resources/commands/sum'}
+        """
+        paths = {}
+
         for name in sorted(os.listdir(commands_directory)):
+            if name.startswith(MANIFEST_FILE):  # The manifest and its temporary files
+                continue
             path = os.path.join(commands_directory, name)
 
             link_bool = (not os.path.islink(path)) or follow_links  # Either not a link or links are allowed
-            if os.path.isdir(path) and link_bool and os.path.exists(init_path := os.path.join(path, '__init__.py')):
-                spec = importlib.util.spec_from_file_location(name, init_path)
-                module = importlib.util.module_from_spec(spec)
-                sys.modules[spec.name] = module
-                spec.loader.exec_module(module)
-                sys.modules.pop(spec.name)
-
-                if module.__dict__.get('__all__', None) is None or not module.__all__:  # Existence and emptiness
-                    CommandExecutor.logger.warning(f"Plugin {name} ignored, __all__ is empty or not found")
+            if os.path.isdir(path) and link_bool and os.path.exists(os.path.join(path, '__init__.py')):
+                if name in [SYS_READ_IPS, SYS_WRITE_IPS, SYS_WRITE_RESULT]:
+                    CommandExecutor.logger.warning(f"Plugin {name} ignored, cannot redefine system command")
                     continue
+                paths[name] = path
+            else:
+                CommandExecutor.logger.warning(f"Plugin {name} ignored, either not a folder or no __init__.py")
 
-                cls_name = module.__all__[0]
-                cls: Type[BaseCommand] = module.__getattribute__(cls_name)
-                if cls in [SYS_READ_IPS, SYS_WRITE_IPS, SYS_WRITE_RESULT]:
-                    CommandExecutor.logger.warning(f"Plugin {name} ignored, cannot redefine system command")
+        return paths
+
+    @staticmethod
+    def _import_user_command(name: str, path: str) -> Optional[Type[BaseCommand]]:
+        """
+        Import a user-defined command from its plugin folder and read its config.ini.
+
+        Args:
+            name: Command name.
+            path: Path to the plugin folder.
+        Returns:
+            The command class or None if the plugin is ignored.
+        """
+        spec = importlib.util.spec_from_file_location(name, os.path.join(path, '__init__.py'))
+        module = importlib.util.module_from_spec(spec)
+        shadowed = CommandExecutor._pop_modules(name)  # E.g. a library of the same name
+        sys.modules[spec.name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            CommandExecutor.logger.error(f"Failed to import plugin {name}")
+            raise
+        finally:
+            CommandExecutor._pop_modules(name)  # The plugin and its submodules, so that a reload imports them again
+            sys.modules.update(shadowed)
+
+        if module.__dict__.get('__all__', None) is None or not module.__all__:  # Existence and emptiness
+            CommandExecutor.logger.warning(f"Plugin {name} ignored, __all__ is empty or not found")
+            return None
+
+        cls_name = module.__all__[0]
+        cls: Type[BaseCommand] = module.__getattribute__(cls_name)
+
+        config_path = os.path.join(path, "config.ini")
+        files = None
+        try:
+            files = cls.config.read(config_path)
+        except configparser.ParsingError as e:
+            CommandExecutor.logger.warning(f"Ignoring config file of {cls_name} plugin ({config_path})")
+            CommandExecutor.logger.warning(e.message)
+            files = None
+        finally:
+            if files:
+                CommandExecutor.logger.warning(f"Loaded config file for {cls_name}")
+
+        CommandExecutor.logger.info(f"Added command {cls_name} with name `{name}`")
+        return cls
+
+    @staticmethod
+    def _pop_modules(name: str) -> Dict[str, ModuleType]:
+        """
+        Remove a package and all of its submodules from sys.modules.
+
+        Args:
+            name: Name of the package.
+        Returns:
+            A dictionary of the removed modules.
+
+        Example Usage:
+
+        >>> import sys, json
+        >>> modules = CommandExecutor._pop_modules("json")
+        >>> sorted(modules)
+        ['json', 'json.decoder', 'json.encoder', 'json.scanner']
+        >>> "json" in sys.modules
+        False
+        >>> sys.modules.update(modules)
+        """
+        prefix = f"{name}."
+        names = [module for module in sys.modules if module == name or module.startswith(prefix)]
+        return {module: sys.modules.pop(module) for module in names}
+
+    def reload_user_commands(self, force: bool = False):
+        """
+        Re-import user commands whose plugin files have changed, register new plugins and remove deleted ones.
+        Plugins are checked by modification times and sizes of their source files.
+        Imported commands are re-imported with their config.ini right away and swapped in `command_classes`;
+        if the new version fails to import, the old one is kept.
+        Commands that were not imported yet are left lazy.
+
+        Args:
+            force: Check the plugins even if `hot_reload_interval` has not passed since the last check.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_reload_check < HOT_RELOAD_INTERVAL:
+            return
+        self._last_reload_check = now
+
+        plugin_paths = self._discover_user_commands(self.commands_directory)
+        for name in set(self._plugin_signatures) - set(plugin_paths):
+            self.logger.info(f"Plugin {name} was removed")
+            self._plugin_signatures.pop(name)
+            if name in self.command_classes:
+                del self.command_classes[name]
+
+        for name, path in plugin_paths.items():
+            signature = plugin_signature(path)
+            if self._plugin_signatures.get(name) == signature:
+                continue
+            is_new = name not in self._plugin_signatures
+            self._plugin_signatures[name] = signature
+
+            if is_new or not self.command_classes.is_loaded(name):
+                self.logger.info(f"Plugin {name} was {'added' if is_new else 'changed'}")
+                self.command_classes.register({name: path})
+                continue
+
+            self.logger.info(f"Plugin {name} was changed, reloading")
+            try:
+                cls = self._import_user_command(name, path)
+            except Exception:
+                self.logger.exception(f"Plugin {name} was not reloaded, the previous version is used")
+                continue
+            if cls is None:
+                del self.command_classes[name]
+            else:
+                self.command_classes.reload(name, cls)
+
+    def get_command_syntax(self) -> Dict[str, Syntax]:
+        """
+        Get the syntax of every command.
+        Syntax of lazy user commands is taken from the manifest, a command is imported only if its entry
+        is missing or outdated, and the manifest is updated then.
+
+        Returns:
+            A dictionary with command names as keys and `Syntax` as values.
+        """
+        if self.manifest is None:
+            return super().get_command_syntax()
+
+        syntax = {}
+        for name in self.command_classes:
+            path = self.command_classes.plugin_path(name)
+            if path is None or self.command_classes.is_loaded(name):  # Imported classes are the source of truth
+                syntax[name] = self.command_classes[name].syntax
+                continue
+
+            command_syntax = self.manifest.get_syntax(name, path)
+            if command_syntax is None:
+                cls = self.command_classes.get(name)
+                if cls is None:  # Ignored plugin
                     continue
+                self.manifest.update(name, path, cls)
+                command_syntax = cls.syntax
+            syntax[name] = command_syntax
 
-                config_path = os.path.join(path, "config.ini")
-                files = None
-                try:
-                    files = cls.config.read(config_path)
-                except configparser.ParsingError as e:
-                    CommandExecutor.logger.warning(f"Ignoring config file of {cls_name} plugin ({config_path})")
-                    CommandExecutor.logger.warning(e.message)
-                    files = None
-                finally:
-                    if files:
-                        CommandExecutor.logger.warning(f"Loaded config file for {cls_name}")
+        self.manifest.save()
+        return syntax
 
-                command_classes[name] = cls
-                CommandExecutor.logger.info(f"Added command {cls_name} with name `{name}`")
+    def _check_memory_budget(self, command_name: str, idx: int):
+        """
+        Fail the job if the process RSS grew by more than `job_budget_mb` since the job started,
+        now or at any sample of the watchdog.
+
+        Args:
+            command_name: Name of the command that is about to run or has just finished.
+            idx: Index of the command in its pipeline.
+        """
+        if not MEMORY_BUDGET or self._job_rss is None:
+            return
+        rss = process_rss()
+        if self._watchdog is not None and self._watchdog.rss is not None:  # A peak while the command ran
+            rss = max(rss or 0, self._watchdog.rss)
+        if rss is not None and rss - self._job_rss > MEMORY_BUDGET:
+            raise MemoryError(f"Command {command_name} (#{idx}) exceeded the job memory budget of "
+                              f"{MEMORY_BUDGET // 1024 // 1024} MB: "
+                              f"process RSS grew by {(rss - self._job_rss) // 1024 // 1024} MB")
+
+    @staticmethod
+    def _find_subsearches(command: Dict) -> List[List[Dict]]:
+        """
+        Get the subsearch arguments of a serialized command.
+
+        Args:
+            command: Dictionary with serialized OTL command.
+        Returns:
+            A list of subsearches, each one is a list of serialized commands.
+
+        Example Usage:
+
+        >>> subsearch = [{"name": "sys_read_interproc", "arguments": {}}]
+        >>> CommandExecutor._find_subsearches({"name": "join", "arguments": {
+        ...     "field": [{"value": "a", "arg_type": "arg"}], "jdf": [{"value": subsearch, "arg_type": "subsearch"}]}})
+        [[{'name': 'sys_read_interproc', 'arguments': {}}]]
+        """
+        return [argument["value"]
+                for values in command.get("arguments", {}).values() for argument in values
+                if argument.get("arg_type") == "subsearch" and isinstance(argument.get("value"), list)]
+
+    @classmethod
+    def _has_writes(cls, commands: List[Dict]) -> bool:
+        """
+        Check if serialized commands or their subsearches write to a storage.
+
+        Example Usage:
+
+        >>> write = {"name": SYS_WRITE_IPS, "arguments": {}}
+        >>> join = {"name": "join", "arguments": {"jdf": [{"value": [write], "arg_type": "subsearch"}]}}
+        >>> CommandExecutor._has_writes([join])
+        True
+        >>> CommandExecutor._has_writes([{"name": SYS_READ_IPS, "arguments": {}}])
+        False
+        """
+        return any(command["name"] in (SYS_WRITE_IPS, SYS_WRITE_RESULT)
+                   or any(cls._has_writes(subsearch) for subsearch in cls._find_subsearches(command))
+                   for command in commands)
+
+    @staticmethod
+    def _subsearch_key(commands: List[Dict]) -> str:
+        """
+        Canonical form of serialized commands, the same for equal commands regardless of the key order.
+
+        Example Usage:
+
+        >>> CommandExecutor._subsearch_key([{"name": "a", "arguments": {"y": [], "x": []}}])
+        '[{"arguments": {"x": [], "y": []}, "name": "a"}]'
+        """
+        return json.dumps(commands, sort_keys=True, default=str)
+
+    @staticmethod
+    def _count_subsearches(commands: List[Dict]) -> Dict[str, int]:
+        """
+        Count uses of each distinct subsearch in a job, including nested ones.
+        Subsearches nested into a repeated subsearch are counted once, since it is evaluated once.
+
+        Args:
+            commands: List of dictionaries each containing serialized OTL commands.
+        Returns:
+            A dictionary with canonical subsearches as keys and the numbers of their uses as values.
+
+        Example Usage:
+
+        >>> inner = [{"name": "read", "arguments": {}}]
+        >>> outer = [{"name": "join", "arguments": {"jdf": [{"value": inner, "arg_type": "subsearch"}]}}]
+        >>> job = [{"name": "join", "arguments": {"jdf": [{"value": outer, "arg_type": "subsearch"}]}},
+        ...        {"name": "join", "arguments": {"jdf": [{"value": outer, "arg_type": "subsearch"}]}}]
+        >>> sorted(CommandExecutor._count_subsearches(job).values())
+        [1, 2]
+        """
+        uses = {}
+        pipelines = [commands]
+        while pipelines:
+            for command in pipelines.pop():
+                for subsearch in CommandExecutor._find_subsearches(command):
+                    key = CommandExecutor._subsearch_key(subsearch)
+                    uses[key] = uses.get(key, 0) + 1
+                    if uses[key] == 1:
+                        pipelines.append(subsearch)
+        return uses
+
+    def _put_subsearch(self, key: str, df: pd.DataFrame, cost: float):
+        """
+        Keep an evaluated subsearch until all of its uses in the job take it.
+        """
+        with self._subsearch_lock:
+            self._subsearch_results[key] = (df, cost, 0)
+
+    def _forget_subsearches(self):
+        """
+        Drop evaluated subsearches after a command wrote data, since they could have read the old data.
+        Their later uses evaluate them again.
+        """
+        with self._subsearch_lock:
+            if self._subsearch_results:
+                self.logger.debug(f"{len(self._subsearch_results)} evaluated subsearches dropped after a write")
+                self._subsearch_results.clear()
+
+    def _take_subsearch(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Take an evaluated subsearch for one of its uses.
+        Every use but the last one gets a copy made with `share_frame`, the last one gets the DataFrame itself.
+        Uses after the first one are reported as deduplicated in the profile of the step that takes them.
+
+        Args:
+            key: Canonical subsearch, see `_subsearch_key`.
+        Returns:
+            The DataFrame or None if the subsearch was not evaluated.
+        """
+        with self._subsearch_lock:
+            result = self._subsearch_results.get(key, None)
+            if result is None:
+                return None
+            df, cost, served = result
+            remaining = self._subsearch_uses.get(key, 1) - 1
+            self._subsearch_uses[key] = remaining
+            last = remaining <= 0 or not SUBSEARCH_DEDUPLICATION
+            if last:
+                del self._subsearch_results[key]
             else:
-                CommandExecutor.logger.warning(f"Plugin {name} ignored, either not a folder or no __init__.py")
+                self._subsearch_results[key] = (df, cost, served + 1)
+
+        if served:
+            self.logger.info(f"Subsearch is reused, {cost:.3f}s saved")
+            steps = getattr(self._local, "steps", None)
+            if steps:  # The step that asked for the subsearch
+                steps[-1]["reused_subsearches"] = steps[-1].get("reused_subsearches", 0) + 1
+                steps[-1]["reused_time"] = steps[-1].get("reused_time", 0.0) + cost
+        return df if last else share_frame(df)
+
+    def _evaluate_subsearch(self, commands: List[Dict], platform_envs: Optional[Dict],
+                            depth: int) -> Tuple[pd.DataFrame, float]:
+        """
+        Evaluate a subsearch at the given depth in the current thread and keep the result for its uses.
 
-        return command_classes
+        Returns:
+            The DataFrame and evaluation time in seconds.
+        """
+        self.current_depth = depth
+        started = time.perf_counter()
+        try:
+            df = self._execute(commands, platform_envs)
+        finally:
+            self.current_depth = 0
+        cost = time.perf_counter() - started
+        self._put_subsearch(self._subsearch_key(commands), df, cost)
+        return df, cost
+
+    def _prefetch_subsearches(self, command: Dict, platform_envs: Optional[Dict]):
+        """
+        Evaluate subsearches of a command concurrently before its transformation.
+        When the command asks GetArg for a subsearch, `execute` returns the evaluated DataFrame.
+        Nothing is done if the command has less than two subsearches that are not evaluated yet,
+        concurrency is disabled or any of the subsearches writes data, since another one may read it.
+
+        If any subsearch fails, subsearches that did not start are cancelled and the first error
+        in the order of the arguments is raised after the running ones finish.
+
+        Args:
+            command: Dictionary with serialized OTL command.
+            platform_envs: Dictionary with platform environment variables.
+        """
+        subsearches = {}
+        for commands in self._find_subsearches(command):
+            key = self._subsearch_key(commands)
+            if key not in self._subsearch_results:
+                subsearches[key] = commands
+        if len(subsearches) < 2 or SUBSEARCH_WORKERS < 2:
+            return
+        if any(self._has_writes(commands) for commands in subsearches.values()):
+            self.logger.info(f"Subsearches of {command['name']} write data, they are evaluated sequentially")
+            return
+
+        depth = self.current_depth + 1
+        workers = min(SUBSEARCH_WORKERS, len(subsearches))
+        self.logger.info(f"Evaluating {len(subsearches)} subsearches of {command['name']} with {workers} workers")
+
+        with ThreadPoolExecutor(workers, thread_name_prefix="subsearch") as pool:
+            futures = [pool.submit(self._evaluate_subsearch, commands, platform_envs, depth)
+                       for commands in subsearches.values()]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            for future in futures:
+                future.cancel()  # Does nothing to finished or running ones
+
+        for future in futures:
+            if not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+
+    def _create_command(self, command: Dict, idx: int, pipeline_len: int, platform_envs: Dict) -> BaseCommand:
+        """
+        Create an instance of a command from its serialized form.
+
+        Args:
+            command: Dictionary with serialized OTL command.
+            idx: Index of the command in the pipeline.
+            pipeline_len: Length of the pipeline.
+            platform_envs: Dictionary with platform environment variables.
+        Returns:
+            An instance of the command class.
+        """
+        command_name = command['name']
+        command_cls = self.command_classes[command_name]
+        get_arg = eece.GetArg(self, command['arguments'])
+        log_progress = self.get_command_progress_logger(command_name, idx, pipeline_len)
+
+        command = command_cls(get_arg, log_progress, platform_envs)
+        command.logger = self.logger.getChild(f"command.{command_name}")  # Not a part of the interface
+        if ASYNC_WRITES and isinstance(command, (SysWriteResultCommand, SysWriteInterProcCommand,
+                                                 SysReadInterProcCommand)):
+            command.writer = self.writer
+        return command
+
+    @staticmethod
+    def _infer_projections(commands: List[BaseCommand]):
+        """
+        Find out which columns each `SysReadInterProcCommand` has to read.
+        The pipeline is walked backwards and each command reports the columns of its input it requires,
+        given the columns of its output required by the rest of the pipeline.
+
+        Args:
+            commands: List of command instances in the pipeline order.
+        """
+        required = None  # The result of the pipeline is written as a whole
+        for command in reversed(commands):
+            if isinstance(command, SysReadInterProcCommand):
+                command.projection = required
+            required = command.required_columns(required)
+            if required is not None:
+                required = set(required)
+
+    @staticmethod
+    def _link_interproc_writes(commands: List[BaseCommand]):
+        """
+        Find `SysReadInterProcCommand` steps that read a path written by `SysWriteInterProcCommand`
+        earlier in the same pipeline, so that they are served from the written DataFrame instead of the files.
+        The write still happens, other processes may read the path.
+
+        Args:
+            commands: List of command instances in the pipeline order.
+        """
+        writes = []  # Each write with the reads of its path that follow it
+        last_writes = {}  # Path -> the last write of the path so far
+        for command in commands:
+            if isinstance(command, SysWriteInterProcCommand):
+                writes.append((command, []))
+                last_writes[os.path.normpath(command.get_arg("path").value)] = writes[-1]
+            elif isinstance(command, SysReadInterProcCommand):
+                write = last_writes.get(os.path.normpath(command.get_arg("path").value))
+                if write is not None:
+                    write[1].append(command)
+
+        for writer, readers in writes:
+            if readers:
+                writer.written = WrittenFrame(reads=len(readers))
+                for reader in readers:
+                    reader.written = writer.written
+
+    @staticmethod
+    def _argument_value(command: Dict, name: str) -> Any:
+        """
+        Get the value of a plain argument of a serialized command without evaluating it.
+
+        Example Usage:
+
+        >>> CommandExecutor._argument_value({"name": "a", "arguments": {"path": [{"value": "x"}]}}, "path")
+        'x'
+        """
+        values = command.get("arguments", {}).get(name)
+        return values[0].get("value") if values else None
+
+    def _command_class_name(self, name: str) -> str:
+        """
+        Get the full name of a command class, from the manifest if the command is not imported yet.
+        """
+        path = self.command_classes.plugin_path(name)
+        if path is not None and not self.command_classes.is_loaded(name) and self.manifest is not None:
+            entry = self.manifest.get_entry(name, path)
+            if entry is not None:
+                return entry["class"]
+        cls = self.command_classes[name]
+        return f"{cls.__module__}.{cls.__qualname__}"
+
+    def explain(self, commands: List[Dict]) -> Dict:
+        """
+        Describe how a list of serialized OTL commands would be executed, without executing it.
+        Nothing is imported if the plugin manifest is up to date, and no data is read:
+        inputs of `SysReadInterProcCommand` are described with `interproc_stats`.
+
+        The plan is a dictionary with the following keys:
+        `steps` - a list with a dictionary per command: `command`, `index`, `depth`, `class`,
+        `subsearches` (a plan per subsearch argument), `input` for reads of the InterProcessing Storage
+        and `error` if the command is unknown, cannot be imported or its input is missing;
+        `read_rows` and `read_bytes` - totals of the inputs with a known size, subsearches included.
+        Inputs written earlier in the same pipeline are served from memory and are not counted,
+        neither are subsearches that are evaluated once per job already.
+
+        Args:
+            commands: List of dictionaries each containing serialized OTL commands.
+        Returns:
+            The plan.
+
+        For example usage consider looking at tests.
+        """
+        return self._explain_pipeline(commands, 0, set())
+
+    def _explain_pipeline(self, commands: List[Dict], depth: int, evaluated: Set[str]) -> Dict:
+        """
+        Plan of a job or a subsearch at the given depth. `evaluated` holds the keys of the subsearches seen so far.
+        """
+        plan = {"steps": [], "read_rows": 0, "read_bytes": 0}
+        written = set()  # Paths written earlier in the pipeline
+
+        for idx, command in enumerate(commands):
+            name = command["name"]
+            step = {"command": name, "index": idx, "depth": depth, "class": None, "subsearches": []}
+            plan["steps"].append(step)
+            try:
+                step["class"] = self._command_class_name(name)
+            except KeyError:
+                step["error"] = f"Unknown command {name}"
+            except Exception as e:  # Broken plugin
+                step["error"] = f"Command {name} cannot be imported: {e!r}"
+
+            for subsearch in self._find_subsearches(command):
+                key = self._subsearch_key(subsearch)
+                subplan = self._explain_pipeline(subsearch, depth + 1, evaluated)
+                if SUBSEARCH_DEDUPLICATION and key in evaluated:
+                    subplan["reused"] = True
+                else:
+                    plan["read_rows"] += subplan["read_rows"]
+                    plan["read_bytes"] += subplan["read_bytes"]
+                evaluated.add(key)
+                step["subsearches"].append(subplan)
+
+            if name == SYS_WRITE_IPS:
+                written.add(os.path.normpath(str(self._argument_value(command, "path"))))
+            elif name == SYS_READ_IPS:
+                path = os.path.normpath(str(self._argument_value(command, "path")))
+                columns = self._argument_value(command, "columns")
+                if columns:
+                    columns = {column.strip() for column in columns.split(",") if column.strip()}
+                if INTERPROC_HANDOFF and path in written:
+                    step["input"] = {"path": path, "format": "memory"}
+                    continue
+                try:
+                    step["input"] = interproc_stats(SysReadInterProcCommand.ips_path, path, columns or None)
+                except (ValueError, OSError) as e:
+                    step["error"] = str(e)
+                    continue
+                step["input"]["filter"] = self._argument_value(command, "filter")
+                plan["read_rows"] += step["input"]["rows"] or 0
+                plan["read_bytes"] += step["input"]["bytes"]
+        return plan
 
     def execute(self, commands: List[Dict], platform_envs: Dict = None) -> pd.DataFrame:
         """
         Execute a list of serialized OTL commands.
+        Profile of each step is stored in `profile` attribute.
+        The job fails with MemoryError naming the command that made the process grow over the memory budget.
+        The process RSS is sampled every `job_budget_interval` seconds while the commands run
+        and checked before and after each command.
+        Background writes of the job are finished before it returns and their errors are raised.
+
+        Each distinct subsearch of a job is evaluated once, repeated uses get copies of the result.
+        Uses after a write command evaluate the subsearch again, since it may read the written data.
 
         Args:
             commands: List of dictionaries each containing serialized OTL commands.
@@ -165,28 +880,114 @@ class CommandExecutor(eece.CommandExecutor):
 
         For example usage consider looking at tests.
         """
+        if self.current_depth > 0:  # A subsearch, it may be evaluated already
+            key = self._subsearch_key(commands)
+            df = self._take_subsearch(key)
+            if df is None:
+                started = time.perf_counter()
+                df = self._execute(commands, platform_envs)
+                self._put_subsearch(key, df, time.perf_counter() - started)
+                df = self._take_subsearch(key)
+            return df
+        return self._execute(commands, platform_envs)
+
+    def _execute(self, commands: List[Dict], platform_envs: Dict = None) -> pd.DataFrame:
+        """
+        Execute a job or a subsearch without looking for evaluated subsearches. See `execute`.
+        """
         self.logger.info("Execution started")
+        tracing = False
+        if self.current_depth == 0:  # A new job, not a subsearch
+            self.profile = []
+            self._subsearch_results.clear()
+            self._subsearch_uses = self._count_subsearches(commands)
+            if HOT_RELOAD:  # Plugins are not reloaded in the middle of a job
+                self.reload_user_commands()
+            self._job_rss = process_rss()
+            if MEMORY_BUDGET:
+                self._watchdog = MemoryWatchdog(MEMORY_BUDGET, MEMORY_BUDGET_INTERVAL).start(self._job_rss)
+            tracing = PROFILING and traced_peaks(TRACEMALLOC_SAMPLE_RATE, TRACEMALLOC_FRAMES)
+
+        try:
+            df = self._execute_pipeline(commands, platform_envs)
+            if self.current_depth == 0 and self.writer.pending:
+                started = time.perf_counter()
+                self.writer.wait()  # Errors of background writes fail the job
+                self.logger.debug(f"Waited {time.perf_counter() - started:.3f}s for background writes")
+            if self.current_depth == 0 and PROFILING:
+                self.logger.info(f"Job finished: {len(commands)} commands in {total_time(self.profile):.3f}s")
+            return df
+        except BaseException:
+            if self.current_depth == 0:
+                self.writer.discard()
+            raise
+        finally:
+            if tracing:
+                tracemalloc.stop()
+            if self.current_depth == 0 and self._watchdog is not None:
+                self._watchdog.stop()
+                self._watchdog = None
+            if self.current_depth == 0:
+                self._subsearch_results.clear()  # Subsearches that were not used
+                if SysReadInterProcCommand.cache is not None:
+                    self.logger.debug(f"InterProcessing Storage cache: {SysReadInterProcCommand.cache.stats()}")
+                if SysReadInterProcCommand.shared is not None:
+                    self.logger.debug(f"Shared memory: {SysReadInterProcCommand.shared.stats()}")
+
+    def _execute_pipeline(self, commands: List[Dict], platform_envs: Dict = None) -> pd.DataFrame:
+        """
+        Create the commands of a pipeline and run their transformations one by one. See `execute`.
+        """
         df = pd.DataFrame()
         pipeline_len = len(commands)
 
         with threadpool_limits(limits=config.getint("threadpoolctl", "thread_limit"),
                                user_api=config["threadpoolctl"]["user_api"]):
-            for idx, command in enumerate(commands):
-                arguments = command['arguments']
-                command_name = command['name']
+            steps = [(command['name'], self._create_command(command, idx, pipeline_len, platform_envs))
+                     for idx, command in enumerate(commands)]
+            if PROJECTION_PUSHDOWN:
+                self._infer_projections([command for _, command in steps])
+            if INTERPROC_HANDOFF:
+                self._link_interproc_writes([command for _, command in steps])
+
+            if getattr(self._local, "steps", None) is None:
+                self._local.steps = []
+            running_steps = self._local.steps  # Steps of this thread, the last one is asking for subsearches
+
+            for idx, (command_name, command) in enumerate(steps):
                 self.logger.info(f"Command {command_name} in progress...")
 
-                command_cls = self.command_classes[command_name]
-                get_arg = eece.GetArg(self, arguments)
-                log_progress = self.get_command_progress_logger(command_name, idx, pipeline_len)
-
-                command = command_cls(get_arg, log_progress, platform_envs)
-                command.logger = self.logger.getChild(f"command.{command_name}")  # Not a part of the interface
+                profiler = None
+                if PROFILING:
+                    profiler = CommandProfiler(command_name, idx, self.current_depth,
+                                               PROFILING_MEMORY, PROFILING_SAMPLE_SIZE)
+                    self.profile.append(profiler.start(df))  # Appended before subsearches to keep the order
+                    running_steps.append(profiler.step)
 
-                df = command.transform(df)
+                try:
+                    self._prefetch_subsearches(commands[idx], platform_envs)
+                    self._check_memory_budget(command_name, idx)  # Subsearches may have exceeded it
+                    df = command.transform(df)
+                except BaseException:
+                    if profiler is not None:
+                        profiler.cancel()
+                    raise
+                finally:
+                    if profiler is not None:
+                        running_steps.pop()
 
                 if not isinstance(df, pd.DataFrame):
                     raise ValueError("You're doing something spooky, command must return a DataFrame")
+                if command_name in (SYS_WRITE_IPS, SYS_WRITE_RESULT):
+                    self._forget_subsearches()
+
+                if profiler is not None:
+                    message = format_step(profiler.stop(df))
+                    self.logger.info(message)
+                    if PROFILING_PROGRESS:
+                        self.get_command_progress_logger(command_name, idx, pipeline_len)(message)
+
+                self._check_memory_budget(command_name, idx)
         return df
 
 
@@ -13,6 +13,23 @@ sys_write_result_name = sys_write_result
 local_storage_alias = local_post_processing
 shared_storage_alias = shared_post_processing
 interproc_storage_alias = interproc_storage
+projection_pushdown = yes
+interproc_handoff = yes
+async_writes = no
+ips_part_rows = 0
+ips_write_workers = 4
+ips_format = parquet
+arrow_compression = uncompressed
+jsonl_read_chunk_size = 0
+jsonl_write_chunk_size = 0
+jsonl_write_workers = 1
+
+[schema]
+inference_mode = first
+inference_sample_size = 100
+string_dictionary = no
+string_dictionary_max_ratio = 0.5
+arrow_dtypes = no
 
 [threadpoolctl]
 thread_limit = 2
@@ -20,6 +37,38 @@ user_api = blas
 
 [plugins]
 follow_symlinks = yes
+lazy_loading = yes
+manifest = yes
+manifest_path =
+hot_reload = no
+hot_reload_interval = 0
+
+[profiling]
+enabled = yes
+memory = shallow
+memory_sample_size = 1000
+progress = no
+
+[memory]
+job_budget_mb = 0
+job_budget_interval = 0.1
+tracemalloc_sample_rate = 0
+tracemalloc_frames = 1
+
+[subsearch]
+workers = 1
+deduplication = yes
+
+[ips_cache]
+enabled = no
+max_size_mb = 1024
+memory = sample
+
+[shared_memory]
+enabled = no
+path = /dev/shm/pp_exec_env
+ttl = 600
+max_size_mb = 4096
 
 [logging]
 base_logger = exec_env
@@ -1,9 +1,24 @@
-from typing import Dict
+import weakref
+from itertools import chain, islice
+from typing import Dict, Hashable
 
 import numpy as np
 import pandas as pd
 
-from pp_exec_env.schema import PANDAS_TO_DDL, OBJ_TYPE, PYTHON_TO_DDL, DDL_TO_PANDAS
+from pp_exec_env import config
+from pp_exec_env.schema import (
+    ARROW_DTYPE,
+    PANDAS_TO_DDL,
+    OBJ_TYPE,
+    PYTHON_TO_DDL,
+    DDL_TO_PANDAS,
+    INFERRED_TO_DDL,
+    arrow_to_ddl,
+    ddl_to_arrow_type
+)
+
+INFERENCE_MODE = config["schema"]["inference_mode"]
+INFERENCE_SAMPLE_SIZE = config.getint("schema", "inference_sample_size")
 
 
 @pd.api.extensions.register_dataframe_accessor("schema")
@@ -19,16 +34,41 @@ class SchemaAccessor:
     Additionally, it allows to modify the automatically generated DDL.
 
     Note:\n
-    When the DataFrame object is first created, SchemaAccessor saves its initial schema
+    When the schema of the DataFrame is first requested, SchemaAccessor saves it as initial schema
     and then uses it in order to reduce the amount of casting in DDL.
     In other words, if possible, types that were given to the DataFrame initially
-    will be preserved.
+    will be preserved. Readers of the storages set the initial schema explicitly from _SCHEMA file.
+    The schema is not computed at all for DataFrames that never reach a write command.
+
+    DDL types are cached per column. Object columns are recomputed only when the column is
+    replaced or its dtype changes, in-place modification of the values does not invalidate the cache.
+    `category` columns have the DDL type of their categories, so that dictionary-encoded STRING columns stay STRING.
+    Arrow-backed columns (`pd.ArrowDtype`) have the DDL type of their Arrow type, their values are never inspected.
+
+    Type of object columns is inferred according to `inference_mode`:
+    `first` uses the first not null value, `sample` uses up to `inference_sample_size`
+    evenly spaced values, so that empty arrays at the beginning of the column are not a problem.
     """
+    inference_mode = INFERENCE_MODE
+    inference_sample_size = INFERENCE_SAMPLE_SIZE
+
     def __init__(self, pandas_obj):
         self._obj: pd.DataFrame = pandas_obj
         self._specials = {}
-        self._initial_schema = {}  # So that the next line works correctly
-        self._initial_schema = self.schema
+        self._ddl_cache = {}  # Field -> (column token, DDL type)
+        self._ddl_string_cache = (None, None)  # (schema, DDL string)
+        self._initial_schema_value = None  # Captured on the first request of the schema
+
+    @property
+    def _initial_schema(self) -> Dict[str, str]:
+        if self._initial_schema_value is None:
+            self.schema  # Captures the initial schema
+        return self._initial_schema_value
+
+    @_initial_schema.setter
+    def _initial_schema(self, initial_schema: Dict[str, str]):
+        self._initial_schema_value = initial_schema
+        self._ddl_cache = {}  # DDL types depend on the initial schema
 
     @property
     def specials(self):
@@ -78,7 +118,25 @@ class SchemaAccessor:
         'LONG'
         >>> df.schema.get_dll_type("a", "int32")
         'INTEGER'
+        >>> df.schema.get_dll_type("a", pd.CategoricalDtype(["x", "y"]))
+        'STRING'
+        >>> import pyarrow as pa
+        >>> df.schema.get_dll_type("a", pd.ArrowDtype(pa.list_(pa.float32())))
+        'ARRAY<FLOAT>'
         """
+        if ARROW_DTYPE is not None and isinstance(dtype, ARROW_DTYPE):
+            initial_ddl = self._initial_schema.get(field, None)
+            if initial_ddl is not None and ddl_to_arrow_type(initial_ddl) == dtype.pyarrow_dtype:
+                return initial_ddl  # E.g. ARRAY<BIGINT> instead of ARRAY<LONG>
+            ddl_type = arrow_to_ddl(dtype.pyarrow_dtype)
+            if not ddl_type:
+                raise TypeError(f"Unsupported Arrow type \"{dtype.pyarrow_dtype}\" at column \"{field}\"")
+            return ddl_type
+        if isinstance(dtype, pd.CategoricalDtype):  # E.g. dictionary-encoded STRING columns, typed by categories
+            categories = dtype.categories
+            if categories.dtype == OBJ_TYPE:
+                return INFERRED_TO_DDL.get(pd.api.types.infer_dtype(categories, skipna=True), "STRING")
+            return self.get_dll_type(field, categories.dtype)
         if dtype != OBJ_TYPE:
             if isinstance(dtype, np.dtype):
                 dtype = dtype.type
@@ -87,6 +145,10 @@ class SchemaAccessor:
                 raise TypeError(f"Unsupported Pandas type \"{dtype}\" at column \"{field}\"")
             return ddl_type
         else:
+            if self.inference_mode == "sample":
+                ddl_type = self._sample_ddl_type(field)
+                if ddl_type is not None:
+                    return ddl_type
             # The first not NaN in the DataFrame
             # It's done through a mask so must be fast
             idx = self._obj[field].first_valid_index()
@@ -118,6 +180,52 @@ class SchemaAccessor:
                 # raise TypeError(f"Could not determine type of the column \"{field}\"")
                 return 'STRING'
 
+    def _sample_ddl_type(self, field: str):
+        """
+        Infer Spark DDL type of an object column from an evenly spaced sample of its values.
+        Cost depends only on `inference_sample_size`, not on the amount of rows.
+
+        Args:
+            field: Target field name.
+        Returns:
+            Spark DDL type string or None if there are no values in the sample.
+
+        Example Usage:
+
+        >>> import pandas as pd
+        >>> SchemaAccessor.inference_mode = "sample"
+        >>> df = pd.DataFrame({"a": [[], None, [1, 2], [3]], "b": [None, "x", None, "y"]})
+        >>> df.schema.ddl
+        '`a` ARRAY<LONG>,`b` STRING'
+        >>> SchemaAccessor.inference_mode = INFERENCE_MODE
+        """
+        column = self._obj[field]
+        positions = np.unique(np.linspace(0, len(column) - 1, num=min(len(column), self.inference_sample_size),
+                                          dtype=np.int64))
+        sample = column.iloc[positions]
+        values = sample[sample.notna()].tolist()
+        if not values:
+            return None
+
+        arrays = [value for value in values if isinstance(value, (list, tuple, np.ndarray))]
+        if not arrays:
+            return "STRING"  # Same as for the first value: strings and unknown objects
+
+        dtypes = {value.dtype for value in arrays if isinstance(value, np.ndarray)}
+        if len(dtypes) == 1 and len(arrays) == sum(isinstance(value, np.ndarray) for value in arrays):
+            sub_value_ddl_type = PANDAS_TO_DDL.get(dtypes.pop().type, None)
+            if sub_value_ddl_type:
+                return f"ARRAY<{sub_value_ddl_type}>"
+
+        elements = list(islice(chain.from_iterable(arrays), self.inference_sample_size))
+        if not elements:  # All arrays in the sample are empty
+            initial_ddl = self._initial_schema.get(field, None)
+            if initial_ddl is not None and initial_ddl.startswith("ARRAY"):
+                return initial_ddl
+            return "ARRAY<STRING>"
+        inferred = pd.api.types.infer_dtype(elements, skipna=True)
+        return f"ARRAY<{INFERRED_TO_DDL.get(inferred, 'STRING')}>"
+
     @property
     def schema(self) -> Dict[str, str]:
         """
@@ -137,17 +245,50 @@ class SchemaAccessor:
         >>> df.schema.schema
         {'a': 'LONG', 'b': 'LONG', 'c': 'LONG'}
         """
+        capture = self._initial_schema_value is None
+        if capture:
+            self._initial_schema_value = {}  # Nothing to avoid casting to yet
+
         schema = {**self._specials}  # Fancy way to copy, to avoid dealing with references
-        fields = (filter(lambda x: x[0] not in self._specials.keys(), self._obj.dtypes.to_dict().items()))
-        for field, dtype in fields:
-            schema[field] = self.get_dll_type(field, dtype)
-            # Now look for downcast on numpy types and try to remove as much of it, as possible
-            if isinstance(dtype, np.dtype):
-                initial_ddl = self._initial_schema.get(field, None)
-                if initial_ddl is not None and DDL_TO_PANDAS.get(initial_ddl, None) == dtype.name:
-                    schema[field] = initial_ddl
+        cache = {}
+        for field, dtype in self._obj.dtypes.items():
+            if field in self._specials:
+                continue
+            token = self._column_token(field, dtype)
+            cached = self._ddl_cache.get(field, None)
+            if cached is not None and cached[0] == token:
+                ddl_type = cached[1]
+            else:
+                ddl_type = self.get_dll_type(field, dtype)
+                # Now look for downcast on numpy types and try to remove as much of it, as possible
+                if isinstance(dtype, np.dtype):
+                    initial_ddl = self._initial_schema.get(field, None)
+                    if initial_ddl is not None and DDL_TO_PANDAS.get(initial_ddl, None) == dtype.name:
+                        ddl_type = initial_ddl
+            schema[field] = ddl_type
+            cache[field] = (token, ddl_type)
+        self._ddl_cache = cache  # Columns that are gone are dropped from the cache
+        if capture:
+            # Cached types stay valid, since the initial schema is equal to them
+            self._initial_schema_value = {**schema}
         return schema
 
+    def _column_token(self, field: str, dtype) -> Hashable:
+        """
+        Get a cheap token that changes when DDL type of the column may change.
+        DDL type of an object column depends on its values, so the array that owns them is a part of the token.
+        It is held by a weak reference: a token of a freed array is not equal to any other one,
+        even if a new array is allocated at the same address. The address and the shape of the column
+        tell apart columns of the same 2D block.
+        """
+        if dtype != OBJ_TYPE:
+            return dtype
+        values = self._obj[field].to_numpy()
+        owner = values
+        while isinstance(owner.base, np.ndarray):
+            owner = owner.base
+        return dtype, weakref.ref(owner), values.__array_interface__["data"][0], values.shape
+
     @property
     def ddl(self):
         """
@@ -164,13 +305,59 @@ class SchemaAccessor:
         >>> df.schema.ddl
         '`a` LONG,`b` LONG,`c` LONG'
         """
+        schema = self.schema
+        cached_schema, cached_ddl = self._ddl_string_cache
+        if cached_schema == schema:
+            return cached_ddl
+
         ddl = []
-        for field, ddl_type in self.schema.items():
+        for field, ddl_type in schema.items():
             if not isinstance(field, str):
                 field = str(field)
             field = field.replace('`', '``')  # escape backtick
             ddl.append(f"`{field}` {ddl_type}")
-        return ','.join(ddl)
+        ddl = ','.join(ddl)
+        self._ddl_string_cache = (schema, ddl)
+        return ddl
+
+
+def copy_on_write_enabled() -> bool:
+    """
+    Check if Pandas Copy-on-Write mode is enabled. It is not available before Pandas 1.5.
+    """
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+def share_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get a copy of the DataFrame that can be handed to another consumer, e.g. a command that uses the same subsearch.
+    With Copy-on-Write enabled the copy is shallow and the data is copied only if it is modified,
+    otherwise the copy is deep, so that consumers do not see modifications of each other.
+    Initial schema and special DDL types are kept.
+
+    Args:
+        df: Target pd.DataFrame.
+    Returns:
+        A copy of the DataFrame.
+
+    Example Usage:
+
+    >>> df = pd.DataFrame({"a": [1, 2]})
+    >>> df.schema.add_special_ddl("a", "BIGINT")
+    >>> shared = share_frame(df)
+    >>> shared.loc[0, "a"] = 5
+    >>> df["a"].tolist(), shared.schema.ddl
+    ([1, 2], '`a` BIGINT')
+    """
+    copy = df.copy(deep=not copy_on_write_enabled())
+    if df.schema._initial_schema_value is not None:
+        copy.schema._initial_schema = {**df.schema._initial_schema_value}
+    for field, ddl_type in df.schema.specials.items():
+        copy.schema.add_special_ddl(field, ddl_type)
+    return copy
 
 
 if __name__ == "__main__":
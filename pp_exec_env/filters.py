@@ -0,0 +1,178 @@
+import ast
+import operator
+from typing import Any, Callable, Set
+
+import pandas as pd
+import pyarrow.dataset as ds
+
+COMPARISONS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge
+}
+
+# Used when a literal is on the left side of a comparison
+SWAPPED_COMPARISONS = {
+    ast.Eq: ast.Eq,
+    ast.NotEq: ast.NotEq,
+    ast.Lt: ast.Gt,
+    ast.LtE: ast.GtE,
+    ast.Gt: ast.Lt,
+    ast.GtE: ast.LtE
+}
+
+
+def parse_filter(expression: str) -> ast.Expression:
+    """
+    Parse filter expression.
+    The expression uses Python syntax, but only the following is allowed:
+    field names, literals, comparisons, `in` and `not in` with a list of literals, `and`, `or`, `not`.
+    Comparison with None checks for nulls.
+
+    Args:
+        expression: Filter expression string, e.g. `_time >= 1644423843 and host == "a"`.
+    Returns:
+        Parsed expression tree.
+
+    Example Usage:
+
+    >>> parse_filter("_time >= 1644423843 and host == 'a'")
+    <...Expression object at ...>
+    >>> parse_filter("__import__('os')")
+    Traceback (most recent call last):
+    ...
+    ValueError: Unsupported filter expression: __import__('os')
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid filter expression: {expression}") from e
+
+    allowed = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.Compare,
+               ast.Name, ast.Load, ast.Constant, ast.List, ast.Tuple, ast.In, ast.NotIn, *COMPARISONS.keys())
+    for node in ast.walk(tree):
+        if not isinstance(node, allowed):
+            raise ValueError(f"Unsupported filter expression: {expression}")
+    return tree
+
+
+def filter_columns(expression: str) -> Set[str]:
+    """
+    Get the set of columns used in the filter expression.
+
+    Example Usage:
+
+    >>> sorted(filter_columns("_time >= 1644423843 and host in ['a', 'b']"))
+    ['_time', 'host']
+    """
+    return {node.id for node in ast.walk(parse_filter(expression)) if isinstance(node, ast.Name)}
+
+
+def _literal(node: ast.AST) -> Any:
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and isinstance(node.operand, ast.Constant):
+        return -node.operand.value
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_literal(element) for element in node.elts]
+    raise ValueError(f"Expected a literal in filter expression, got: {ast.unparse(node)}")
+
+
+def _compile(node: ast.AST, field: Callable[[str], Any], is_null: Callable[[Any], Any]) -> Any:
+    """
+    Compile parsed filter expression with the given field factory.
+    Both pyarrow.dataset expressions and pd.Series support the same operators,
+    so the same code is used for both of them.
+    """
+    if isinstance(node, ast.Expression):
+        return _compile(node.body, field, is_null)
+
+    if isinstance(node, ast.BoolOp):
+        op = operator.and_ if isinstance(node.op, ast.And) else operator.or_
+        result = _compile(node.values[0], field, is_null)
+        for value in node.values[1:]:
+            result = op(result, _compile(value, field, is_null))
+        return result
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ~_compile(node.operand, field, is_null)
+
+    if isinstance(node, ast.Compare):
+        result = None
+        left = node.left
+        for op, right in zip(node.ops, node.comparators):  # Chained comparisons, e.g. 1 < x < 5
+            if isinstance(left, ast.Name):
+                name, value, op_type = left.id, right, type(op)
+            elif isinstance(right, ast.Name):
+                name, value, op_type = right.id, left, SWAPPED_COMPARISONS.get(type(op), None)
+            else:
+                raise ValueError(f"Comparison must include a field: {ast.unparse(node)}")
+            if op_type is None:
+                raise ValueError(f"Field must be on the left side of `in`: {ast.unparse(node)}")
+
+            value = _literal(value)
+            if op_type in (ast.In, ast.NotIn):
+                condition = field(name).isin(value)
+                if op_type is ast.NotIn:
+                    condition = ~condition
+            elif value is None and op_type in (ast.Eq, ast.NotEq):
+                condition = is_null(field(name))
+                if op_type is ast.NotEq:
+                    condition = ~condition
+            else:
+                condition = COMPARISONS[op_type](field(name), value)
+
+            result = condition if result is None else result & condition
+            left = right
+        return result
+
+    raise ValueError(f"Unsupported filter expression: {ast.unparse(node)}")
+
+
+def to_arrow_expression(expression: str) -> ds.Expression:
+    """
+    Convert filter expression to pyarrow.dataset expression.
+    Such expression can be pushed down to parquet reader, so that row groups are skipped using statistics.
+
+    Args:
+        expression: Filter expression string. See `parse_filter`.
+    Returns:
+        A pyarrow.dataset.Expression.
+
+    Example Usage:
+
+    >>> print(to_arrow_expression("_time >= 1644423843 and not host == None"))
+    ((_time >= 1644423843) and invert(is_null(host...)))
+    """
+    return _compile(parse_filter(expression), ds.field, lambda f: f.is_null())
+
+
+def to_pandas_mask(expression: str, df: pd.DataFrame) -> pd.Series:
+    """
+    Evaluate filter expression on a DataFrame. Nulls are treated as False, the same way Arrow does.
+
+    Args:
+        expression: Filter expression string. See `parse_filter`.
+        df: Target pd.DataFrame.
+    Returns:
+        A boolean pd.Series.
+
+    Example Usage:
+
+    >>> import pandas as pd
+    >>> df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", None, "z"]})
+    >>> to_pandas_mask("a > 1 and not b == None", df).tolist()
+    [False, False, True]
+    >>> to_pandas_mask("1 < a <= 3 and b in ('x', 'y')", df).tolist()
+    [False, False, False]
+    """
+    mask = _compile(parse_filter(expression), lambda name: df[name], lambda f: f.isna())
+    return mask.fillna(False).astype(bool)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
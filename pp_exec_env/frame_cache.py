@@ -0,0 +1,164 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Tuple
+
+import pandas as pd
+
+from pp_exec_env.dataframe import share_frame
+from pp_exec_env.profiling import frame_memory
+
+
+def file_state(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Modification time and size of a file, None if it does not exist.
+    For a folder, e.g. a dataset of part files, the latest modification time and the total size of its files.
+
+    Example Usage:
+
+    >>> file_state("/nonexistent") is None
+    True
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    if not os.path.isdir(path):
+        return stat.st_mtime_ns, stat.st_size
+
+    mtime, size = stat.st_mtime_ns, 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                entry_stat = entry.stat()
+                mtime, size = max(mtime, entry_stat.st_mtime_ns), size + entry_stat.st_size
+    return mtime, size
+
+
+def frame_key(storage_path: str, files: Iterable[str], columns: Optional[Iterable[str]] = None,
+              filters: Optional[str] = None) -> Tuple:
+    """
+    Cache key of a DataFrame read from a storage folder.
+    The key changes whenever any of the files is rewritten, so that stale entries are never returned.
+
+    Args:
+        storage_path: Path to the folder with data and schema files.
+        files: Names of the files in the folder the DataFrame is read from.
+        columns: Columns that were read, None means all columns.
+        filters: Filter expression that was applied.
+    Returns:
+        A hashable key.
+
+    Example Usage:
+
+    >>> frame_key("/nonexistent", ["data", "_SCHEMA"], columns=["b", "a"])
+    ('/nonexistent', (('data', None), ('_SCHEMA', None)), ('a', 'b'), None)
+    """
+    storage_path = os.path.abspath(storage_path)
+    states = tuple((file, file_state(os.path.join(storage_path, file))) for file in files)
+    return storage_path, states, None if columns is None else tuple(sorted(columns)), filters
+
+
+class FrameCache:
+    """
+    LRU cache of DataFrames bounded by their total size in bytes.
+    Frames are handed out as copies made by `share_frame`, so that consumers cannot modify the cached frame:
+    with Copy-on-Write enabled such copies are shallow, otherwise they are deep.
+    A frame larger than the whole cache is not cached.
+
+    Example Usage:
+
+    >>> cache = FrameCache(max_bytes=1024 * 1024)
+    >>> key = ("/ips/result/parquet", (), None, None)
+    >>> cache.get(key) is None
+    True
+    >>> df = cache.put(key, pd.DataFrame({"a": [1, 2]}))
+    >>> df.loc[0, "a"] = 5
+    >>> cache.get(key)["a"].tolist()
+    [1, 2]
+    >>> cache.stats()
+    {'hits': 1, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': ...}
+    >>> cache.invalidate("/ips/result")
+    >>> cache.stats()["entries"]
+    0
+    """
+
+    def __init__(self, max_bytes: int, memory_mode: str = "sample"):
+        """
+        Args:
+            max_bytes: Maximum total size of cached frames.
+            memory_mode: How the size of a frame is measured, see `pp_exec_env.profiling.frame_memory`.
+        """
+        self.max_bytes = max_bytes
+        self.memory_mode = memory_mode
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        """
+        Get a copy of the cached frame or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return share_frame(entry[0])
+
+    def put(self, key: Hashable, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Cache a frame, evicting the least recently used ones if the cache is full.
+
+        Returns:
+            The frame to use instead of the cached one.
+        """
+        size = frame_memory(df, self.memory_mode)
+        if size > self.max_bytes:
+            return df
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return share_frame(df)
+
+    def invalidate(self, path: str):
+        """
+        Remove cached frames read from the path or from its subfolders.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path or key[0].startswith(path + os.sep)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and eviction counters, number of cached frames and their total size in bytes.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
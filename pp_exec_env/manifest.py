@@ -0,0 +1,303 @@
+import enum
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
+
+from otlang.sdk.syntax import Keyword
+from pp_exec_env import config
+from pp_exec_env.base_command import BaseCommand, Syntax
+
+MANIFEST_VERSION = 2
+MANIFEST_FILE = ".manifest.json"  # Default name, inside the commands directory
+PLUGIN_SOURCE_SUFFIXES = (".py",)
+PLUGIN_SOURCE_FILES = ("config.ini",)
+SYNTAX_MODULES = (Syntax.__module__, Keyword.__module__)  # Only classes of these modules are rebuilt from JSON
+
+logger = logging.getLogger(config["logging"]["base_logger"])
+_unsaved_paths: Set[str] = set()  # Manifests that could not be saved, warned about once per process
+
+
+def plugin_files(plugin_path: str) -> List[str]:
+    """
+    List source files of a plugin: Python modules and config.ini.
+    Caches, hidden folders and virtual environments shipped with the plugin are skipped.
+
+    Args:
+        plugin_path: Path to the plugin folder.
+    Returns:
+        A sorted list of paths relative to the plugin folder.
+
+    Example Usage:
+
+    >>> import os
+    >>> plugin_files(os.path.join(os.curdir, "tests", "resources", "commands", "sum"))
+    ['__init__.py', 'sum.py']
+    """
+    files = []
+    for root, dirs, names in os.walk(plugin_path):
+        if root != plugin_path and "pyvenv.cfg" in names:  # Virtual environment of the plugin
+            dirs[:] = []
+            continue
+        dirs[:] = [d for d in dirs if d != "__pycache__" and not d.startswith(".")]
+        for name in names:
+            if name.endswith(PLUGIN_SOURCE_SUFFIXES) or name in PLUGIN_SOURCE_FILES:
+                files.append(os.path.relpath(os.path.join(root, name), plugin_path))
+    return sorted(files)
+
+
+def plugin_signature(plugin_path: str) -> List[Tuple[str, int, int]]:
+    """
+    Cheap fingerprint of a plugin: modification time and size of each of its source files.
+    """
+    signature = []
+    for file in plugin_files(plugin_path):
+        stat = os.stat(os.path.join(plugin_path, file))
+        signature.append((file, stat.st_mtime_ns, stat.st_size))
+    return signature
+
+
+def plugin_hash(plugin_path: str) -> str:
+    """
+    Content hash of a plugin: SHA-256 of names and contents of its source files.
+    """
+    digest = hashlib.sha256()
+    for file in plugin_files(plugin_path):
+        digest.update(file.encode() + b"\0")
+        with open(os.path.join(plugin_path, file), "rb") as f:
+            digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def syntax_to_json(value: Any) -> Any:
+    """
+    Convert `Syntax` into plain JSON: objects become their class name and attributes, enums their member name.
+    Only objects of `SYNTAX_MODULES` classes, builtin containers and scalars are supported.
+
+    Args:
+        value: `Syntax` or any of its attributes.
+    Returns:
+        A JSON serializable value, see `syntax_from_json`.
+    Raises:
+        TypeError: If the value cannot be converted.
+
+    Example Usage:
+
+    >>> from otlang.sdk.syntax import Keyword, OTLType
+    >>> syntax = Syntax([Keyword(name="path", otl_type=OTLType.TEXT, required=True)])
+    >>> data = syntax_to_json(syntax)
+    >>> data["class"]
+    '...Syntax'
+    >>> syntax_to_json(syntax_from_json(json.loads(json.dumps(data)))) == data
+    True
+    """
+    if value is None or isinstance(value, (bool, int, float, str)) and not isinstance(value, enum.Enum):
+        return value
+    if isinstance(value, list):
+        return [syntax_to_json(item) for item in value]
+    if isinstance(value, tuple):
+        return {"tuple": [syntax_to_json(item) for item in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(key, str) for key in value):
+            raise TypeError(f"Dictionary keys must be strings: {value!r}")
+        return {"dict": {key: syntax_to_json(item) for key, item in value.items()}}
+
+    cls = type(value)
+    if cls.__module__ not in SYNTAX_MODULES:
+        raise TypeError(f"Objects of {cls.__module__}.{cls.__qualname__} cannot be saved")
+    if isinstance(value, enum.Enum):
+        return {"enum": f"{cls.__module__}.{cls.__qualname__}", "name": value.name}
+    if not hasattr(value, "__dict__"):
+        raise TypeError(f"Objects of {cls.__module__}.{cls.__qualname__} have no attributes to save")
+    return {"class": f"{cls.__module__}.{cls.__qualname__}",
+            "attributes": {key: syntax_to_json(item) for key, item in vars(value).items()}}
+
+
+def _syntax_class(path: str) -> type:
+    """
+    Find a class of `SYNTAX_MODULES` by its full name.
+    """
+    module, _, name = path.rpartition(".")
+    if module not in SYNTAX_MODULES:
+        raise TypeError(f"Class {path} is not a part of syntax")
+    cls = getattr(sys.modules[module], name, None)
+    if not isinstance(cls, type):
+        raise TypeError(f"Class {path} is not found")
+    return cls
+
+
+def syntax_from_json(data: Any) -> Any:
+    """
+    Rebuild `Syntax` converted by `syntax_to_json`. Objects are created without calling `__init__`.
+
+    Args:
+        data: Result of `syntax_to_json`.
+    Returns:
+        `Syntax` or any of its attributes.
+    Raises:
+        TypeError: If the data refers to an unknown class.
+    """
+    if isinstance(data, list):
+        return [syntax_from_json(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    if "tuple" in data:
+        return tuple(syntax_from_json(item) for item in data["tuple"])
+    if "dict" in data:
+        return {key: syntax_from_json(item) for key, item in data["dict"].items()}
+    if "enum" in data:
+        return _syntax_class(data["enum"])[data["name"]]
+
+    cls = _syntax_class(data["class"])
+    value = cls.__new__(cls)
+    value.__dict__.update({key: syntax_from_json(item) for key, item in data["attributes"].items()})
+    return value
+
+
+class PluginManifest:
+    """
+    Persisted manifest of user commands, used to get their syntax without importing them.
+    The manifest is a JSON file with an entry per plugin:
+    command name, class path, `Syntax` converted by `syntax_to_json` and a content hash of the plugin source files.
+
+    An entry is reused while the plugin files are unchanged.
+    Modification times and sizes of the files are checked first, the content hash only when they differ,
+    so that a touched but unchanged plugin is not imported again.
+
+    Example Usage:
+
+    >>> import os, tempfile
+    >>> plugin = os.path.join(os.curdir, "tests", "resources", "commands", "sum")
+    >>> manifest = PluginManifest(os.path.join(tempfile.mkdtemp(), "manifest.json"))
+    >>> manifest.get_syntax("sum", plugin) is None
+    True
+    >>> class Command:
+    ...     syntax = None
+    >>> manifest.update("sum", plugin, Command)
+    >>> manifest.save()
+    >>> PluginManifest(manifest.path).get_entry("sum", plugin)["class"]
+    '...Command'
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._plugins: Optional[Dict[str, Dict]] = None  # Read on the first use
+        self._changed = False
+        self._lock = threading.RLock()
+
+    @property
+    def plugins(self) -> Dict[str, Dict]:
+        if self._plugins is None:
+            self._plugins = self._read()
+        return self._plugins
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path) as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring plugin manifest {self.path}: {e}")
+            return {}
+
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.warning(f"Ignoring plugin manifest {self.path} of version {manifest.get('version')}")
+            return {}
+        return manifest["plugins"]
+
+    def get_entry(self, name: str, plugin_path: str) -> Optional[Dict]:
+        """
+        Get the manifest entry of a plugin if it is up to date with the plugin files.
+
+        Args:
+            name: Command name.
+            plugin_path: Path to the plugin folder.
+        Returns:
+            A dictionary with `class`, `syntax`, `hash` and `signature` keys or None.
+        """
+        with self._lock:
+            entry = self.plugins.get(name)
+            if entry is None:
+                return None
+
+            signature = [list(file) for file in plugin_signature(plugin_path)]
+            if signature == entry["signature"]:
+                return entry
+            if plugin_hash(plugin_path) == entry["hash"]:  # Touched, but not changed
+                entry["signature"] = signature
+                self._changed = True
+                return entry
+            return None
+
+    def get_syntax(self, name: str, plugin_path: str) -> Optional[Syntax]:
+        """
+        Get the syntax of a command from the manifest.
+
+        Args:
+            name: Command name.
+            plugin_path: Path to the plugin folder.
+        Returns:
+            Rebuilt `Syntax` or None if there is no up to date entry.
+        """
+        entry = self.get_entry(name, plugin_path)
+        if entry is None:
+            return None
+        try:
+            return syntax_from_json(entry["syntax"])
+        except (TypeError, KeyError, AttributeError) as e:  # Saved with a different version of a library
+            logger.warning(f"Ignoring manifest entry of {name}: {e}")
+            return None
+
+    def update(self, name: str, plugin_path: str, cls: Type[BaseCommand]):
+        """
+        Put an imported command into the manifest.
+
+        Args:
+            name: Command name.
+            plugin_path: Path to the plugin folder.
+            cls: Command class.
+        """
+        try:
+            syntax = syntax_to_json(cls.syntax)
+        except TypeError as e:
+            logger.warning(f"Syntax of {name} cannot be saved to the manifest: {e}")
+            return
+
+        with self._lock:
+            self.plugins[name] = {
+                "class": f"{cls.__module__}.{cls.__qualname__}",
+                "syntax": syntax,
+                "hash": plugin_hash(plugin_path),
+                "signature": [list(file) for file in plugin_signature(plugin_path)]
+            }
+            self._changed = True
+
+    def save(self):
+        """
+        Write the manifest if it was changed. The file is replaced atomically, so that workers can share it.
+        A read-only location is not an error, the manifest is kept in memory then and a warning is logged
+        once per process.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w") as file:
+                    json.dump({"version": MANIFEST_VERSION, "plugins": self.plugins}, file)
+                os.replace(tmp_path, self.path)
+                self._changed = False
+            except OSError as e:
+                if self.path not in _unsaved_paths:
+                    _unsaved_paths.add(self.path)
+                    logger.warning(f"Plugin manifest {self.path} cannot be saved: {e}")
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
@@ -0,0 +1,315 @@
+import os
+import random
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+MEMORY_MODES = ("none", "shallow", "deep", "sample")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss() -> Optional[int]:
+    """
+    Resident set size of the current process in bytes, read from /proc/self/statm.
+    Returns None if it is not available, e.g. not on Linux.
+
+    Example Usage:
+
+    >>> process_rss() > 0
+    True
+    """
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def frame_memory(df: pd.DataFrame, mode: str = "shallow", sample_size: int = 1000) -> Optional[int]:
+    """
+    Approximate memory used by a DataFrame in bytes.
+
+    Args:
+        df: Target pd.DataFrame.
+        mode: One of the following:
+              `none` - do not measure, None is returned;
+              `shallow` - `memory_usage(deep=False)`, object columns are counted as pointers only;
+              `deep` - `memory_usage(deep=True)`, exact but slow on large object columns;
+              `sample` - like `deep`, but objects are measured on evenly spaced rows and extrapolated.
+        sample_size: Number of rows measured in `sample` mode.
+    Returns:
+        Memory in bytes or None.
+
+    Example Usage:
+
+    >>> df = pd.DataFrame({"a": np.arange(1000), "b": ["x" * 100] * 1000})
+    >>> frame_memory(df, "shallow") == df.memory_usage().sum()
+    True
+    >>> frame_memory(df, "sample", sample_size=10) == df.memory_usage(deep=True).sum()
+    True
+    """
+    if mode == "none":
+        return None
+    if mode == "shallow" or mode == "deep":
+        return int(df.memory_usage(index=True, deep=mode == "deep").sum())
+    if mode != "sample":
+        raise ValueError(f"Unknown memory mode {mode}, expected one of {MEMORY_MODES}")
+
+    memory = int(df.memory_usage(index=True, deep=False).sum())
+    rows = len(df)
+    if rows == 0:
+        return memory
+
+    positions = np.linspace(0, rows - 1, min(rows, sample_size)).astype(np.int64)
+    for idx, dtype in enumerate(df.dtypes):
+        if dtype.kind != "O":  # Objects and strings only, other columns are measured exactly
+            continue
+        sample = df.iloc[positions, idx]
+        objects = sample.memory_usage(index=False, deep=True) - sample.memory_usage(index=False, deep=False)
+        memory += int(objects * rows / len(positions))
+    if df.index.dtype.kind == "O":
+        sample = df.index[positions]
+        memory += int((sample.memory_usage(deep=True) - sample.memory_usage()) * rows / len(positions))
+    return memory
+
+
+class CommandProfiler:
+    """
+    Collects the profile of a single pipeline step:
+    wall time, CPU time of the process, rows, columns and approximate memory of the input and output DataFrames,
+    process RSS before and after the step and subsearch depth.
+    If tracemalloc is tracing, the peak of memory allocated during the step is recorded as well.
+    Steps of subsearches run inside of the step that uses them, so their peaks are included into its peak.
+    The peak is not recorded for steps that ran while steps of other threads were traced.
+
+    Example Usage:
+
+    >>> profiler = CommandProfiler("sum", index=0, depth=0)
+    >>> step = profiler.start(pd.DataFrame({"a": [1, 2]}))
+    >>> step = profiler.stop(pd.DataFrame({"a": [1, 2], "b": [3, 4]}))
+    >>> sorted(step)  # doctest: +NORMALIZE_WHITESPACE
+    ['columns_in', 'columns_out', 'command', 'cpu_time', 'depth', 'index', 'memory_in', 'memory_out',
+     'rows_in', 'rows_out', 'rss_in', 'rss_out', 'wall_time']
+    >>> step["rows_in"], step["columns_in"], step["columns_out"]
+    (2, 1, 2)
+    """
+
+    _local = threading.local()  # Steps of a thread traced by tracemalloc, outer steps first
+    _traced: Set["CommandProfiler"] = set()  # Traced steps of all threads
+    _lock = threading.Lock()
+
+    def __init__(self, command: str, index: int, depth: int, memory_mode: str = "shallow", sample_size: int = 1000):
+        self.memory_mode = memory_mode
+        self.sample_size = sample_size
+        self.step = {"command": command, "index": index, "depth": depth}
+        self._wall_start = None
+        self._cpu_start = None
+        self._traced_start = None  # Traced memory at the start of the step
+        self._traced_peak = None  # Traced peak before the last tracemalloc.reset_peak
+        self._shared = False  # Other threads were traced during the step, so its peak is unknown
+
+    @classmethod
+    def _active(cls) -> List["CommandProfiler"]:
+        if not hasattr(cls._local, "steps"):
+            cls._local.steps = []
+        return cls._local.steps
+
+    def start(self, df: pd.DataFrame) -> Dict:
+        """
+        Measure the input DataFrame and start the timers.
+
+        Returns:
+            The step profile, filled in by `stop`.
+        """
+        rows, columns = df.shape
+        self.step.update(rows_in=rows, columns_in=columns,
+                         memory_in=frame_memory(df, self.memory_mode, self.sample_size), rss_in=process_rss())
+
+        if tracemalloc.is_tracing():
+            active = self._active()
+            with self._lock:
+                current, peak = tracemalloc.get_traced_memory()
+                if len(self._traced) > len(active):  # The peak is global, it cannot be reset under other threads
+                    for profiler in self._traced:
+                        profiler._shared = True
+                    self._shared = True
+                else:
+                    if active:  # The peak of the outer step would be lost by the reset
+                        active[-1]._traced_peak = max(active[-1]._traced_peak, peak)
+                    tracemalloc.reset_peak()
+                self._traced_start = self._traced_peak = current
+                self._traced.add(self)
+            active.append(self)
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self.step
+
+    def _stop_tracing(self):
+        if self._traced_start is None:
+            return
+        active = self._active()
+        with self._lock:
+            peak = max(self._traced_peak, tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0)
+            if not self._shared:
+                self.step["peak_allocated"] = peak - self._traced_start
+            self._traced.discard(self)
+        if self in active:
+            active.remove(self)
+        if active:
+            active[-1]._traced_peak = max(active[-1]._traced_peak, peak)
+        self._traced_start = None
+
+    def cancel(self):
+        """
+        Stop the timers of a failed step. The output is not measured.
+        """
+        self.step.update(wall_time=time.perf_counter() - self._wall_start,
+                         cpu_time=time.process_time() - self._cpu_start, failed=True)
+        self._stop_tracing()
+
+    def stop(self, df: pd.DataFrame) -> Dict:
+        """
+        Stop the timers and measure the output DataFrame.
+
+        Returns:
+            The step profile.
+        """
+        self.step.update(wall_time=time.perf_counter() - self._wall_start,
+                         cpu_time=time.process_time() - self._cpu_start)
+        self._stop_tracing()
+        rows, columns = df.shape
+        self.step.update(rows_out=rows, columns_out=columns,
+                         memory_out=frame_memory(df, self.memory_mode, self.sample_size), rss_out=process_rss())
+        return self.step
+
+
+def format_step(step: Dict) -> str:
+    """
+    Format a step profile as a single line for logs and progress messages.
+
+    Example Usage:
+
+    >>> format_step({"command": "sum", "index": 1, "depth": 0, "wall_time": 0.5, "cpu_time": 0.25,
+    ...              "rows_in": 10, "columns_in": 2, "rows_out": 10, "columns_out": 3,
+    ...              "memory_in": 160, "memory_out": None})
+    'sum (#1, depth 0): 0.500s wall, 0.250s cpu, 10x2 -> 10x3 rows x columns, memory 160 -> ? bytes'
+    """
+    memory_in = "?" if step.get("memory_in") is None else step["memory_in"]
+    memory_out = "?" if step.get("memory_out") is None else step["memory_out"]
+    line = (f"{step['command']} (#{step['index']}, depth {step['depth']}): "
+            f"{step['wall_time']:.3f}s wall, {step['cpu_time']:.3f}s cpu, "
+            f"{step['rows_in']}x{step['columns_in']} -> {step['rows_out']}x{step['columns_out']} rows x columns, "
+            f"memory {memory_in} -> {memory_out} bytes")
+    if step.get("peak_allocated") is not None:
+        line += f", peak allocated {step['peak_allocated']} bytes"
+    if step.get("reused_subsearches"):
+        line += f", {step['reused_subsearches']} subsearches reused ({step['reused_time']:.3f}s saved)"
+    return line
+
+
+def traced_peaks(sample_rate: float, frames: int = 1) -> bool:
+    """
+    Start tracemalloc for a sampled share of jobs, so that peaks of steps are recorded with low overall overhead.
+
+    Args:
+        sample_rate: Share of jobs to trace, from 0 to 1.
+        frames: Number of frames stored per allocation.
+    Returns:
+        True if tracing was started and has to be stopped with `tracemalloc.stop` when the job ends.
+
+    Example Usage:
+
+    >>> traced_peaks(0.0)
+    False
+    >>> traced_peaks(1.0)
+    True
+    >>> tracemalloc.stop()
+    """
+    if sample_rate <= 0 or tracemalloc.is_tracing() or random.random() >= sample_rate:
+        return False
+    tracemalloc.start(frames)
+    return True
+
+
+class MemoryWatchdog:
+    """
+    Samples the process RSS in a background thread and keeps the first sample that grew by more than the budget,
+    so that peaks between the checks of the executor are not missed. Nothing is raised by the watchdog itself,
+    the executor fails the job at its next check, where it knows the running command.
+
+    Example Usage:
+
+    >>> watchdog = MemoryWatchdog(budget=1024 * 1024, interval=0.01).start()
+    >>> data = np.ones(4 * 1024 * 1024)  # 32 MB
+    >>> while watchdog.rss is None:
+    ...     time.sleep(0.01)
+    >>> del data
+    >>> watchdog.stop()
+    >>> watchdog.rss - watchdog.baseline > 1024 * 1024
+    True
+    """
+
+    def __init__(self, budget: int, interval: float = 0.1):
+        self.budget = budget
+        self.interval = interval
+        self.baseline = None  # RSS at the start
+        self.rss = None  # RSS that exceeded the budget
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self, baseline: Optional[int] = None) -> "MemoryWatchdog":
+        """
+        Start sampling.
+
+        Args:
+            baseline: RSS the growth is counted from, the current RSS by default.
+        Returns:
+            The watchdog itself.
+        """
+        self.baseline = process_rss() if baseline is None else baseline
+        if self.baseline is None:  # RSS is not available
+            return self
+        self._thread = threading.Thread(target=self._run, name="memory-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            rss = process_rss()
+            if rss is not None and rss - self.baseline > self.budget:
+                self.rss = rss
+                return
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def total_time(profile: List[Dict]) -> float:
+    """
+    Wall time of the top level steps of a profile.
+    Steps of subsearches are included in the time of the steps that use them.
+
+    Example Usage:
+
+    >>> total_time([{"depth": 0, "wall_time": 1.0}, {"depth": 1, "wall_time": 0.5}, {"depth": 0, "wall_time": 2.0}])
+    3.0
+    """
+    if not profile:
+        return 0.0
+    top = min(step["depth"] for step in profile)
+    return sum(step.get("wall_time", 0.0) for step in profile if step["depth"] == top)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
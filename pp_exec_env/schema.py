@@ -1,9 +1,24 @@
+import os
 import re
 import datetime
-from typing import Dict, Tuple
+import functools
+import json
+import multiprocessing
+import shutil
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from pp_exec_env.filters import filter_columns, to_arrow_expression, to_pandas_mask
 
 # This is not technically correct, as BIGINT in Scala can go from LONG to BIGDECIMAL when needed
 # BIGINT is set to pd.Int64Dtype for _time to be nullable (experimental)
@@ -20,6 +35,45 @@ DDL_TO_PANDAS = {
     "BOOLEAN": pd.BooleanDtype()
 }
 
+# Arrow types used to cast parquet columns before conversion to Pandas.
+# NULL is left out on purpose, all-null columns are kept as they are
+DDL_TO_ARROW = {
+    "STRING": pa.string(),
+    "FLOAT": pa.float32(),
+    "DOUBLE": pa.float64(),
+    "INTEGER": pa.int32(),
+    "INT": pa.int32(),
+    "LONG": pa.int64(),
+    "BIGINT": pa.int64(),
+    "TIMESTAMP": pa.timestamp("ns"),
+    "BOOLEAN": pa.bool_()
+}
+
+# Pandas extension dtypes that can be created by Arrow directly, without an intermediate numpy/object column
+ARROW_TO_PANDAS = {
+    pa.string(): pd.StringDtype(),
+    pa.large_string(): pd.StringDtype(),
+    pa.bool_(): pd.BooleanDtype()
+}
+
+# Arrow-backed dtypes of STRING and ARRAY columns, see `arrow_dtypes_schema`.
+# pd.ArrowDtype needs Pandas 1.5: with older versions ARRAY columns stay objects
+# and `arrow_dtypes` option of config cannot be enabled
+ARROW_DTYPE = getattr(pd, "ArrowDtype", None)
+ARROW_STRING_DTYPE = pd.StringDtype("pyarrow")
+
+ARROW_TO_DDL = {
+    pa.string(): "STRING",
+    pa.large_string(): "STRING",
+    pa.int64(): "LONG",
+    pa.int32(): "INTEGER",
+    pa.int16(): "INTEGER",
+    pa.int8(): "INTEGER",
+    pa.float64(): "DOUBLE",
+    pa.float32(): "FLOAT",
+    pa.bool_(): "BOOLEAN"
+}
+
 PANDAS_TO_DDL = {
     "int64": "LONG",
     np.int64: "LONG",
@@ -53,7 +107,8 @@ PANDAS_TO_DDL = {
     np.datetime64: "TIMESTAMP",
     datetime.datetime: "TIMESTAMP",
 
-    pd.StringDtype(): "STRING"
+    pd.StringDtype(): "STRING",
+    ARROW_STRING_DTYPE: "STRING"
 }
 
 PYTHON_TO_DDL = {
@@ -63,20 +118,122 @@ PYTHON_TO_DDL = {
     bool: "BOOLEAN"
 }
 
+# Results of pd.api.types.infer_dtype
+INFERRED_TO_DDL = {
+    "string": "STRING",
+    "integer": "LONG",
+    "floating": "DOUBLE",
+    "mixed-integer-float": "DOUBLE",
+    "decimal": "DOUBLE",
+    "boolean": "BOOLEAN",
+    "datetime64": "TIMESTAMP",
+    "datetime": "TIMESTAMP"
+}
+
 OBJ_TYPE = np.dtype(np.object_)
 
-# Group 1: Field Name
-# Group 2: Type
-# Group 3: Type if Group 2 was an ARRAY
-# Group 4: NOT NULL
-SPARK_FIELD_DDL_REGEX = re.compile("^`(.*)?` ([A-Z]+)(<[A-Z]+>)?( NOT NULL)?$")
-DECIMAL_REGEX = re.compile(r"DECIMAL\(\d+\,\d+\)")
+# Group 1: Quoted field name
+# Group 2: Unquoted field name
+# Group 3: Type, with parameters if any, e.g. DECIMAL(10,2)
+# Group 4: NOT NULL and COMMENT clauses followed by the field separator, missing if the type is nested
+DDL_FIELD_REGEX = re.compile(
+    r"\s*(?:`([^`]*(?:``[^`]*)*)`|([^\s`,:<>]+))\s*:?\s+([A-Za-z_]+(?:\([\d\s,]*\))?)"
+    r"(?:((?:\s+NOT\s+NULL)?(?:\s+COMMENT\s+'(?:[^'\\]|\\.)*')?\s*(?:,|\Z))|(?=<))"
+)
+DDL_FIELD_TAIL_REGEX = re.compile(r"(?:\s+NOT\s+NULL)?(?:\s+COMMENT\s+'(?:[^'\\]|\\.)*')?\s*(?:,|\Z)")
+# Tokens that matter inside of nested types, e.g. STRUCT<`a>`: INT>
+DDL_NESTED_TOKEN_REGEX = re.compile(r"`[^`]*(?:``[^`]*)*`|'(?:[^'\\]|\\.)*'|[<>]")
+DECIMAL_REGEX = re.compile(r"DECIMAL\(\s*\d+\s*,\s*\d+\s*\)")
+ARRAY_REGEX = re.compile(r"ARRAY<(.+)>")
+
+# Sizes of LRU caches of parsed DDL strings and of read _SCHEMA files
+DDL_CACHE_SIZE = 256
+SCHEMA_FILE_CACHE_SIZE = 256
+
+# Number of values the cardinality of STRING columns is estimated on, see `encode_string_dictionaries`
+DICTIONARY_SAMPLE_SIZE = 10000
+
+# Worker processes are not forked: the parent may run other threads, e.g. the background writer,
+# and locks held by them would never be released in the child
+PROCESS_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def tokenize_ddl(ddl: str) -> List[Tuple[str, str]]:
+    """
+    Split Schema DDL string into field names and field types in a single pass.
+    Commas inside of nested types (e.g. `STRUCT<a: INT, b: STRING>` or `DECIMAL(10,2)`),
+    quoted names and comments do not split fields. `NOT NULL` and `COMMENT` clauses are dropped.
+
+    Args:
+        ddl: String with data schema in DDL format.
+    Returns:
+        A list of (field name, field type) tuples.
+
+    Example Usage:
+
+    >>> tokenize_ddl("`a,b` DECIMAL(10,2) NOT NULL,`c` STRUCT<`x`: INT, `y`: ARRAY<STRING>> COMMENT 'd, e'")
+    [('a,b', 'DECIMAL(10,2)'), ('c', 'STRUCT<`x`: INT, `y`: ARRAY<STRING>>')]
+    >>> tokenize_ddl("`a` INT,`b`")
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid DDL at position 8: `b`
+    """
+    fields = []
+    position = 0
+    size = len(ddl)
+
+    while position < size:
+        field = DDL_FIELD_REGEX.match(ddl, position)
+        if field is None:
+            raise ValueError(f"Invalid DDL at position {position}: {ddl[position:position + 50]}")
+        quoted_name, name, field_type, tail = field.groups()
+        position = field.end()
+
+        if tail is None:  # Nested type, find the matching bracket
+            depth = 0
+            for token in DDL_NESTED_TOKEN_REGEX.finditer(ddl, position):
+                if token.group() == "<":
+                    depth += 1
+                elif token.group() == ">":
+                    depth -= 1
+                    if depth == 0:
+                        break
+            if depth != 0:
+                raise ValueError(f"Unbalanced brackets in DDL at position {position}: {ddl[position:position + 50]}")
+            field_type = ddl[field.start(3):token.end()]
+            tail = DDL_FIELD_TAIL_REGEX.match(ddl, token.end())
+            if tail is None:
+                raise ValueError(f"Invalid DDL at position {token.end()}: {ddl[token.end():token.end() + 50]}")
+            position = tail.end()
+
+        if quoted_name is not None:
+            name = quoted_name.replace("``", "`")  # DDL escaping for backticks
+        fields.append((name, field_type))
+    return fields
+
+
+@functools.lru_cache(maxsize=DDL_CACHE_SIZE)
+def _parse_ddl(ddl: str) -> Tuple[Dict, Dict]:
+    schema = {}
+    ddl_schema = {}
+
+    for field_name, field_type in tokenize_ddl(ddl):
+        # Добавлен Костыль для исправления ошибки с полями типа DECIMAL(3,2) Заменяем DECIMAL на DOUBLE
+        # В будущем весь этот файл нужно переписывать и делать преобразование типов спарка в pandas с использованием pyspark
+        # https://github.com/apache/spark/blob/master/python/pyspark/pandas/typedef/typehints.py
+        if "DECIMAL" in field_type:
+            field_type = DECIMAL_REGEX.sub("DOUBLE", field_type)
+        # Pandas does not have an implementation of Array, Map or Struct dtypes, so they are Objects
+        schema[field_name] = DDL_TO_PANDAS.get(field_type, OBJ_TYPE)
+        ddl_schema[field_name] = field_type
+    return schema, ddl_schema
 
 
 def ddl_to_pd_schema(ddl: str) -> Tuple[Dict, Dict]:
     """
     Convert Schema DDL string to a Pandas dtypes dictionary.
     The function helps to handle data coming from Spark.
+    Parsed schemas are cached, the returned dictionaries are copies and can be modified.
 
     Args:
         ddl: String with data schema in DDL format.
@@ -94,32 +251,23 @@ def ddl_to_pd_schema(ddl: str) -> Tuple[Dict, Dict]:
     {'_time': Int64Dtype(), 'some_field': 'float64', 'another_field': dtype('O')}
     >>> d
     {'_time': 'BIGINT', 'some_field': 'DOUBLE', 'another_field': 'ARRAY<INT>'}
+    >>> ddl_to_pd_schema("`price` DECIMAL(10,2) NOT NULL,`tags` MAP<STRING, ARRAY<DECIMAL(3,2)>>")[1]
+    {'price': 'DOUBLE', 'tags': 'MAP<STRING, ARRAY<DOUBLE>>'}
     """
-    # Добавлен Костыль для исправления ошибки с полями типа DECIMAL(3,2) Заменяем DECIMAL на DOUBLE
-    # В будущем весь этот файл нужно переписывать и делать преобразование типов спарка в pandas с использованием pyspark
-    # https://github.com/apache/spark/blob/master/python/pyspark/pandas/typedef/typehints.py
-    fields = DECIMAL_REGEX.sub(
-        'DOUBLE', ddl
-    ).split(',')  # Yep, would fail on Structures and Maps, which we do not support anyway
+    schema, ddl_schema = _parse_ddl(ddl)
+    return dict(schema), dict(ddl_schema)
 
-    schema = {}
-    ddl_schema = {}
 
-    for field in fields:
-        field_name, field_type, array_type, _ = SPARK_FIELD_DDL_REGEX.match(field).groups()
-        field_name = field_name.replace('``', '`')  # DDL escaping for backticks
-        _field_type = field_type  # copy for later
-        if array_type:
-            field_type = None  # Pandas will think it is an Object, it does not have an implementation of Array dtype
-            _field_type = f"{_field_type}{array_type}"
-        schema[field_name] = DDL_TO_PANDAS.get(field_type, OBJ_TYPE)
-        ddl_schema[field_name] = _field_type
-    return schema, ddl_schema
+@functools.lru_cache(maxsize=SCHEMA_FILE_CACHE_SIZE)
+def _read_schema_file(schema_path: str, mtime_ns: int, size: int) -> str:  # noqa, mtime and size are cache keys
+    with open(schema_path) as file:
+        return file.read()
 
 
 def read_schema(schema_path: str) -> Tuple[Dict, Dict]:
     """
-    Read DDL Schema file and convert it with `ddl_to_pd_schema`
+    Read DDL Schema file and convert it with `ddl_to_pd_schema`.
+    File contents are cached by path, modification time and size, so a rewritten file is read again.
 
     Args:
         schema_path: Path to the file. Usually filename is _SCHEMA.
@@ -136,19 +284,313 @@ def read_schema(schema_path: str) -> Tuple[Dict, Dict]:
     >>> schema_ddl
     {'_time': 'BIGINT', 'some_field': 'DOUBLE', 'another_field': 'INT'}
     """
-    with open(schema_path) as file:
-        ddl = file.read()
+    schema_path = os.path.abspath(schema_path)
+    stat = os.stat(schema_path)
+    return ddl_to_pd_schema(_read_schema_file(schema_path, stat.st_mtime_ns, stat.st_size))
+
+
+def ddl_to_arrow_type(ddl_type: str) -> Optional[pa.DataType]:
+    """
+    Convert DDL type to Arrow type. Arrays are converted to Arrow lists.
+
+    Args:
+        ddl_type: DDL type string, see `ddl_to_pd_schema`.
+    Returns:
+        A pa.DataType or None if the type has no Arrow counterpart, e.g. STRUCT or MAP.
+
+    Example Usage:
+
+    >>> ddl_to_arrow_type("ARRAY<ARRAY<INT>>")
+    ListType(list<item: list<item: int32>>)
+    >>> ddl_to_arrow_type("MAP<STRING, INT>") is None
+    True
+    """
+    array = ARRAY_REGEX.fullmatch(ddl_type)
+    if array is None:
+        return DDL_TO_ARROW.get(ddl_type, None)
+    item_type = ddl_to_arrow_type(array.group(1).strip())
+    return None if item_type is None else pa.list_(item_type)
+
+
+def arrow_to_ddl(arrow_type: pa.DataType) -> Optional[str]:
+    """
+    Convert Arrow type to DDL type, the opposite of `ddl_to_arrow_type`.
+
+    Args:
+        arrow_type: Target pa.DataType.
+    Returns:
+        DDL type string or None if the type is not supported.
+
+    Example Usage:
+
+    >>> arrow_to_ddl(pa.list_(pa.int64()))
+    'ARRAY<LONG>'
+    >>> arrow_to_ddl(pa.timestamp("ms"))
+    'TIMESTAMP'
+    """
+    if pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type):
+        item_type = arrow_to_ddl(arrow_type.value_type)
+        return None if item_type is None else f"ARRAY<{item_type}>"
+    if pa.types.is_dictionary(arrow_type):
+        return arrow_to_ddl(arrow_type.value_type)
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMP"
+    return ARROW_TO_DDL.get(arrow_type, None)
+
 
-    return ddl_to_pd_schema(ddl)
+def arrow_dtypes_schema(schema: Dict, ddl_schema: Dict) -> Dict:
+    """
+    Replace dtypes of STRING and ARRAY columns with Arrow-backed dtypes:
+    `string[pyarrow]` and `pd.ArrowDtype` of Arrow lists. Their values are kept in Arrow memory
+    instead of one Python object per row, and their DDL types are derived from the Arrow types.
+    Arrays of types without Arrow counterparts, e.g. ARRAY<STRUCT<...>>, stay objects.
+
+    Args:
+        schema: Dictionary with fields as keys and Pandas dtypes as values. See `ddl_to_pd_schema`.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+    Returns:
+        A new schema dictionary.
+
+    Example Usage:
+
+    >>> s, d = ddl_to_pd_schema("`a` STRING,`b` ARRAY<INT>,`c` DOUBLE")
+    >>> arrow_dtypes_schema(s, d)
+    {'a': string[pyarrow], 'b': list<item: int32>[pyarrow], 'c': 'float64'}
+    """
+    schema = dict(schema)
+    for field, ddl_type in ddl_schema.items():
+        if ddl_type == "STRING":
+            schema[field] = ARROW_STRING_DTYPE
+        elif ARROW_DTYPE is not None and ddl_type.startswith("ARRAY<"):
+            arrow_type = ddl_to_arrow_type(ddl_type)
+            if arrow_type is not None:
+                schema[field] = ARROW_DTYPE(arrow_type)
+    return schema
+
+
+def _arrow_dtype(arrow_type: pa.DataType):
+    """
+    Types mapper of `arrow_to_pandas` for Arrow-backed dtypes, see `arrow_dtypes_schema`.
+    """
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return ARROW_STRING_DTYPE
+    if ARROW_DTYPE is not None and (pa.types.is_list(arrow_type) or pa.types.is_large_list(arrow_type)):
+        return ARROW_DTYPE(arrow_type)
+    return ARROW_TO_PANDAS.get(arrow_type, None)
+
+
+def cast_frame(df: pd.DataFrame, schema: Dict, keep_categories: bool = False) -> pd.DataFrame:
+    """
+    Cast columns of a DataFrame to the dtypes of the schema.
+    Columns that cannot be cast are left as they are, just like `astype(..., errors='ignore')` would do.
+
+    Args:
+        df: Target pd.DataFrame. It is modified in place.
+        schema: Dictionary with fields as keys and Pandas dtypes as values. See `ddl_to_pd_schema`.
+        keep_categories: Do not cast `category` columns, e.g. dictionary-encoded STRING columns.
+    Returns:
+        The pd.DataFrame.
+
+    Example Usage:
+
+    >>> cast_frame(pd.DataFrame({"a": [1, 2], "b": ["x", "y"]}), {"a": "int32", "b": ARROW_STRING_DTYPE}).dtypes
+    a      int32
+    b    string
+    dtype: object
+    """
+    for field, dtype in schema.items():
+        if field not in df.columns or df[field].dtype == dtype \
+                or (keep_categories and isinstance(df[field].dtype, pd.CategoricalDtype)):
+            continue
+        try:
+            df[field] = df[field].astype(dtype)
+        except (TypeError, ValueError, pa.ArrowNotImplementedError):
+            pass
+    return df
+
+
+def project_schema(schema: Dict, ddl_schema: Dict, columns: Optional[Iterable[str]]) -> Tuple[Dict, Dict, List]:
+    """
+    Leave only the given columns in the schema dictionaries. Columns that are not present in the schema are ignored.
+
+    Args:
+        schema: Dictionary with fields as keys and Pandas dtypes as values. See `ddl_to_pd_schema`.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+        columns: Columns to leave. None means all columns.
+    Returns:
+        A tuple of the projected schema, projected DDL schema and a list of projected columns in schema order.
+
+    Example Usage:
 
+    >>> s, d = ddl_to_pd_schema("`_time` BIGINT,`some_field` DOUBLE,`another_field` ARRAY<INT>")
+    >>> s, d, c = project_schema(s, d, ["another_field", "_time", "unknown"])
+    >>> d
+    {'_time': 'BIGINT', 'another_field': 'ARRAY<INT>'}
+    >>> c
+    ['_time', 'another_field']
+    """
+    if columns is None:
+        return schema, ddl_schema, list(ddl_schema.keys())
+    columns = set(columns)
+    projected = [field for field in ddl_schema.keys() if field in columns]
+    return ({field: schema[field] for field in projected},
+            {field: ddl_schema[field] for field in projected},
+            projected)
+
+
+class _ColumnBuffer:
+    """
+    Preallocated column that is filled by chunks of jsonlines data.
+    The buffer is upcast (once per column) when a chunk does not fit into its dtype,
+    the same way Pandas would upcast the column when reading the whole file.
+    """
+    def __init__(self, size: int, dtype):
+        self.dtype = dtype
+        self.mask = None
+        if isinstance(dtype, (pd.Int64Dtype, pd.BooleanDtype)):
+            self.values = np.empty(size, dtype="int64" if isinstance(dtype, pd.Int64Dtype) else "bool")
+            self.mask = np.zeros(size, dtype="bool")
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) or np.dtype(dtype) == OBJ_TYPE:
+            self.values = np.empty(size, dtype=OBJ_TYPE)
+        else:
+            self.values = np.empty(size, dtype=dtype)
+
+    def _upcast(self, dtype):
+        if self.mask is not None:
+            values = self.values.astype(OBJ_TYPE)
+            values[self.mask] = np.nan
+            self.values, self.mask = values, None
+        self.dtype = dtype
+        self.values = self.values.astype(dtype)
+
+    def _fits(self, dtype: np.dtype, series: pd.Series) -> bool:
+        """
+        Check if a chunk fits into the masked buffer without losing fractions or range.
+        """
+        if dtype.kind != "f":
+            return dtype == OBJ_TYPE or np.can_cast(dtype, self.values.dtype, casting="safe")
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        values = values[~np.isnan(values)]
+        if self.values.dtype.kind == "b":
+            return bool(np.isin(values, (0, 1)).all())
+        return bool((values == np.trunc(values)).all() and (np.abs(values) < 2 ** 63).all())
 
-def read_jsonl_with_schema(schema_path: str, data_path: str) -> pd.DataFrame:
+    def put(self, start: int, series: pd.Series):
+        stop = start + len(series)
+        if start >= stop:
+            return
+        if self.mask is not None:
+            dtype = getattr(series.dtype, "numpy_dtype", series.dtype)  # E.g. int64 of Int64Dtype
+            if not self._fits(dtype, series):
+                self._upcast(np.result_type(self.values.dtype, dtype))  # The same as Pandas would do
+            else:
+                try:
+                    self.values[start:stop] = series.to_numpy(dtype=self.values.dtype, na_value=0)
+                    self.mask[start:stop] = series.isna().to_numpy()
+                    return
+                except (TypeError, ValueError):
+                    self._upcast(OBJ_TYPE)
+
+        if self.values.dtype.kind == "f" and isinstance(series.dtype, pd.api.extensions.ExtensionDtype):
+            values = series.to_numpy(dtype=self.values.dtype, na_value=np.nan)  # E.g. Int64 chunks after upcasting
+        else:
+            values = series.to_numpy()
+        if self.values.dtype != OBJ_TYPE and not np.can_cast(values.dtype, self.values.dtype, casting="safe"):
+            self._upcast(np.result_type(self.values.dtype, values.dtype))
+        self.values[start:stop] = values
+
+    def put_na(self, start: int, stop: int):
+        if start >= stop:
+            return
+        if self.mask is not None:
+            self.mask[start:stop] = True
+            return
+        if self.values.dtype.kind in "iub":
+            self._upcast("float64")
+        self.values[start:stop] = np.datetime64("NaT") if self.values.dtype.kind == "M" else np.nan
+
+    def to_array(self, size: int):
+        if self.mask is not None:
+            if isinstance(self.dtype, pd.Int64Dtype):
+                return pd.arrays.IntegerArray(self.values[:size], self.mask[:size])
+            return pd.arrays.BooleanArray(self.values[:size], self.mask[:size])
+        values = self.values[:size]
+        if isinstance(self.dtype, pd.StringDtype):
+            return pd.array(values, dtype=self.dtype)
+        return values
+
+
+def _count_lines(data_path: str) -> int:
+    """
+    Count upper bound of the amount of records in jsonlines file.
+    """
+    lines = 0
+    last = b"\n"
+    with open(data_path, "rb") as file:
+        while block := file.read(1 << 20):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
+
+
+def _read_jsonl_chunked(data_path: str, schema: Dict, columns: Optional[List], filters: Optional[str],
+                        chunk_size: int) -> pd.DataFrame:
+    """
+    Read jsonlines data in chunks of `chunk_size` records into preallocated columns.
+    Peak memory is the size of the resulting DataFrame plus the size of a single parsed chunk.
+    """
+    size = _count_lines(data_path)
+    buffers: Dict[str, _ColumnBuffer] = {}
+    rows = 0
+    required = filter_columns(filters) if filters else set()
+
+    with pd.read_json(data_path, lines=True, orient="records", dtype=schema, keep_default_dates=False,
+                      chunksize=chunk_size) as reader:
+        for chunk in reader:
+            if filters:
+                for column in required.difference(chunk.columns):  # Key is absent in all records of the chunk
+                    chunk[column] = np.nan
+                chunk = chunk.loc[to_pandas_mask(filters, chunk)]
+            chunk_columns = set(chunk.columns)
+
+            for column in chunk.columns:
+                if columns is not None and column not in schema:
+                    continue
+                if column not in buffers:
+                    buffers[column] = _ColumnBuffer(size, schema.get(column, chunk[column].dtype))
+                    buffers[column].put_na(0, rows)
+                buffers[column].put(rows, chunk[column])
+            for column, buffer in buffers.items():
+                if column not in chunk_columns:
+                    buffer.put_na(rows, rows + len(chunk))
+            rows += len(chunk)
+
+    data = {}
+    for column in (columns if columns is not None else list(buffers.keys())):
+        if column in buffers:
+            data[column] = buffers.pop(column).to_array(rows)
+    return pd.DataFrame(data, index=pd.RangeIndex(rows), copy=False)
+
+
+def read_jsonl_with_schema(schema_path: str, data_path: str, columns: Optional[Iterable[str]] = None,
+                           filters: Optional[str] = None, chunk_size: int = 0,
+                           dictionary_ratio: float = 0, arrow_dtypes: bool = False) -> pd.DataFrame:
     """
     Read jsonlines data and infer data types from schema
 
     Args:
         schema_path: Path to schema file. Usually filename is _SCHEMA.
         data_path: Path to file with data. Usually filename is data.
+        columns: Columns to read. None means all columns.
+                 jsonlines cannot be read partially, so the rest of the columns are dropped after parsing.
+        filters: Filter expression, see `pp_exec_env.filters`. Applied after parsing.
+        chunk_size: If positive, the file is parsed in chunks of `chunk_size` records.
+                    Columns, filters and DDL types are applied to each chunk, so memory usage stays
+                    close to the size of the resulting DataFrame.
+        dictionary_ratio: STRING columns with a lower estimated ratio of distinct values to rows are converted
+                          to `category` after parsing, see `encode_frame_string_dictionaries`. 0 disables it.
+        arrow_dtypes: STRING and ARRAY columns are converted to Arrow-backed dtypes after parsing,
+                      see `arrow_dtypes_schema`.
     Returns:
         A pd.DataFrame with data from the files.
 
@@ -162,21 +604,247 @@ def read_jsonl_with_schema(schema_path: str, data_path: str) -> pd.DataFrame:
                 _time
     Index
     0      1644423843
+    >>> chunked = read_jsonl_with_schema(os.path.join(os.curdir, "tests", "resources", "data", "simple_jsonl", "_SCHEMA"),
+    ...                                  os.path.join(os.curdir, "tests", "resources", "data", "simple_jsonl", "data"),
+    ...                                  chunk_size=3)
+    >>> chunked.equals(df)
+    True
     """
     schema, ddl_schema = read_schema(schema_path)
-    df = pd.read_json(data_path, lines=True, orient="records", dtype=schema, keep_default_dates=False)
+    if columns is not None:
+        schema, ddl_schema, columns = project_schema(schema, ddl_schema, columns)
+    target_schema = arrow_dtypes_schema(schema, ddl_schema) if arrow_dtypes else schema
+
+    if chunk_size > 0:  # Chunks are collected into numpy columns, Arrow-backed dtypes are applied afterwards
+        df = _read_jsonl_chunked(data_path, schema, columns, filters, chunk_size)
+    else:
+        df = pd.read_json(data_path, lines=True, orient="records", dtype=target_schema, keep_default_dates=False)
+        if filters:
+            df = df.loc[to_pandas_mask(filters, df)]
+            df.index = pd.RangeIndex(len(df))  # Same as parquet
+        if columns is not None:
+            df = df[[column for column in columns if column in df.columns]]
+    if arrow_dtypes:
+        df = cast_frame(df, target_schema)
+    df = encode_frame_string_dictionaries(df, ddl_schema, dictionary_ratio)
     df.index.name = "Index"
     df.schema._initial_schema = ddl_schema  # Redefine initial schema to avoid upcasting as much as possible
     return df
 
 
-def read_parquet_with_schema(schema_path: str, data_path: str) -> pd.DataFrame:
+def _low_cardinality(column, max_ratio: float) -> bool:
+    """
+    Estimate if the ratio of distinct values to rows of an Arrow column is not above `max_ratio`.
+    Distinct values are counted on up to `DICTIONARY_SAMPLE_SIZE` evenly spaced rows.
+    """
+    positions = np.unique(np.linspace(0, len(column) - 1, num=min(len(column), DICTIONARY_SAMPLE_SIZE),
+                                      dtype=np.int64))
+    distinct = pc.count_distinct(column.take(pa.array(positions)), mode="all").as_py()
+    return distinct <= max_ratio * len(positions)
+
+
+def encode_string_dictionaries(table: pa.Table, ddl_schema: Dict, max_ratio: float = 0) -> pa.Table:
+    """
+    Dictionary-encode STRING columns of an Arrow table with few distinct values,
+    so that they are converted to `category` instead of one Python object per row.
+    Columns that are already dictionary-encoded, e.g. written from `category` columns, are kept
+    if their dictionary is small enough, otherwise they are decoded.
+
+    Args:
+        table: Target pa.Table.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+        max_ratio: Maximum ratio of distinct values to rows of an encoded column. 0 decodes all columns.
+    Returns:
+        A pa.Table with encoded columns.
+
+    Example Usage:
+
+    >>> import pyarrow as pa
+    >>> table = pa.table({"host": ["a", "b", "a", "a"], "id": ["1", "2", "3", "4"]})
+    >>> encode_string_dictionaries(table, {"host": "STRING", "id": "STRING"}, max_ratio=0.5).schema
+    host: dictionary<values=string, indices=int32, ordered=0>
+    id: string
+    """
+    encoded = set()
+    for idx, field in enumerate(table.schema):
+        if ddl_schema.get(field.name, None) != "STRING":
+            continue
+        column = table.column(idx)
+        if pa.types.is_dictionary(field.type):
+            size = max((len(chunk.dictionary) for chunk in column.chunks), default=0)
+            if max_ratio > 0 and size <= max_ratio * max(len(column), 1):
+                continue
+            column = column.cast(field.type.value_type)
+        elif max_ratio > 0 and len(column) > 0 and (pa.types.is_string(field.type)
+                                                    or pa.types.is_large_string(field.type)) \
+                and _low_cardinality(column, max_ratio):
+            column = pc.dictionary_encode(column)
+            encoded.add(field.name)
+        else:
+            continue
+        table = table.set_column(idx, field.name, column)
+
+    if encoded:  # Extension dtypes of the metadata, e.g. `string`, win over dictionaries
+        table = _drop_pandas_dtypes(table, lambda column: column.get("field_name") in encoded)
+    return table
+
+
+def _drop_pandas_dtypes(table: pa.Table, predicate: Callable[[Dict], bool]) -> pa.Table:
+    """
+    Replace dtypes of the pandas metadata columns matching the predicate with `object`,
+    so that the columns are converted according to their Arrow types instead.
+    """
+    metadata = table.schema.metadata or {}
+    if b"pandas" not in metadata:
+        return table
+    pandas_metadata = json.loads(metadata[b"pandas"])
+    columns = [column for column in pandas_metadata.get("columns", []) if predicate(column)]
+    if not columns:
+        return table
+    for column in columns:
+        column["numpy_type"] = "object"
+    return table.replace_schema_metadata({**metadata, b"pandas": json.dumps(pandas_metadata).encode()})
+
+
+def encode_frame_string_dictionaries(df: pd.DataFrame, ddl_schema: Dict, max_ratio: float = 0) -> pd.DataFrame:
+    """
+    Convert STRING columns of a DataFrame with few distinct values to `category`,
+    the same way `encode_string_dictionaries` does for Arrow tables. Columns that are `category` already are kept.
+
+    Args:
+        df: Target pd.DataFrame. It is modified in place.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+        max_ratio: Maximum ratio of distinct values to rows of an encoded column. 0 disables encoding.
+    Returns:
+        The pd.DataFrame.
+
+    Example Usage:
+
+    >>> df = pd.DataFrame({"host": ["a", "b", "a", "a"], "id": ["1", "2", "3", "4"]}, dtype="string")
+    >>> encode_frame_string_dictionaries(df, {"host": "STRING", "id": "STRING"}, max_ratio=0.5).dtypes
+    host    category
+    id        string
+    dtype: object
+    """
+    if max_ratio <= 0 or len(df) == 0:
+        return df
+    for field, ddl_type in ddl_schema.items():
+        if ddl_type != "STRING" or field not in df.columns or isinstance(df[field].dtype, pd.CategoricalDtype):
+            continue
+        try:
+            column = pa.array(df[field], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):  # Not only strings
+            continue
+        if (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)) \
+                and _low_cardinality(column, max_ratio):
+            df[field] = pc.dictionary_encode(column).to_pandas().values
+    return df
+
+
+def cast_arrow_table(table: pa.Table, ddl_schema: Dict, arrays: bool = False) -> pa.Table:
+    """
+    Cast columns of an Arrow table to the types defined by DDL schema.
+    Only the columns with a different type are cast, the rest of the table is left untouched (zero-copy).
+    Dictionary-encoded columns with values of the right type are kept.
+    Columns that cannot be cast are left as they are, just like `astype(..., errors='ignore')` would do.
+
+    Args:
+        table: Target pa.Table.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+        arrays: Cast ARRAY columns as well, see `ddl_to_arrow_type`.
+    Returns:
+        A pa.Table with cast columns.
+
+    Example Usage:
+
+    >>> import pyarrow as pa
+    >>> table = pa.table({"a": pa.array([1, 2], pa.int64()), "b": pa.array([1.0, 2.0], pa.float64())})
+    >>> cast_arrow_table(table, {"a": "INT", "b": "DOUBLE"}).schema
+    a: int32
+    b: double
+    """
+    for idx, field in enumerate(table.schema):
+        ddl_type = ddl_schema.get(field.name, None)
+        target = ddl_to_arrow_type(ddl_type) if arrays and ddl_type is not None else DDL_TO_ARROW.get(ddl_type, None)
+        if target is None or field.type.equals(target):
+            continue
+        if pa.types.is_dictionary(field.type) and field.type.value_type.equals(target):
+            continue  # Kept by `encode_string_dictionaries`
+        try:
+            column = table.column(idx).cast(target)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            continue
+        table = table.set_column(idx, field.name, column)
+    return table
+
+
+def arrow_to_pandas(table: pa.Table, schema: Dict, ddl_schema: Dict, dictionary_ratio: float = 0,
+                    arrow_dtypes: bool = False) -> pd.DataFrame:
+    """
+    Convert an Arrow table to pd.DataFrame with dtypes defined by schema.
+    STRING columns with few distinct values are converted to `category`, see `encode_string_dictionaries`.
+    With `arrow_dtypes` STRING and ARRAY columns are converted to Arrow-backed dtypes without Python objects,
+    see `arrow_dtypes_schema`.
+    Casting is done inside Arrow where possible. The table is converted with `split_blocks` and `self_destruct`,
+    so the memory of the table is released during the conversion. The table must not be used afterwards.
+    Columns converted without copying, e.g. from memory-mapped files, would be read-only, so they are copied.
+
+    Args:
+        table: Target pa.Table. Should not be referenced anywhere else.
+        schema: Dictionary with fields as keys and Pandas dtypes as values. See `ddl_to_pd_schema`.
+        ddl_schema: Dictionary with fields as keys and DDL types as values. See `ddl_to_pd_schema`.
+        dictionary_ratio: Maximum ratio of distinct values to rows of `category` columns. 0 disables them.
+        arrow_dtypes: Convert STRING and ARRAY columns to Arrow-backed dtypes.
+    Returns:
+        A pd.DataFrame with data from the table.
+
+    Example Usage:
+
+    >>> import pyarrow as pa
+    >>> s, d = ddl_to_pd_schema("`a` BIGINT,`b` STRING")
+    >>> df = arrow_to_pandas(pa.table({"a": [1, None], "b": ["x", None]}), s, d)
+    >>> df.dtypes
+    a     Int64
+    b    string
+    dtype: object
+    """
+    if arrow_dtypes:
+        schema = arrow_dtypes_schema(schema, ddl_schema)
+    table = cast_arrow_table(encode_string_dictionaries(table, ddl_schema, dictionary_ratio), ddl_schema, arrow_dtypes)
+    # Pandas cannot restore `pd.ArrowDtype` of list columns from the metadata, they are mapped by their Arrow types
+    table = _drop_pandas_dtypes(table, lambda column: str(column.get("numpy_type")).endswith("[pyarrow]"))
+    df = table.to_pandas(split_blocks=True, self_destruct=True,
+                         types_mapper=_arrow_dtype if arrow_dtypes else ARROW_TO_PANDAS.get)
+    del table
+
+    # Arrow cannot produce some of the dtypes directly (e.g. nullable Int64), those are cast per column
+    df = cast_frame(df, schema, keep_categories=True)
+
+    for field in df.columns:
+        values = df[field].values
+        if isinstance(values, np.ndarray) and not values.flags.writeable:
+            df[field] = values  # Setting a column copies the array
+    return df
+
+
+def read_parquet_with_schema(schema_path: str, data_path: str, columns: Optional[Iterable[str]] = None,
+                             filters: Optional[str] = None, dictionary_ratio: float = 0,
+                             arrow_dtypes: bool = False) -> pd.DataFrame:
     """
-    Read parquet data and infer data types from schema
+    Read parquet data and infer data types from schema.
+    DDL types are applied inside Arrow before the conversion to Pandas, see `arrow_to_pandas`.
+    Data may be a single file or a folder with part files, see `write_parquet_with_schema`.
+    Part files are read concurrently.
 
     Args:
         schema_path: Path to schema file. Usually filename is _SCHEMA.
-        data_path: Path to file with data. Usually filename is data.
+        data_path: Path to file or folder with data. Usually filename is data.
+        columns: Columns to read. None means all columns.
+        filters: Filter expression, see `pp_exec_env.filters`.
+                 It is pushed down to the parquet reader, so row groups are skipped using min/max statistics.
+        dictionary_ratio: STRING columns with a lower estimated ratio of distinct values to rows are read
+                          as `category`, see `encode_string_dictionaries`. 0 disables it.
+        arrow_dtypes: STRING and ARRAY columns are read as Arrow-backed dtypes, see `arrow_dtypes_schema`.
     Returns:
         A pd.DataFrame with data from the files.
 
@@ -192,8 +860,67 @@ def read_parquet_with_schema(schema_path: str, data_path: str) -> pd.DataFrame:
     0      1644425044
     """
     schema, ddl_schema = read_schema(schema_path)
-    df = pd.read_parquet(data_path)
-    df = df.astype(schema, errors='ignore')
+    if columns is not None:
+        schema, ddl_schema, columns = project_schema(schema, ddl_schema, columns)
+    filters = to_arrow_expression(filters) if filters else None
+    df = arrow_to_pandas(pq.read_table(data_path, columns=columns, filters=filters, use_pandas_metadata=True),
+                         schema, ddl_schema, dictionary_ratio, arrow_dtypes)
+    df.index.name = "Index"
+    df.schema._initial_schema = ddl_schema  # Redefine initial schema to avoid upcasting as much as possible
+    return df
+
+
+def read_frame_with_schema(df: pd.DataFrame, ddl: str, columns: Optional[Iterable[str]] = None,
+                           filters: Optional[str] = None, dictionary_ratio: float = 0,
+                           arrow_dtypes: bool = False) -> pd.DataFrame:
+    """
+    Read a DataFrame that is still in memory after it was written with the given schema,
+    the same way it would be read from the storage: with columns, filters and the initial schema applied.
+
+    Args:
+        df: The written pd.DataFrame. It is modified and must not be used by anyone else.
+        ddl: DDL string that was written to the schema file.
+        columns: Columns to read. None means all columns.
+        filters: Filter expression, see `pp_exec_env.filters`.
+        dictionary_ratio: STRING columns with a lower estimated ratio of distinct values to rows are converted
+                          to `category`, see `encode_frame_string_dictionaries`. 0 disables it.
+        arrow_dtypes: STRING and ARRAY columns are converted to Arrow-backed dtypes, see `arrow_dtypes_schema`.
+    Returns:
+        A pd.DataFrame.
+
+    Example Usage:
+
+    >>> df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    >>> ndf = read_frame_with_schema(df.copy(), "`a` INT,`b` STRING", columns=["b", "a"], filters="a > 1")
+    >>> ndf
+          a  b
+    Index
+    0     2  y
+    1     3  z
+    >>> ndf.dtypes
+    a     int32
+    b    string
+    dtype: object
+    >>> ndf.schema._initial_schema
+    {'a': 'INT', 'b': 'STRING'}
+    """
+    schema, ddl_schema = ddl_to_pd_schema(ddl)
+    if columns is not None:
+        schema, ddl_schema, columns = project_schema(schema, ddl_schema, columns)
+    if arrow_dtypes:
+        schema = arrow_dtypes_schema(schema, ddl_schema)
+
+    # The same dtypes the readers produce, see `arrow_to_pandas`
+    df = cast_frame(df, schema, keep_categories=dictionary_ratio > 0)
+
+    if filters:
+        range_index = isinstance(df.index, pd.RangeIndex)
+        df = df.loc[to_pandas_mask(filters, df)]
+        if range_index:
+            df.index = pd.RangeIndex(len(df))  # Same as parquet
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    df = encode_frame_string_dictionaries(df, ddl_schema, dictionary_ratio)
     df.index.name = "Index"
     df.schema._initial_schema = ddl_schema  # Redefine initial schema to avoid upcasting as much as possible
     return df
@@ -213,34 +940,240 @@ def write_schema(df: pd.DataFrame, schema_path: str):
         file.write(df.schema.ddl)
 
 
-def write_jsonl_with_schema(df: pd.DataFrame, schema_path: str, data_path: str):
+def _encode_jsonl_rows(df: pd.DataFrame) -> str:
+    return df.to_json(lines=True, orient="records")
+
+
+def _encode_jsonl_chunks(df: pd.DataFrame, chunk_size: int, workers: int) -> Iterator[str]:
+    """
+    Encode DataFrame to jsonlines chunk by chunk, in order.
+    If `workers` is greater than 1, chunks are pickled to worker processes and encoded there,
+    with at most 2 chunks per worker in flight, so that memory stays bounded.
+    """
+    bounds = [(start, min(start + chunk_size, len(df))) for start in range(0, len(df), chunk_size)]
+    if workers <= 1:
+        for start, stop in bounds:
+            yield _encode_jsonl_rows(df.iloc[start:stop])
+        return
+
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)) as pool:
+        pending = deque()
+        for start, stop in bounds:
+            pending.append(pool.submit(_encode_jsonl_rows, df.iloc[start:stop]))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_jsonl_with_schema(df: pd.DataFrame, schema_path: str, data_path: str, chunk_size: int = 0,
+                            workers: int = 1):
     """
     Write data and schema to the provided folder in jsonlines format.
+    The output is the same regardless of `chunk_size` and `workers`.
 
     Args:
         df: Target pd.DataFrame.
         schema_path: Path for future schema.
         data_path: Path for future data.
+        chunk_size: If positive, the data is encoded and written in chunks of `chunk_size` rows,
+                    instead of building the whole output in memory.
+        workers: Amount of processes to encode chunks with. Only used when `chunk_size` is positive.
 
     No example usage due to side effects.
     """
     write_schema(df, schema_path)
-    df.to_json(data_path, lines=True, orient="records")
+    if ARROW_DTYPE is not None:  # Pandas cannot encode Arrow-backed lists to json
+        arrow_columns = [field for field, dtype in df.dtypes.items() if isinstance(dtype, ARROW_DTYPE)]
+        if arrow_columns:
+            df = df.copy(deep=False)
+            for field in arrow_columns:
+                df[field] = df[field].astype(OBJ_TYPE)
+    if chunk_size <= 0 or len(df) <= chunk_size:
+        df.to_json(data_path, lines=True, orient="records")
+        return
+
+    with open(data_path, 'w', encoding="utf-8") as file:
+        newline = True
+        for chunk in _encode_jsonl_chunks(df, chunk_size, workers):
+            if not newline:  # Some versions of Pandas do not end the last line with a newline
+                file.write("\n")
+            file.write(chunk)
+            newline = chunk.endswith("\n")
+
+
+def partition_rows(df: pd.DataFrame, part_rows: int = 0, partition_by: Optional[str] = None,
+                   partition_interval: Optional[float] = None) -> List[np.ndarray]:
+    """
+    Split rows of a DataFrame into parts.
+
+    Args:
+        df: Target pd.DataFrame.
+        part_rows: Maximum number of rows in a part. 0 means no limit.
+        partition_by: Column to partition by, rows with the same value go to the same parts.
+        partition_interval: Width of the buckets of a numeric `partition_by` column, e.g. 86400 for days of `_time`.
+    Returns:
+        A list of arrays with row positions of each part, at least one part is returned.
+
+    Example Usage:
+
+    >>> df = pd.DataFrame({"_time": [0, 90000, 100, 86400, 200]})
+    >>> partition_rows(df, part_rows=2)
+    [array([0, 1]), array([2, 3]), array([4])]
+    >>> partition_rows(df, partition_by="_time", partition_interval=86400)
+    [array([0, 2, 4]), array([1, 3])]
+    """
+    if partition_by is None:
+        groups = [np.arange(len(df))]
+    else:
+        keys = df[partition_by]
+        if partition_interval:
+            keys = keys // partition_interval
+        groups = [positions for positions in df.groupby(keys.to_numpy(), sort=True, dropna=False).indices.values()]
+        groups = groups or [np.arange(0)]
+
+    if part_rows > 0:
+        groups = [group[start:start + part_rows] for group in groups for start in range(0, len(group), part_rows)]
+    return groups or [np.arange(0)]
+
+
+def _remove_data(data_path: str):
+    """
+    Remove previously written data, either a single file or a folder with part files.
+    """
+    if os.path.isdir(data_path):
+        shutil.rmtree(data_path)
+    elif os.path.exists(data_path):
+        os.remove(data_path)
+
+
+def _write_parts(df: pd.DataFrame, data_path: str, write_table: Callable[[pa.Table, str], None], suffix: str,
+                 part_rows: int, partition_by: Optional[str], partition_interval: Optional[float], workers: int):
+    """
+    Write a DataFrame as a folder of part files in parallel, see `partition_rows`.
+    The table is converted once, so that all the parts share the same Arrow schema.
+    """
+    os.makedirs(data_path)
+    table = pa.Table.from_pandas(df, preserve_index=False if isinstance(df.index, pd.RangeIndex) else None)
+    parts = partition_rows(df, part_rows, partition_by, partition_interval)
+
+    def write_part(number: int, positions: np.ndarray):
+        if partition_by is None:  # Parts are contiguous
+            part = table.slice(positions[0] if len(positions) else 0, len(positions))
+        else:
+            part = table.take(positions)
+        write_table(part, os.path.join(data_path, f"part-{number:05d}.{suffix}"))
 
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        list(pool.map(write_part, range(len(parts)), parts))
 
-def write_parquet_with_schema(df: pd.DataFrame, schema_path: str, data_path: str):
+
+def write_parquet_with_schema(df: pd.DataFrame, schema_path: str, data_path: str, part_rows: int = 0,
+                              partition_by: Optional[str] = None, partition_interval: Optional[float] = None,
+                              workers: int = 1):
     """
     Write data and schema to the provided folder in parquet format.
+    If `part_rows` or `partition_by` is given, data is a folder with a dataset of part files
+    written in parallel, see `partition_rows`. Parts are read in the order of their names,
+    so rows of a partitioned DataFrame are grouped by the partitions.
+
+    Args:
+        df: Target pd.DataFrame.
+        schema_path: Path for future schema.
+        data_path: Path for future data.
+        part_rows: Maximum number of rows in a part file. 0 means no limit.
+        partition_by: Column to partition by.
+        partition_interval: Width of the buckets of a numeric `partition_by` column.
+        workers: Number of threads writing part files.
+
+    No example usage due to side effects.
+    """
+    write_schema(df, schema_path)
+    _remove_data(data_path)
+    if part_rows <= 0 and partition_by is None:
+        df.to_parquet(data_path, compression="snappy")
+    else:
+        _write_parts(df, data_path, functools.partial(pq.write_table, compression="snappy"), "parquet",
+                     part_rows, partition_by, partition_interval, workers)
+
+
+def read_arrow_with_schema(schema_path: str, data_path: str, columns: Optional[Iterable[str]] = None,
+                           filters: Optional[str] = None, dictionary_ratio: float = 0,
+                           arrow_dtypes: bool = False) -> pd.DataFrame:
+    """
+    Read Arrow IPC (Feather V2) data and infer data types from schema.
+    Files are memory-mapped, so uncompressed data is loaded without copying until the conversion to Pandas.
+    Data may be a single file or a folder with part files, see `write_arrow_with_schema`.
+
+    Args:
+        schema_path: Path to schema file. Usually filename is _SCHEMA.
+        data_path: Path to file or folder with data. Usually filename is data.
+        columns: Columns to read. None means all columns.
+        filters: Filter expression, see `pp_exec_env.filters`.
+        dictionary_ratio: STRING columns with a lower estimated ratio of distinct values to rows are read
+                          as `category`, see `encode_string_dictionaries`. 0 disables it.
+        arrow_dtypes: STRING and ARRAY columns are read as Arrow-backed dtypes, see `arrow_dtypes_schema`.
+    Returns:
+        A pd.DataFrame with data from the files.
+
+    Example Usage:
+
+    >>> import tempfile
+    >>> folder = tempfile.mkdtemp()
+    >>> df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    >>> write_arrow_with_schema(df, os.path.join(folder, "_SCHEMA"), os.path.join(folder, "data"))
+    >>> read_arrow_with_schema(os.path.join(folder, "_SCHEMA"), os.path.join(folder, "data"), filters="a > 1")
+           a  b
+    Index
+    0      2  y
+    1      3  z
+    """
+    schema, ddl_schema = read_schema(schema_path)
+    if columns is not None:
+        schema, ddl_schema, columns = project_schema(schema, ddl_schema, columns)
+
+    dataset = ds.dataset(data_path, format="ipc", filesystem=pafs.LocalFileSystem(use_mmap=True))
+    if columns is not None:  # Index columns are read as well, the same way parquet reader does
+        metadata = dataset.schema.pandas_metadata or {}
+        columns = columns + [column for column in metadata.get("index_columns", []) if isinstance(column, str)]
+    # Record batches are not split by the scanner, so a file of a single batch is converted without concatenation
+    table = dataset.to_table(columns=columns, filter=to_arrow_expression(filters) if filters else None,
+                             batch_size=2 ** 31 - 1)
+    df = arrow_to_pandas(table, schema, ddl_schema, dictionary_ratio, arrow_dtypes)
+    df.index.name = "Index"
+    df.schema._initial_schema = ddl_schema  # Redefine initial schema to avoid upcasting as much as possible
+    return df
+
+
+def write_arrow_with_schema(df: pd.DataFrame, schema_path: str, data_path: str, compression: Optional[str] = None,
+                            part_rows: int = 0, partition_by: Optional[str] = None,
+                            partition_interval: Optional[float] = None, workers: int = 1):
+    """
+    Write data and schema to the provided folder in Arrow IPC (Feather V2) format.
+    Such files are larger than parquet, but they are written and read with little to no encoding.
+    Part files are written the same way `write_parquet_with_schema` does.
 
     Args:
         df: Target pd.DataFrame.
         schema_path: Path for future schema.
         data_path: Path for future data.
+        compression: `lz4`, `zstd`, `uncompressed` or None. Compressed files cannot be read without copying.
+        part_rows: Maximum number of rows in a part file. 0 means no limit.
+        partition_by: Column to partition by.
+        partition_interval: Width of the buckets of a numeric `partition_by` column.
+        workers: Number of threads writing part files.
 
     No example usage due to side effects.
     """
     write_schema(df, schema_path)
-    df.to_parquet(data_path, compression="snappy")
+    _remove_data(data_path)
+    # Each file is a single record batch, so that uncompressed files are converted to Pandas in one piece
+    write_table = functools.partial(feather.write_feather, compression=compression or "uncompressed",
+                                    chunksize=2 ** 31 - 1)
+    if part_rows <= 0 and partition_by is None:
+        write_table(pa.Table.from_pandas(df), data_path)
+    else:
+        _write_parts(df, data_path, write_table, "arrow", part_rows, partition_by, partition_interval, workers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+from pp_exec_env import config
+from pp_exec_env.frame_cache import file_state
+from pp_exec_env.profiling import frame_memory
+from pp_exec_env.schema import read_arrow_with_schema, write_arrow_with_schema
+
+SCHEMA_FILE = "_SCHEMA"
+DATA_FILE = "data"
+LOCK_FILE = ".lock"
+RESERVATION_SUFFIX = ".reserved"
+
+logger = logging.getLogger(config["logging"]["base_logger"])
+
+
+class SharedMemoryStore:
+    """
+    Hands results of InterProcessing Storage over to other processes of the same host through shared memory.
+
+    Each published DataFrame is an uncompressed Arrow IPC segment with its schema in a folder of `root`,
+    normally a tmpfs such as /dev/shm, so readers memory-map it without touching the disk.
+    The index is a small JSON file per result path, pointing to its current segment
+    and keeping the state of the files the DataFrame was written to.
+    Readers hold a reference to the segment while loading it, unreferenced segments are removed
+    once their TTL is over or when a newer segment of the same path is published.
+    References left by crashed processes are ignored after another TTL.
+    The size of a segment is reserved before it is written, so that concurrent publishers keep `max_bytes`.
+    A missing or expired segment is not an error, the result is read from the disk instead,
+    as well as when any of the written files changed since the segment was published.
+
+    Example Usage:
+
+    >>> import tempfile
+    >>> store = SharedMemoryStore(tempfile.mkdtemp(), ttl=60, max_bytes=1024 * 1024)
+    >>> store.read("/ips/result") is None
+    True
+    >>> store.publish("/ips/result", pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}))
+    True
+    >>> store.read("/ips/result", columns=["b"], filters="a > 1")["b"].tolist()
+    ['y', 'z']
+    >>> store.stats()
+    {'hits': 1, 'misses': 1, 'published': 1, 'entries': 1, 'bytes': ...}
+    >>> store.invalidate("/ips/result")
+    >>> store.read("/ips/result") is None
+    True
+    """
+
+    def __init__(self, root: str, ttl: float, max_bytes: int):
+        """
+        Args:
+            root: Folder of the segments and of the index.
+            ttl: Seconds a segment lives after it was published.
+            max_bytes: Maximum total size of the segments, larger results are not published.
+        """
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+
+    @staticmethod
+    def _name(path: str) -> str:
+        return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+
+    def _index_path(self, name: str) -> str:
+        return os.path.join(self.root, name + ".json")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """
+        Lock the index for the processes of the host.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, name: str) -> Optional[Dict]:
+        try:
+            with open(self._index_path(name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, name: str, entry: Dict):
+        temp_path = self._index_path(name) + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(entry, file)
+        os.replace(temp_path, self._index_path(name))
+
+    def _remove_segment(self, segment: str):
+        shutil.rmtree(os.path.join(self.root, segment), ignore_errors=True)
+
+    def _release_segment(self, entry: Dict):
+        """
+        Remove the segment of an entry that is no longer in the index.
+        Segments with readers are left to `sweep`, which removes them after the readers had their TTL to finish.
+        """
+        if entry["refs"] <= 0:
+            self._remove_segment(entry["segment"])
+        else:
+            try:
+                os.utime(os.path.join(self.root, entry["segment"]))
+            except FileNotFoundError:
+                pass
+
+    def _entries(self) -> Iterable[str]:
+        return [name[:-len(".json")] for name in os.listdir(self.root) if name.endswith(".json")]
+
+    def _reservations(self) -> Iterable[str]:
+        return [name[:-len(RESERVATION_SUFFIX)] for name in os.listdir(self.root) if name.endswith(RESERVATION_SUFFIX)]
+
+    def _reservation_path(self, segment: str) -> str:
+        return os.path.join(self.root, segment + RESERVATION_SUFFIX)
+
+    @staticmethod
+    def _file_states(files: Iterable[str]) -> Dict[str, Optional[list]]:
+        """
+        States of the files in the form they take in the JSON index.
+        """
+        states = {}
+        for file in files:
+            state = file_state(file)
+            states[os.path.abspath(file)] = None if state is None else list(state)
+        return states
+
+    def _used_bytes(self, path: str) -> int:
+        """
+        Total size of the segments and reservations, except for the current segment of the path that is replaced.
+        """
+        used = sum(entry["bytes"] for entry in map(self._load, self._entries())
+                   if entry is not None and entry["path"] != os.path.abspath(path))
+        for segment in self._reservations():
+            try:
+                with open(self._reservation_path(segment)) as file:
+                    used += int(file.read())
+            except (OSError, ValueError):  # Released in the meantime
+                pass
+        return used
+
+    def publish(self, path: str, df: pd.DataFrame, files: Iterable[str] = ()) -> bool:
+        """
+        Publish a DataFrame as the current segment of the path.
+
+        Args:
+            path: Result path the DataFrame is read by.
+            df: Target pd.DataFrame.
+            files: Files the DataFrame was written to, the segment is not read once any of them changes.
+        Returns:
+            False if it does not fit into `max_bytes`, the path is not published then.
+        """
+        size = frame_memory(df, "sample")
+        name = self._name(path)
+        segment = f"{name}-{uuid.uuid4().hex}"  # Not visible to readers until the index points to it
+        self.sweep()
+        with self._locked():
+            fits = self._used_bytes(path) + size <= self.max_bytes
+            if fits:
+                with open(self._reservation_path(segment), "w") as file:
+                    file.write(str(size))
+        if not fits:
+            self.invalidate(path)
+            return False
+
+        try:
+            os.makedirs(os.path.join(self.root, segment))
+            write_arrow_with_schema(df, os.path.join(self.root, segment, SCHEMA_FILE),
+                                    os.path.join(self.root, segment, DATA_FILE))
+        except BaseException:
+            with self._locked():
+                os.remove(self._reservation_path(segment))
+            self._remove_segment(segment)
+            raise
+        with self._locked():
+            previous = self._load(name)
+            self._save(name, {"path": os.path.abspath(path), "segment": segment, "bytes": size,
+                              "expires": time.time() + self.ttl, "refs": 0, "files": self._file_states(files)})
+            os.remove(self._reservation_path(segment))
+        if previous is not None:
+            self._release_segment(previous)
+        self.published += 1
+        return True
+
+    def read(self, path: str, columns: Optional[Iterable[str]] = None, filters: Optional[str] = None,
+             dictionary_ratio: float = 0, arrow_dtypes: bool = False) -> Optional[pd.DataFrame]:
+        """
+        Read the current segment of the path, see `pp_exec_env.schema.read_arrow_with_schema`.
+
+        Returns:
+            The DataFrame or None if there is no segment.
+        """
+        name = self._name(path)
+        with self._locked():
+            entry = self._load(name)
+            if entry is None or entry["expires"] < time.time() \
+                    or not os.path.isdir(os.path.join(self.root, entry["segment"])) \
+                    or entry.get("files") != self._file_states(entry.get("files") or {}):  # Rewritten since
+                self.misses += 1
+                return None
+            entry["refs"] += 1
+            self._save(name, entry)
+
+        segment = os.path.join(self.root, entry["segment"])
+        error = None
+        try:
+            df = read_arrow_with_schema(os.path.join(segment, SCHEMA_FILE), os.path.join(segment, DATA_FILE),
+                                        columns=columns, filters=filters, dictionary_ratio=dictionary_ratio,
+                                        arrow_dtypes=arrow_dtypes)
+        except (OSError, pa.ArrowException) as e:  # Removed in the meantime or broken by a crashed publisher
+            error = e
+        finally:
+            with self._locked():
+                current = self._load(name)
+                if current is not None and current["segment"] == entry["segment"]:
+                    current["refs"] -= 1
+                    self._save(name, current)
+
+        if error is not None:
+            logger.warning(f"Shared memory segment of {path} cannot be read, reading the files: {error!r}")
+            self.misses += 1
+            self.invalidate(path, entry["segment"])
+            return None
+        self.hits += 1
+        return df
+
+    def invalidate(self, path: str, segment: Optional[str] = None):
+        """
+        Remove the segment of the path, e.g. when it is written without publishing.
+        Readers that already loaded it keep their memory-mapped data.
+
+        Args:
+            path: Result path.
+            segment: Remove the segment only if it is still the current one of the path.
+        """
+        name = self._name(path)
+        with self._locked():
+            entry = self._load(name)
+            if entry is None or segment is not None and entry["segment"] != segment:
+                return
+            os.remove(self._index_path(name))
+        self._release_segment(entry)
+
+    def sweep(self):
+        """
+        Remove expired segments and segments that are no longer in the index.
+        Reservations left by crashed publishers are removed after the TTL.
+        """
+        now = time.time()
+        with self._locked():
+            names = self._entries()
+            live = set()
+            for segment in self._reservations():
+                reservation_path = self._reservation_path(segment)
+                if os.stat(reservation_path).st_mtime + self.ttl < now:
+                    os.remove(reservation_path)
+                else:
+                    live.add(segment)
+            for name in names:
+                entry = self._load(name)
+                if entry is None:
+                    continue
+                if entry["expires"] < now and (entry["refs"] <= 0 or entry["expires"] + self.ttl < now):
+                    os.remove(self._index_path(name))
+                else:
+                    live.add(entry["segment"])
+            for segment in os.listdir(self.root):
+                segment_path = os.path.join(self.root, segment)
+                if segment not in live and os.path.isdir(segment_path) \
+                        and os.stat(segment_path).st_mtime + self.ttl < now:
+                    self._remove_segment(segment)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit, miss and publish counters of the process, number of segments and their total size in bytes.
+        """
+        with self._locked():
+            entries = [entry for entry in map(self._load, self._entries()) if entry is not None]
+        return {"hits": self.hits, "misses": self.misses, "published": self.published,
+                "entries": len(entries), "bytes": sum(entry["bytes"] for entry in entries)}
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
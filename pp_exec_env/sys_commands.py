@@ -1,48 +1,323 @@
+import logging
 import os
+import shutil
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from otlang.sdk.syntax import Keyword
 
 from pp_exec_env import config
 from pp_exec_env.base_command import BaseCommand, Syntax
+from pp_exec_env.dataframe import copy_on_write_enabled, share_frame
+from pp_exec_env.frame_cache import FrameCache, frame_key
 from pp_exec_env.schema import (
+    ARROW_DTYPE,
+    project_schema,
+    read_schema,
+    read_arrow_with_schema,
     read_parquet_with_schema,
     read_jsonl_with_schema,
+    read_frame_with_schema,
+    write_arrow_with_schema,
     write_parquet_with_schema,
     write_jsonl_with_schema
 )
+from pp_exec_env.shared_memory import SharedMemoryStore
+from pp_exec_env.writer import BackgroundWriter
 
 LPP = config["system_commands"]["local_storage_alias"]
 SPP = config["system_commands"]["shared_storage_alias"]
 IPS = config["system_commands"]["interproc_storage_alias"]
 DEFAULT_DATA_PATH = config["system_commands"]["data_file_name"]
 DEFAULT_SCHEMA_PATH = config["system_commands"]["schema_file_name"]
+JSONL_READ_CHUNK_SIZE = config.getint("system_commands", "jsonl_read_chunk_size")
+JSONL_WRITE_CHUNK_SIZE = config.getint("system_commands", "jsonl_write_chunk_size")
+JSONL_WRITE_WORKERS = config.getint("system_commands", "jsonl_write_workers")
+IPS_PART_ROWS = config.getint("system_commands", "ips_part_rows")
+IPS_WRITE_WORKERS = config.getint("system_commands", "ips_write_workers")
+IPS_FORMAT = config["system_commands"]["ips_format"]
+ARROW_COMPRESSION = config["system_commands"]["arrow_compression"]  # uncompressed, lz4 or zstd
+IPS_FORMATS = ("parquet", "arrow", "jsonl")  # Search order of the readers
+IPS_WRITE_FORMATS = ("parquet", "arrow")
+IPS_CACHE = config.getboolean("ips_cache", "enabled")
+IPS_CACHE_SIZE = config.getint("ips_cache", "max_size_mb") * 1024 * 1024
+IPS_CACHE_MEMORY = config["ips_cache"]["memory"]
+SHARED_MEMORY = config.getboolean("shared_memory", "enabled")
+SHARED_MEMORY_PATH = config["shared_memory"]["path"]
+SHARED_MEMORY_TTL = config.getfloat("shared_memory", "ttl")
+SHARED_MEMORY_SIZE = config.getint("shared_memory", "max_size_mb") * 1024 * 1024
+# STRING columns with fewer distinct values per row are read as `category`, 0 means never
+STRING_DICTIONARY_RATIO = config.getfloat("schema", "string_dictionary_max_ratio") \
+    if config.getboolean("schema", "string_dictionary") else 0
+# STRING and ARRAY columns are read as Arrow-backed dtypes
+ARROW_DTYPES = config.getboolean("schema", "arrow_dtypes")
+if ARROW_DTYPES and ARROW_DTYPE is None:
+    raise ValueError(f"arrow_dtypes option of config needs pd.ArrowDtype of Pandas 1.5 or newer, "
+                     f"Pandas {pd.__version__} is installed")
+
+logger = logging.getLogger(config["logging"]["base_logger"])
+
+# Shared by all executors of the process, so that results of InterProcessing Storage are reused across jobs
+ips_cache = FrameCache(IPS_CACHE_SIZE, IPS_CACHE_MEMORY) if IPS_CACHE else None
+# Shared by all processes of the host
+shared_store = SharedMemoryStore(SHARED_MEMORY_PATH, SHARED_MEMORY_TTL, SHARED_MEMORY_SIZE) if SHARED_MEMORY else None
+
+
+def data_files(data_path: str) -> List[str]:
+    """
+    Get the files of a result: the data file itself or the part files of a dataset folder.
+    Hidden files and files starting with an underscore are skipped, the same way parquet readers do.
+
+    Example Usage:
+
+    >>> data_files(os.path.join(os.curdir, "tests", "resources", "data", "simple_parquet", "data"))
+    ['./tests/resources/data/simple_parquet/data']
+    """
+    if not os.path.isdir(data_path):
+        return [data_path]
+    return sorted(os.path.join(data_path, name) for name in os.listdir(data_path)
+                  if not name.startswith(("_", ".")) and os.path.isfile(os.path.join(data_path, name)))
+
+
+def find_storage(ips_path: str, result_path: str) -> Tuple[str, str]:
+    """
+    Find the folder of a result in the InterProcessing Storage, trying the formats in `IPS_FORMATS` order.
+
+    Returns:
+        A tuple of the format and the path to the folder.
+
+    Example Usage:
+
+    >>> find_storage(os.path.join(os.curdir, "tests", "resources", "data"), "input_data")
+    ('jsonl', './tests/resources/data/input_data/jsonl')
+    """
+    for storage_format in IPS_FORMATS:
+        storage_path = os.path.join(ips_path, result_path, storage_format)
+        if os.path.exists(storage_path):
+            return storage_format, storage_path
+    raise ValueError(f"No {', '.join(IPS_FORMATS)} folder found there: {os.path.join(ips_path, result_path)}")
+
+
+def replace_storage(storage_path: str, write: Callable, df: pd.DataFrame):
+    """
+    Write a DataFrame into the folder of its format and remove the folders of the other formats of the result.
+    Background writes run all of it, so that the folders of a result change in the order of its writes.
+
+    Args:
+        storage_path: Path to the folder of the format, e.g. `output_data/parquet`.
+        write: Function writing the DataFrame into the folder.
+        df: Target pd.DataFrame.
+    """
+    result_path, storage_format = os.path.split(storage_path)
+    os.makedirs(storage_path, exist_ok=True)
+    for other_format in IPS_WRITE_FORMATS:
+        if other_format != storage_format:
+            shutil.rmtree(os.path.join(result_path, other_format), ignore_errors=True)
+    write(df)
+
+
+def publish_written(shared: SharedMemoryStore, result_path: str, files: List[str], write: Callable,
+                    df: pd.DataFrame):
+    """
+    Write a DataFrame and publish it to shared memory along with the state of the written files.
+    A failed publish is not an error, the readers of other processes read the files then.
+
+    Args:
+        shared: Shared memory of the host.
+        result_path: Path to the result in the InterProcessing Storage.
+        files: Paths to the written schema and data files.
+        write: Function writing the DataFrame.
+        df: Target pd.DataFrame.
+    """
+    write(df)
+    try:
+        shared.publish(result_path, df, files)
+    except OSError as error:  # E.g. no space left
+        logger.warning(f"Shared memory publish of {result_path} failed: {error!r}")
+        shared.invalidate(result_path)
+
+
+def interproc_stats(ips_path: str, result_path: str, columns: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Describe a result in the InterProcessing Storage without reading its data.
+    Columns and DDL types are taken from _SCHEMA, number of rows and sizes from the parquet footers
+    and from the record batches of memory-mapped Arrow files.
+    Number of rows of jsonl results is unknown and the size is the size of the whole file.
+
+    Args:
+        ips_path: Path to the InterProcessing Storage.
+        result_path: Path to the result relative to the storage.
+        columns: Columns to read. None means all columns.
+    Returns:
+        A dictionary with `path`, `format`, `columns` (DDL types of the columns to read),
+        `rows`, `bytes` (compressed size of the columns to read), `file_bytes` and `files` keys.
+
+    Example Usage:
+
+    >>> stats = interproc_stats(os.path.join(os.curdir, "tests", "resources", "data"), "input_data")
+    >>> stats["format"], stats["rows"], stats["columns"]
+    ('jsonl', None, {'a': 'LONG', 'b': 'LONG', 'c': 'STRING'})
+    """
+    storage_format, storage_path = find_storage(ips_path, result_path)
+    data_path = os.path.join(storage_path, DEFAULT_DATA_PATH)
+    schema, ddl_schema = read_schema(os.path.join(storage_path, DEFAULT_SCHEMA_PATH))
+    if columns is not None:
+        schema, ddl_schema, columns = project_schema(schema, ddl_schema, columns)
+    files = data_files(data_path)
+    file_bytes = sum(os.path.getsize(file) for file in files)
+    stats = {"path": storage_path, "format": storage_format, "columns": ddl_schema,
+             "rows": None, "bytes": file_bytes, "file_bytes": file_bytes, "files": len(files)}
+
+    if storage_format == "parquet":
+        read = set(ddl_schema)
+        stats["rows"] = stats["bytes"] = 0
+        for file in files:
+            metadata = pq.read_metadata(file)
+            stats["rows"] += metadata.num_rows
+            for group in range(metadata.num_row_groups):
+                row_group = metadata.row_group(group)
+                for idx in range(row_group.num_columns):
+                    column = row_group.column(idx)
+                    if column.path_in_schema.split(".")[0] in read:  # Nested columns have several leaves
+                        stats["bytes"] += column.total_compressed_size
+    elif storage_format == "arrow":  # Buffers of uncompressed files are not read, their sizes are in the metadata
+        stats["rows"] = stats["bytes"] = 0
+        for file in files:
+            with pa.memory_map(file) as source:
+                reader = pa.ipc.open_file(source)
+                for idx in range(reader.num_record_batches):
+                    batch = reader.get_batch(idx)
+                    stats["rows"] += batch.num_rows
+                    stats["bytes"] += sum(batch.column(column).nbytes for column in range(batch.num_columns)
+                                          if batch.schema.names[column] in ddl_schema)
+    return stats
+
+
+class WrittenFrame:
+    """
+    A DataFrame written to the InterProcessing Storage that is read again later in the same pipeline.
+    The reads are served from memory: the last one takes the kept frame, the others get copies of it.
+
+    Example Usage:
+
+    >>> written = WrittenFrame(reads=2)
+    >>> written.put(pd.DataFrame({"a": [1, 2]}))
+    >>> df, ddl = written.take()
+    >>> ddl, written.available
+    ('`a` LONG', True)
+    >>> df, ddl = written.take()
+    >>> written.available
+    False
+    """
+
+    def __init__(self, reads: int):
+        self.reads = reads
+        self._df: Optional[pd.DataFrame] = None
+        self._ddl: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        return self._df is not None
+
+    def put(self, df: pd.DataFrame):
+        """
+        Keep a copy of the written DataFrame, so that the commands between the write and the reads
+        cannot modify it. With Copy-on-Write enabled the copy is shallow.
+        """
+        self._ddl = df.schema.ddl  # Already computed by the writer
+        self._df = df.copy(deep=not copy_on_write_enabled())
+
+    def take(self) -> Tuple[pd.DataFrame, str]:
+        self.reads -= 1
+        if self.reads > 0:
+            return self._df.copy(deep=not copy_on_write_enabled()), self._ddl
+        df, self._df = self._df, None
+        return df, self._ddl
 
 
 class SysReadInterProcCommand(BaseCommand):
     """
     An implementation of `ReadIPS` system command,
-    which reads parquet and jsonl result files with schema from the InterProcessing Storage.
+    which reads parquet, Arrow IPC and jsonl result files with schema from the InterProcessing Storage.
+    The formats are tried in `IPS_FORMATS` order.
+
+    Optional `columns` keyword is a comma separated list of columns to read.
+    If it is not given, CommandExecutor may set `projection` inferred from the rest of the pipeline,
+    which is possible only if the commands that follow define `BaseCommand.required_columns`.
+
+    Optional `filter` keyword is a filter expression, e.g. `_time >= 1644423843 and host == "a"`.
+    See `pp_exec_env.filters` for the supported syntax.
+
+    If `cache` is set, read DataFrames are kept in memory and reused while the files are unchanged.
+    If `written` is set and the path was written earlier in the same pipeline, the written DataFrame is used
+    instead of the files. If `shared` is set and another process of the host published the path
+    to shared memory, the published segment is memory-mapped instead of reading the files.
+    If `writer` is set, pending background writes of the path are waited for.
+
+    STRING columns with few distinct values are read as `category` if `string_dictionary` is enabled in config,
+    their DDL type stays STRING.
     """
     syntax = Syntax([Keyword("path", required=True),
-                     Keyword(name='storage_type', required=True)])
+                     Keyword(name='storage_type', required=True),
+                     Keyword(name='columns', required=False),
+                     Keyword(name='filter', required=False)])
 
     ips_path = ""
+    projection: Optional[Set[str]] = None  # Set by CommandExecutor, None means all columns
+    cache: Optional[FrameCache] = ips_cache
+    shared: Optional[SharedMemoryStore] = shared_store
+    written: Optional[WrittenFrame] = None  # Set by CommandExecutor
+    writer: Optional[BackgroundWriter] = None  # Set by CommandExecutor
+
+    def get_columns(self) -> Optional[Set[str]]:
+        """
+        Get columns to read, either from `columns` keyword or from the inferred `projection`.
+        """
+        columns = self.get_arg("columns").value
+        if columns:
+            return {column.strip() for column in columns.split(',') if column.strip()}
+        return self.projection
+
+    def required_columns(self, output_columns: Optional[Set[str]]) -> Optional[Set[str]]:
+        return set()  # The input DataFrame is replaced
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         result_path = self.get_arg("path").value
-        full_parquet_path = os.path.join(self.ips_path, result_path, 'parquet')
-        full_jsonl_path = os.path.join(self.ips_path, result_path, 'jsonl')
-
-        if os.path.exists(full_parquet_path):
-            df = read_parquet_with_schema(os.path.join(full_parquet_path, DEFAULT_SCHEMA_PATH),
-                                          os.path.join(full_parquet_path, DEFAULT_DATA_PATH))
-        elif os.path.exists(full_jsonl_path):
-            df = read_jsonl_with_schema(os.path.join(full_jsonl_path, DEFAULT_SCHEMA_PATH),
-                                        os.path.join(full_jsonl_path, DEFAULT_DATA_PATH))
+        columns = self.get_columns()
+        filters = self.get_arg("filter").value
+        if self.written is not None and self.written.available:
+            return read_frame_with_schema(*self.written.take(), columns=columns, filters=filters,
+                                          dictionary_ratio=STRING_DICTIONARY_RATIO, arrow_dtypes=ARROW_DTYPES)
+        if self.shared is not None:
+            df = self.shared.read(os.path.join(self.ips_path, result_path), columns=columns, filters=filters,
+                                  dictionary_ratio=STRING_DICTIONARY_RATIO, arrow_dtypes=ARROW_DTYPES)
+            if df is not None:
+                return df
+        if self.writer is not None:
+            self.writer.wait(os.path.join(self.ips_path, result_path))
+
+        storage_format, storage_path = find_storage(self.ips_path, result_path)
+        schema_path = os.path.join(storage_path, DEFAULT_SCHEMA_PATH)
+        data_path = os.path.join(storage_path, DEFAULT_DATA_PATH)
+        if storage_format == "parquet":
+            read = partial(read_parquet_with_schema, schema_path, data_path)
+        elif storage_format == "arrow":
+            read = partial(read_arrow_with_schema, schema_path, data_path)
         else:
-            raise ValueError(f"No parquet or jsonl folder found there: {os.path.join(self.ips_path, result_path)}")
+            read = partial(read_jsonl_with_schema, schema_path, data_path, chunk_size=JSONL_READ_CHUNK_SIZE)
+        read = partial(read, columns=columns, filters=filters, dictionary_ratio=STRING_DICTIONARY_RATIO,
+                       arrow_dtypes=ARROW_DTYPES)
 
+        if self.cache is None:
+            return read()
+
+        key = frame_key(storage_path, [DEFAULT_DATA_PATH, DEFAULT_SCHEMA_PATH], columns, filters)
+        df = self.cache.get(key)
+        if df is None:
+            df = self.cache.put(key, read())
         return df
 
 
@@ -52,6 +327,8 @@ class SysWriteResultCommand(BaseCommand):
     which writes jsonl result files with schema in the desired storage.
 
     Available storage options: Local Postprocessing and Shared Postprocessing
+
+    If `writer` is set, the files are written in the background from a snapshot of the DataFrame.
     """
     syntax = Syntax([Keyword(name='path', required=True),
                      Keyword(name='storage_type', required=True)])
@@ -59,6 +336,7 @@ class SysWriteResultCommand(BaseCommand):
     ips_path = ""
     local_storage_path = ""
     shared_storage_path = ""
+    writer: Optional[BackgroundWriter] = None  # Set by CommandExecutor
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         result_path = self.get_arg("path").value
@@ -77,28 +355,82 @@ class SysWriteResultCommand(BaseCommand):
         full_data_path = os.path.join(jsonl_path, DEFAULT_DATA_PATH)
         full_schema_path = os.path.join(jsonl_path, DEFAULT_SCHEMA_PATH)
 
-        write_jsonl_with_schema(df, full_schema_path, full_data_path)
+        if self.writer is not None:
+            self.writer.submit(jsonl_path, write_jsonl_with_schema, share_frame(df), full_schema_path, full_data_path,
+                               chunk_size=JSONL_WRITE_CHUNK_SIZE, workers=JSONL_WRITE_WORKERS)
+        else:
+            write_jsonl_with_schema(df, full_schema_path, full_data_path,
+                                    chunk_size=JSONL_WRITE_CHUNK_SIZE, workers=JSONL_WRITE_WORKERS)
         return df
 
 
 class SysWriteInterProcCommand(BaseCommand):
     """
     An implementation of `WriteIPS` system command,
-    which writes parquet result files with schema in the InterProcessing Storage.
+    which writes parquet or Arrow IPC result files with schema in the InterProcessing Storage.
+
+    Optional `format` keyword is either `parquet` or `arrow`, the default is set in config.
+    Arrow files are larger, but they are written and read much faster, e.g. for hand-offs between workers
+    of the same node. The folder of the other format is removed, so that readers do not find an outdated result.
+
+    Optional `part_rows` keyword is the maximum number of rows in a part file,
+    optional `partition_by` keyword is a column to partition the result by,
+    with optional `partition_interval` width of its buckets, e.g. `partition_by=_time, partition_interval=86400`.
+    If any of them is given, the data is written as a folder of part files in parallel.
+    The default of `part_rows` is set in config.
+
+    Cached DataFrames previously read from the same path and its shared memory segment are dropped.
+    If `written` is set, the DataFrame is kept in memory for the reads of the path later in the pipeline.
+    If `writer` is set, the files are written in the background from a snapshot of the DataFrame.
+    If `shared` is set, the DataFrame is also published to shared memory for the readers of other processes
+    of the same host once the files are written, so that they do not read the files.
     """
     syntax = Syntax([Keyword(name='path', key='path', required=True),
-                     Keyword(name='storage_type',  required=True)])
+                     Keyword(name='storage_type',  required=True),
+                     Keyword(name='format', required=False),
+                     Keyword(name='part_rows', required=False),
+                     Keyword(name='partition_by', required=False),
+                     Keyword(name='partition_interval', required=False)])
 
     ips_path = ""
+    cache: Optional[FrameCache] = ips_cache
+    shared: Optional[SharedMemoryStore] = shared_store
+    written: Optional[WrittenFrame] = None  # Set by CommandExecutor
+    writer: Optional[BackgroundWriter] = None  # Set by CommandExecutor
 
     def transform(self, df: pd.DataFrame) -> pd.DataFrame:
         result_path = self.get_arg("path").value
+        storage_format = self.get_arg("format").value or IPS_FORMAT
+        if storage_format not in IPS_WRITE_FORMATS:
+            raise ValueError(f"Unknown format \"{storage_format}\", expected one of {IPS_WRITE_FORMATS}")
 
-        parquet_path = os.path.join(self.ips_path, result_path, "parquet")
-        os.makedirs(parquet_path, exist_ok=True)
+        storage_path = os.path.join(self.ips_path, result_path, storage_format)
+        full_data_path = os.path.join(storage_path, DEFAULT_DATA_PATH)
+        full_schema_path = os.path.join(storage_path, DEFAULT_SCHEMA_PATH)
 
-        full_data_path = os.path.join(parquet_path, DEFAULT_DATA_PATH)
-        full_schema_path = os.path.join(parquet_path, DEFAULT_SCHEMA_PATH)
-
-        write_parquet_with_schema(df, full_schema_path, full_data_path)
+        if self.cache is not None:
+            self.cache.invalidate(os.path.join(self.ips_path, result_path))
+        if self.shared is not None:  # Until the new files are written, it would still match the old ones
+            self.shared.invalidate(os.path.join(self.ips_path, result_path))
+        if storage_format == "arrow":
+            write = partial(write_arrow_with_schema, compression=ARROW_COMPRESSION)
+        else:
+            write = write_parquet_with_schema
+        part_rows = self.get_arg("part_rows").value
+        partition_interval = self.get_arg("partition_interval").value
+        write = partial(write, schema_path=full_schema_path, data_path=full_data_path,
+                        part_rows=IPS_PART_ROWS if part_rows is None else int(part_rows),
+                        partition_by=self.get_arg("partition_by").value or None,
+                        partition_interval=float(partition_interval) if partition_interval else None,
+                        workers=IPS_WRITE_WORKERS)
+        write = partial(replace_storage, storage_path, write)
+        if self.shared is not None:
+            write = partial(publish_written, self.shared, os.path.join(self.ips_path, result_path),
+                            [full_schema_path, full_data_path], write)
+        if self.writer is not None:
+            self.writer.submit(storage_path, write, share_frame(df))
+        else:
+            write(df)
+        if self.written is not None:
+            self.written.put(df)
         return df
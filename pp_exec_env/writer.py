@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
+
+from pp_exec_env import config
+
+logger = logging.getLogger(config["logging"]["base_logger"])
+
+
+class BackgroundWriter:
+    """
+    Runs writes of storage commands in a background thread, one by one in the order they were submitted,
+    so that the pipeline goes on while the results are serialized.
+    Writers get snapshots of DataFrames, see `pp_exec_env.dataframe.share_frame`.
+    Errors of the writes are raised by `wait`.
+
+    Example Usage:
+
+    >>> writer = BackgroundWriter()
+    >>> result = []
+    >>> writer.submit("/storage/a", result.append, 1)
+    >>> writer.submit("/storage/b", lambda: 1 / 0)
+    >>> writer.wait("/storage/a")
+    >>> result
+    [1]
+    >>> writer.wait()
+    Traceback (most recent call last):
+    ...
+    ZeroDivisionError: division by zero
+    >>> writer.pending
+    0
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None  # Started on the first write
+        self._writes: List[Tuple[str, Future]] = []  # Path and future of each pending write
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._writes)
+
+    def submit(self, path: str, function: Callable, *args, **kwargs):
+        """
+        Schedule a write.
+
+        Args:
+            path: Path that is written, reads of it wait for the write.
+            function: Function that writes.
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background-writer")
+            self._writes.append((os.path.abspath(path), self._executor.submit(function, *args, **kwargs)))
+
+    def wait(self, path: Optional[str] = None):
+        """
+        Wait for the pending writes and raise the error of the first failed one.
+
+        Args:
+            path: Wait only for the writes of the path and of its subfolders. None means all writes.
+        """
+        if path is not None:
+            path = os.path.abspath(path)
+        with self._lock:
+            writes = [(write_path, future) for write_path, future in self._writes
+                      if path is None or write_path == path or write_path.startswith(path + os.sep)]
+            self._writes = [write for write in self._writes if write not in writes]
+
+        wait([future for _, future in writes])
+        errors = [(write_path, future.exception()) for write_path, future in writes if future.exception() is not None]
+        for write_path, error in errors[1:]:
+            logger.error(f"Background write of {write_path} failed: {error!r}")
+        if errors:
+            raise errors[0][1]
+
+    def discard(self):
+        """
+        Wait for the pending writes of a failed job. Their errors are logged, not raised.
+        """
+        with self._lock:
+            writes, self._writes = self._writes, []
+        wait([future for _, future in writes])
+        for write_path, future in writes:
+            if future.exception() is not None:
+                logger.error(f"Background write of {write_path} failed: {future.exception()!r}")
+
+    def shutdown(self):
+        self.discard()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod(optionflags=doctest.ELLIPSIS | doctest.NORMALIZE_WHITESPACE)
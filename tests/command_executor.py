@@ -1,11 +1,19 @@
 import json
 import os
 import shutil
+import sys
+import time
 import unittest
+from unittest import mock
 
+import numpy as np
 import pandas as pd
 
+from pp_exec_env import command_executor
 from pp_exec_env.command_executor import CommandExecutor, SYS_WRITE_RESULT, SYS_WRITE_IPS, SYS_READ_IPS
+from pp_exec_env.manifest import MANIFEST_FILE, plugin_signature, syntax_to_json
+from pp_exec_env.profiling import process_rss
+from pp_exec_env.schema import read_parquet_with_schema
 from pp_exec_env.sys_commands import (
     SysWriteResultCommand,
     SysWriteInterProcCommand,
@@ -36,6 +44,11 @@ class TestCommandExecutor(unittest.TestCase):
         shutil.copytree(os.path.join(self.resources, "data", "input_data"), os.path.join(self.ips, "input_data"))
         shutil.copytree(os.path.join(self.resources, "data", "join_data"), os.path.join(self.ips, "join_data"))
 
+        # Keep the manifest of the test commands out of the resources folder
+        manifest_path = mock.patch.object(command_executor, "MANIFEST_PATH", os.path.join(self.tmp, "manifest.json"))
+        manifest_path.start()
+        self.addCleanup(manifest_path.stop)
+
     def tearDown(self):
         shutil.rmtree(self.tmp, ignore_errors=False)
         self.df = None
@@ -60,6 +73,204 @@ class TestCommandExecutor(unittest.TestCase):
         expected = "{'join': <class 'join.myjoin.JoinCommand'>, 'sum': <class 'sum.sum.SumCommand'>}"
         self.assertEqual(expected, commands.__str__())
 
+    def test_lazy_user_commands(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+
+        self.assertIn("sum", ce.command_classes)
+        self.assertFalse(ce.command_classes.is_loaded("sum"))
+        self.assertEqual("SumCommand", ce.command_classes["sum"].__name__)
+        self.assertTrue(ce.command_classes.is_loaded("sum"))
+        self.assertFalse(ce.command_classes.is_loaded("join"))
+
+    def test_broken_user_command(self):
+        commands = os.path.join(self.tmp, "commands")
+        shutil.copytree(self.commands, commands)
+        os.makedirs(os.path.join(commands, "broken"))
+        with open(os.path.join(commands, "broken", "__init__.py"), "w") as file:
+            file.write("import not_existing_module\n")
+
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, commands, boilerplate_progress_log)
+        self.assertIn("broken", ce.command_classes)
+        with self.assertRaises(ModuleNotFoundError):
+            ce.command_classes["broken"]
+        self.assertEqual("SumCommand", ce.command_classes["sum"].__name__)
+
+    def test_manifest_syntax(self):
+        commands = os.path.join(self.tmp, "commands")
+        shutil.copytree(self.commands, commands)
+        storages = {IPS: self.ips, LPP: self.lpp, SPP: self.spp}
+        manifest_path = mock.patch.object(command_executor, "MANIFEST_PATH", "")  # Inside the commands directory
+        manifest_path.start()
+        self.addCleanup(manifest_path.stop)
+
+        ce = CommandExecutor(storages, commands, boilerplate_progress_log)
+        self.assertIn("sum", ce.get_command_syntax())
+        self.assertTrue(ce.command_classes.is_loaded("sum"))
+        with open(os.path.join(commands, MANIFEST_FILE)) as file:
+            self.assertEqual(syntax_to_json(ce.command_classes["sum"].syntax),
+                             json.load(file)["plugins"]["sum"]["syntax"])
+
+        ce = CommandExecutor(storages, commands, boilerplate_progress_log)
+        syntax = ce.get_command_syntax()
+        self.assertNotIn(MANIFEST_FILE, ce.command_classes)
+        self.assertEqual(set(ce.command_classes), set(syntax))
+        self.assertFalse(ce.command_classes.is_loaded("sum"))
+        self.assertEqual(syntax_to_json(ce.command_classes["sum"].syntax), syntax_to_json(syntax["sum"]))
+
+        with open(os.path.join(commands, "sum", "sum.py"), "a") as file:
+            file.write("\n# Changed\n")
+        ce = CommandExecutor(storages, commands, boilerplate_progress_log)
+        ce.get_command_syntax()
+        self.assertTrue(ce.command_classes.is_loaded("sum"))
+        self.assertFalse(ce.command_classes.is_loaded("join"))
+
+    def test_manifest_not_saved(self):
+        storages = {IPS: self.ips, LPP: self.lpp, SPP: self.spp}
+        with mock.patch.object(command_executor, "MANIFEST_PATH", os.path.join(self.tmp, "missing", "manifest.json")):
+            with self.assertLogs(level="WARNING") as logs:
+                for _ in range(2):
+                    CommandExecutor(storages, self.commands, boilerplate_progress_log).get_command_syntax()
+        self.assertEqual(1, len([line for line in logs.output if "cannot be saved" in line]))
+
+    def test_hot_reload(self):
+        commands = os.path.join(self.tmp, "commands")
+        shutil.copytree(self.commands, commands)
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, commands, boilerplate_progress_log)
+        ce._plugin_signatures = {name: plugin_signature(ce.command_classes.plugin_path(name)) for name in ["join", "sum"]}
+        old_sum = ce.command_classes["sum"]
+
+        with open(os.path.join(commands, "sum", "sum.py"), "a") as file:
+            file.write("\nSumCommand.version = 2\n")
+        shutil.copytree(os.path.join(commands, "sum"), os.path.join(commands, "sum2"))
+        shutil.rmtree(os.path.join(commands, "join"))
+        ce.reload_user_commands(force=True)
+
+        self.assertIsNot(old_sum, ce.command_classes["sum"])
+        self.assertEqual(2, ce.command_classes["sum"].version)
+        self.assertIn("sum2", ce.command_classes)
+        self.assertNotIn("join", ce.command_classes)
+        self.assertFalse([name for name in sys.modules if name == "sum" or name.startswith("sum.")])
+
+        with open(os.path.join(commands, "sum", "sum.py"), "a") as file:
+            file.write("\nraise ImportError\n")
+        ce.reload_user_commands(force=True)
+        self.assertEqual(2, ce.command_classes["sum"].version)  # The previous version is kept
+
+    def test_infer_projections(self):
+        read = SysReadInterProcCommand.__new__(SysReadInterProcCommand)
+        select = mock.Mock(**{"required_columns.return_value": {"a"}})  # Uses only column `a`
+        unknown = mock.Mock(**{"required_columns.return_value": None})  # Does not define `required_columns`
+        write = SysWriteResultCommand.__new__(SysWriteResultCommand)
+
+        CommandExecutor._infer_projections([read, select, write])
+        self.assertEqual({"a"}, read.projection)
+        CommandExecutor._infer_projections([read, unknown, select, write])
+        self.assertIsNone(read.projection)
+
+    def test_memory_budget(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+        ce._job_rss = process_rss()
+        with mock.patch("pp_exec_env.command_executor.MEMORY_BUDGET", 1024 * 1024):
+            ce._check_memory_budget("sum", 1)
+            data = np.ones(4 * 1024 * 1024)  # 32 MB
+            with self.assertRaisesRegex(MemoryError, r"Command sum \(#1\) exceeded the job memory budget of 1 MB"):
+                ce._check_memory_budget("sum", 1)
+        del data
+
+    def test_memory_watchdog(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+
+        def transform(df):
+            data = np.ones(4 * 1024 * 1024)  # 32 MB, freed before the command finishes
+            for _ in range(500):
+                if ce._watchdog.rss is not None:
+                    break
+                time.sleep(0.01)
+            del data
+            return df
+
+        hog = mock.Mock(spec=["transform", "required_columns"], transform=transform, required_columns=lambda _: None)
+        with mock.patch("pp_exec_env.command_executor.MEMORY_BUDGET", 1024 * 1024), \
+                mock.patch("pp_exec_env.command_executor.MEMORY_BUDGET_INTERVAL", 0.01), \
+                mock.patch.object(ce, "_create_command", return_value=hog):
+            with self.assertRaisesRegex(MemoryError, r"Command hog \(#0\) exceeded the job memory budget of 1 MB"):
+                ce.execute([{"name": "hog", "arguments": {}}])
+        self.assertIsNone(ce._watchdog)
+
+    def test_concurrent_subsearches(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+
+        def read(path):
+            return [{"name": SYS_READ_IPS, "arguments": {
+                "path": [{"value": path, "key": "path", "type": "term",
+                          "named_as": "", "group_by": [], "arg_type": "arg"}],
+                "storage_type": [{"value": "whatever", "key": "storage_type", "type": "term",
+                                  "named_as": "", "group_by": [], "arg_type": "arg"}]}}]
+
+        command = {"name": "join", "arguments": {
+            "left": [{"value": read("input_data"), "arg_type": "subsearch"}],
+            "right": [{"value": read("join_data"), "arg_type": "subsearch"}]}}
+        ce._prefetch_subsearches(command, None)
+        self.assertFalse(ce._subsearch_results)  # Disabled by default
+
+        workers = mock.patch("pp_exec_env.command_executor.SUBSEARCH_WORKERS", 4)
+        workers.start()
+        self.addCleanup(workers.stop)
+        write = json.loads(json.dumps(command))
+        write["arguments"]["right"][0]["value"].append({"name": SYS_WRITE_IPS, "arguments": {}})
+        ce._prefetch_subsearches(write, None)
+        self.assertFalse(ce._subsearch_results)  # Sequential, the other subsearch may read the written data
+
+        ce._prefetch_subsearches(command, None)
+        self.assertEqual(2, len(ce._subsearch_results))
+
+        ce.current_depth = 1
+        left = ce.execute(read("input_data"))
+        right = ce.execute(read("join_data"))
+        self.assertFalse(ce._subsearch_results)
+        self.assertTrue(left.equals(ce.execute(read("input_data"))))
+        self.assertTrue(right.equals(ce.execute(read("join_data"))))
+
+        with self.assertRaises(Exception):
+            ce._prefetch_subsearches({"name": "join", "arguments": {
+                "left": [{"value": read("input_data"), "arg_type": "subsearch"}],
+                "right": [{"value": read("not_existing"), "arg_type": "subsearch"}]}}, None)
+        self.assertEqual(1, ce.current_depth)
+
+    def test_common_subsearches(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+
+        with open(os.path.join(self.resources, "misc", "ce_otl.json")) as file:
+            join = json.load(file)[1]
+        join["arguments"]["jdf"][0]["value"][0]["name"] = SYS_READ_IPS
+        read = {"name": SYS_READ_IPS, "arguments": {
+            "path": [{"value": "input_data", "key": "path", "type": "term",
+                      "named_as": "", "group_by": [], "arg_type": "arg"}],
+            "storage_type": [{"value": "whatever", "key": "storage_type", "type": "term",
+                              "named_as": "", "group_by": [], "arg_type": "arg"}]}}
+        job = [read, join, json.loads(json.dumps(join))]  # The same subsearch twice
+
+        df = ce.execute(job)
+        self.assertEqual(["a", "b", "c", "d_x", "d_y"], list(df.columns))
+        reused = [step.get("reused_subsearches", 0) for step in ce.profile if step["depth"] == 0]
+        self.assertEqual([0, 0, 1], reused)
+        self.assertEqual(1, len([step for step in ce.profile if step["depth"] == 1]))
+
+    def test_subsearches_after_write(self):
+        ce = CommandExecutor({IPS: self.ips, LPP: self.lpp, SPP: self.spp}, self.commands, boilerplate_progress_log)
+
+        with open(os.path.join(self.resources, "misc", "ce_otl.json")) as file:
+            read, join, _, write, _ = json.load(file)
+        join["arguments"]["jdf"][0]["value"][0]["name"] = SYS_READ_IPS
+        write["arguments"]["path"][0]["value"] = "join_data"
+        job = [read, join, write, json.loads(json.dumps(join))]  # The second join reads the written data
+
+        df = ce.execute(job)
+        self.assertEqual(["a", "b_x", "c_x", "d_x", "b_y", "c_y", "d_y"], list(df.columns))
+        reused = [step.get("reused_subsearches", 0) for step in ce.profile if step["depth"] == 0]
+        self.assertEqual([0, 0, 0, 0], reused)
+        self.assertEqual(2, len([step for step in ce.profile if step["depth"] == 1]))
+
     def test_execute(self):
         ce = CommandExecutor({IPS: self.ips,
                               LPP: self.lpp,
@@ -90,6 +301,100 @@ class TestCommandExecutor(unittest.TestCase):
         self.assertTrue(os.path.exists(os.path.join(self.ips, "output_data", "parquet")))
         self.assertTrue(os.path.exists(os.path.join(self.lpp, "output_data", "jsonl")))
 
+        top_steps = [step for step in ce.profile if step["depth"] == 0]
+        self.assertEqual([command["name"] for command in job], [step["command"] for step in top_steps])
+        self.assertEqual((3, 4), (top_steps[-1]["rows_out"], top_steps[-1]["columns_out"]))
+        self.assertTrue(all(step["wall_time"] >= 0 for step in ce.profile))
+
+    def test_interproc_handoff(self):
+        ce = CommandExecutor({IPS: self.ips,
+                              LPP: self.lpp,
+                              SPP: self.spp},
+                             self.commands,
+                             boilerplate_progress_log)
+
+        with open(os.path.join(self.resources, "misc", "ce_otl.json")) as file:
+            job = json.load(file)
+
+        job[0]["name"] = SYS_READ_IPS
+        job[1]["arguments"]["jdf"][0]["value"][0]["name"] = SYS_READ_IPS
+        job[2]["name"] = SYS_WRITE_RESULT
+        job[2]["arguments"]["storage_type"][0]["value"] = LPP
+        job[3]["name"] = SYS_WRITE_IPS
+        job[4]["name"] = SYS_READ_IPS
+
+        results = []
+        for handoff in [False, True]:
+            with mock.patch("pp_exec_env.command_executor.INTERPROC_HANDOFF", handoff), \
+                    mock.patch("pp_exec_env.sys_commands.read_parquet_with_schema",
+                               wraps=read_parquet_with_schema) as reader:
+                results.append(ce.execute(json.loads(json.dumps(job))))
+            self.assertEqual(0 if handoff else 1, reader.call_count)  # The inputs are jsonl
+            self.assertTrue(os.path.exists(os.path.join(self.ips, "output_data", "parquet")))
+
+        self.assertTrue(results[0].equals(results[1]))
+        self.assertEqual(results[0].schema.ddl, results[1].schema.ddl)
+
+    def test_async_writes(self):
+        ce = CommandExecutor({IPS: self.ips,
+                              LPP: self.lpp,
+                              SPP: self.spp},
+                             self.commands,
+                             boilerplate_progress_log)
+
+        with open(os.path.join(self.resources, "misc", "ce_otl.json")) as file:
+            job = json.load(file)
+
+        job[0]["name"] = SYS_READ_IPS
+        job[1]["arguments"]["jdf"][0]["value"][0]["name"] = SYS_READ_IPS
+        job[2]["name"] = SYS_WRITE_RESULT
+        job[2]["arguments"]["storage_type"][0]["value"] = LPP
+        job[3]["name"] = SYS_WRITE_IPS
+        job[4]["name"] = SYS_READ_IPS
+
+        with mock.patch("pp_exec_env.command_executor.ASYNC_WRITES", True), \
+                mock.patch("pp_exec_env.command_executor.INTERPROC_HANDOFF", False):
+            df = ce.execute(json.loads(json.dumps(job)))
+            self.assertEqual(0, ce.writer.pending)
+            self.assertEqual(["a", "b", "c", "d"], list(df.columns))
+            self.assertTrue(os.path.exists(os.path.join(self.lpp, "output_data", "jsonl", "data")))
+
+            with mock.patch("pp_exec_env.sys_commands.write_parquet_with_schema", side_effect=OSError("disk full")):
+                with self.assertRaisesRegex(OSError, "disk full"):
+                    ce.execute(json.loads(json.dumps(job[:4])))
+            self.assertEqual(0, ce.writer.pending)
+
+    def test_explain(self):
+        ce = CommandExecutor({IPS: self.ips,
+                              LPP: self.lpp,
+                              SPP: self.spp},
+                             self.commands,
+                             boilerplate_progress_log)
+
+        with open(os.path.join(self.resources, "misc", "ce_otl.json")) as file:
+            job = json.load(file)
+
+        job[0]["name"] = SYS_READ_IPS
+        job[1]["arguments"]["jdf"][0]["value"][0]["name"] = SYS_READ_IPS
+        job[2]["name"] = SYS_WRITE_RESULT
+        job[3]["name"] = SYS_WRITE_IPS
+        job[4]["name"] = SYS_READ_IPS
+        job.append({"name": "unknown", "arguments": {}})
+
+        plan = ce.explain(job)
+        steps = plan["steps"]
+        self.assertEqual([command["name"] for command in job], [step["command"] for step in steps])
+        self.assertEqual("join.myjoin.JoinCommand", steps[1]["class"])
+        self.assertEqual({"a": "LONG", "b": "LONG", "c": "STRING"}, steps[0]["input"]["columns"])
+        self.assertEqual("jsonl", steps[0]["input"]["format"])
+
+        subsearch = steps[1]["subsearches"][0]["steps"][0]
+        self.assertEqual((SYS_READ_IPS, 1), (subsearch["command"], subsearch["depth"]))
+        self.assertEqual("memory", steps[4]["input"]["format"])  # Written earlier in the pipeline
+        self.assertIn("error", steps[5])
+        self.assertEqual(steps[0]["input"]["bytes"] + subsearch["input"]["bytes"], plan["read_bytes"])
+        self.assertFalse(os.path.exists(os.path.join(self.ips, "output_data")))  # Nothing was executed
+
     def test_full_pipeline(self):
         from otlang.otl import OTL
 
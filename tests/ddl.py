@@ -1,11 +1,22 @@
 import os
 import datetime
+import tempfile
 import unittest
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
+import pyarrow as pa
 
-from pp_exec_env.schema import read_jsonl_with_schema
+from pp_exec_env.dataframe import SchemaAccessor
+from pp_exec_env.schema import (
+    ddl_to_pd_schema,
+    read_jsonl_with_schema,
+    read_parquet_with_schema,
+    read_schema,
+    write_jsonl_with_schema,
+    write_parquet_with_schema
+)
 
 
 class TestDatetime(unittest.TestCase):
@@ -35,6 +46,18 @@ class TestDatetime(unittest.TestCase):
         self.assertEqual(self.df.schema.ddl, expected)
 
 
+class TestParquet(unittest.TestCase):
+    def test_writable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path, data_path = os.path.join(directory, "_SCHEMA"), os.path.join(directory, "data")
+            write_parquet_with_schema(pd.DataFrame({"a": [1, 2], "b": [1.5, 2.5]}), schema_path, data_path)
+            df = read_parquet_with_schema(schema_path, data_path)
+            df.loc[0, "a"] = 7
+            df.loc[1, "b"] = 0.5
+            self.assertEqual(df["a"].tolist(), [7, 2])
+            self.assertEqual(df["b"].tolist(), [1.5, 0.5])
+
+
 class TestBoolean(unittest.TestCase):
     def setUp(self):
         tests_path = "" if os.getcwd().endswith("tests") else "tests"
@@ -62,5 +85,171 @@ class TestBoolean(unittest.TestCase):
         self.assertEqual(self.df.schema.ddl, expected)
 
 
+class TestSchemaCache(unittest.TestCase):
+    def test_repeated_ddl(self):
+        df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+        self.assertEqual(df.schema.ddl, "`a` LONG,`b` STRING")
+        self.assertEqual(df.schema.ddl, "`a` LONG,`b` STRING")
+
+    def test_replaced_object_column(self):
+        df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+        self.assertEqual(df.schema.ddl, "`a` LONG,`b` STRING")
+        df["b"] = [[1], [2]]
+        self.assertEqual(df.schema.ddl, "`a` LONG,`b` ARRAY<LONG>")
+
+    def test_reused_address(self):
+        for _ in range(20):  # The new object column is usually allocated where the freed one was
+            df = pd.DataFrame({"a": pd.Series(["x"] * 10, dtype=object)})
+            self.assertEqual(df.schema.ddl, "`a` STRING")
+            df["a"] = np.ones(10)
+            df["a"] = pd.Series([[1]] * 10, dtype=object)
+            self.assertEqual(df.schema.ddl, "`a` ARRAY<LONG>")
+
+    def test_changed_columns(self):
+        df = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+        self.assertEqual(df.schema.ddl, "`a` LONG,`b` STRING")
+        df["a"] = df["a"].astype(np.float64)
+        df["c"] = [True, False]
+        del df["b"]
+        self.assertEqual(df.schema.ddl, "`a` DOUBLE,`c` BOOLEAN")
+
+
+class TestSampledInference(unittest.TestCase):
+    def setUp(self):
+        self.inference_mode = SchemaAccessor.inference_mode
+        SchemaAccessor.inference_mode = "sample"
+
+    def tearDown(self):
+        SchemaAccessor.inference_mode = self.inference_mode
+
+    def test_leading_empty_arrays(self):
+        df = pd.DataFrame({"a": [[] for _ in range(1000)] + [[1.5, 2]] * 1000})
+        self.assertEqual(df.schema.ddl, "`a` ARRAY<DOUBLE>")
+
+    def test_all_empty_arrays(self):
+        df = pd.DataFrame({"a": [[], []]})
+        self.assertEqual(df.schema.ddl, "`a` ARRAY<STRING>")
+
+    def test_numpy_arrays(self):
+        df = pd.DataFrame({"a": [np.array([], dtype=np.int32), np.array([1, 2], dtype=np.int32)]})
+        self.assertEqual(df.schema.ddl, "`a` ARRAY<INTEGER>")
+
+    def test_strings(self):
+        df = pd.DataFrame({"a": [None, "x", "y"]})
+        self.assertEqual(df.schema.ddl, "`a` STRING")
+
+    def test_categories(self):
+        df = pd.DataFrame({"a": pd.Categorical(["x", None, "x"]), "b": pd.Categorical([1, 2, 1])})
+        self.assertEqual(df.schema.ddl, "`a` STRING,`b` LONG")
+
+
+class TestDDLParsing(unittest.TestCase):
+    def test_nested_types(self):
+        ddl = "`a` ARRAY<STRUCT<`x`: INT, `y`: STRING>>,`b` MAP<STRING, DECIMAL(10,2)>,`c` BIGINT NOT NULL"
+        schema, ddl_schema = ddl_to_pd_schema(ddl)
+        self.assertEqual(list(ddl_schema.values()), ["ARRAY<STRUCT<`x`: INT, `y`: STRING>>", "MAP<STRING, DOUBLE>", "BIGINT"])
+        self.assertEqual(schema["a"], np.dtype(object))
+        self.assertEqual(schema["c"], pd.Int64Dtype())
+
+    def test_escaped_names(self):
+        _, ddl_schema = ddl_to_pd_schema("`a``b` STRING,`c,d` INT COMMENT 'e, f'")
+        self.assertEqual(ddl_schema, {"a`b": "STRING", "c,d": "INT"})
+
+    def test_cached_copies(self):
+        _, ddl_schema = ddl_to_pd_schema("`a` STRING")
+        ddl_schema["b"] = "INT"
+        self.assertEqual(ddl_to_pd_schema("`a` STRING")[1], {"a": "STRING"})
+
+    def test_rewritten_schema_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "_SCHEMA")
+            with open(path, "w") as file:
+                file.write("`a` STRING")
+            self.assertEqual(read_schema(path)[1], {"a": "STRING"})
+            with open(path, "w") as file:
+                file.write("`a` BIGINT")
+            self.assertEqual(read_schema(path)[1], {"a": "BIGINT"})
+
+
+class TestStringDictionary(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"host": pd.array(["a", "b", None, "a"] * 100, dtype="string"),
+                                "id": pd.array([str(idx) for idx in range(400)], dtype="string")})
+
+    def test_read_as_category(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path, data_path = os.path.join(directory, "_SCHEMA"), os.path.join(directory, "data")
+            for write, read in [(write_parquet_with_schema, read_parquet_with_schema),
+                                (write_jsonl_with_schema, read_jsonl_with_schema)]:
+                write(self.df, schema_path, data_path)
+                df = read(schema_path, data_path, dictionary_ratio=0.5)
+                self.assertIsInstance(df["host"].dtype, pd.CategoricalDtype)
+                self.assertEqual(df["id"].dtype, pd.StringDtype())
+                self.assertTrue(df["host"].astype("string").equals(read(schema_path, data_path)["host"]))
+                self.assertEqual(df.schema.ddl, "`host` STRING,`id` STRING")
+
+    def test_written_categories(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path, data_path = os.path.join(directory, "_SCHEMA"), os.path.join(directory, "data")
+            self.df["host"] = self.df["host"].astype("category")
+            write_parquet_with_schema(self.df, schema_path, data_path)
+            self.assertEqual(read_parquet_with_schema(schema_path, data_path)["host"].dtype, pd.StringDtype())
+            self.assertIsInstance(read_parquet_with_schema(schema_path, data_path, dictionary_ratio=0.5)["host"].dtype,
+                                  pd.CategoricalDtype)
+
+
+@unittest.skipIf(not hasattr(pd, "ArrowDtype"), "pd.ArrowDtype needs Pandas 1.5")
+class TestArrowDtypes(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"host": ["a", None, "b"], "tags": [[1, 2], None, []], "names": [["x"], ["y"], None]})
+
+    def test_ddl(self):
+        df = pd.DataFrame({"host": pd.array(["a", None], dtype="string[pyarrow]"),
+                           "tags": pd.Series([[], [1.5]], dtype=pd.ArrowDtype(pa.list_(pa.float32()))),
+                           "ids": pd.Series([[], []], dtype=pd.ArrowDtype(pa.list_(pa.int64())))})
+        self.assertEqual(df.schema.ddl, "`host` STRING,`tags` ARRAY<FLOAT>,`ids` ARRAY<LONG>")
+        df.schema._initial_schema = {"ids": "ARRAY<BIGINT>"}
+        self.assertEqual(df.schema.ddl, "`host` STRING,`tags` ARRAY<FLOAT>,`ids` ARRAY<BIGINT>")
+
+    def test_read_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path, data_path = os.path.join(directory, "_SCHEMA"), os.path.join(directory, "data")
+            for write, read in [(write_parquet_with_schema, read_parquet_with_schema),
+                                (write_jsonl_with_schema, read_jsonl_with_schema)]:
+                write(self.df, schema_path, data_path)
+                df = read(schema_path, data_path, arrow_dtypes=True)
+                self.assertEqual(df["host"].dtype, pd.StringDtype("pyarrow"))
+                self.assertEqual(df["tags"].dtype, pd.ArrowDtype(pa.list_(pa.int64())))
+                self.assertEqual(df["names"].dtype, pd.ArrowDtype(pa.list_(pa.string())))
+                self.assertEqual(df.schema.ddl, "`host` STRING,`tags` ARRAY<LONG>,`names` ARRAY<STRING>")
+
+                write(df, schema_path, data_path)  # Written from Arrow-backed columns
+                self.assertTrue(read(schema_path, data_path, arrow_dtypes=True).equals(df))
+                self.assertEqual(read(schema_path, data_path)["tags"].dtype, np.dtype("O"))
+
+
+class TestChunkedJsonl(unittest.TestCase):
+    def test_same_as_whole_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path, data_path = os.path.join(directory, "_SCHEMA"), os.path.join(directory, "data")
+            with open(schema_path, "w") as file:
+                file.write("`a` BIGINT,`b` BIGINT")
+            with open(data_path, "w") as file:
+                file.write('{"a":1,"b":1}\n{"a":null,"b":null}\n{"a":1.5,"b":2.0}\n{"a":3,"b":3}\n')
+            df = read_jsonl_with_schema(schema_path, data_path)
+            self.assertEqual([str(dtype) for dtype in df.dtypes], ["float64", "Int64"])
+            for chunk_size in (1, 2, 3):
+                self.assertTrue(read_jsonl_with_schema(schema_path, data_path, chunk_size=chunk_size).equals(df))
+
+    def test_write_workers(self):
+        df = pd.DataFrame({"a": np.arange(100), "b": [f"x{idx}" for idx in range(100)]})
+        with tempfile.TemporaryDirectory() as directory:
+            schema_path = os.path.join(directory, "_SCHEMA")
+            write_jsonl_with_schema(df, schema_path, os.path.join(directory, "data"))
+            write_jsonl_with_schema(df, schema_path, os.path.join(directory, "chunked"), chunk_size=7, workers=2)
+            with open(os.path.join(directory, "data")) as data, open(os.path.join(directory, "chunked")) as chunked:
+                self.assertEqual(data.read(), chunked.read())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -2,10 +2,17 @@ import unittest
 import os
 import shutil
 import logging
+import tempfile
+import threading
+import time
+from unittest import mock
 
+import numpy as np
 import pandas as pd
 
 from execution_environment.command_executor import GetArg
+from pp_exec_env.frame_cache import FrameCache
+from pp_exec_env.shared_memory import SharedMemoryStore
 from pp_exec_env.schema import (
     read_jsonl_with_schema,
     read_parquet_with_schema,
@@ -16,10 +23,12 @@ from pp_exec_env.sys_commands import (
     SysWriteResultCommand,
     SysWriteInterProcCommand,
     SysReadInterProcCommand,
+    interproc_stats,
     DEFAULT_SCHEMA_PATH,
     DEFAULT_DATA_PATH,
     IPS, LPP, SPP
 )
+from pp_exec_env.writer import BackgroundWriter
 
 
 class TestCommands(unittest.TestCase):
@@ -128,6 +137,236 @@ class TestCommands(unittest.TestCase):
                 self.assertTrue(ndf.equals(self.df))
                 self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
 
+    def test_sys_read_interproc_columns(self):
+        args = {
+            'path': [{'value': '', 'key': 'path', 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}],
+            'columns': [{'value': '_time', 'key': 'columns', 'type': 'term', 'named_as': '', 'group_by': [],
+                         'arg_type': 'arg'}]
+        }
+        self.df["extra"] = self.df["_time"] * 2
+        write_parquet_with_schema(self.df,
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_SCHEMA_PATH),
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_DATA_PATH))
+
+        for file_format in ["parquet", "jsonl"]:
+            with self.subTest(file_format=file_format):
+                args["path"][0]["value"] = f"read_input_{file_format}"
+                get_arg = GetArg(None, args)
+
+                cmd = SysReadInterProcCommand(get_arg, None)
+                ndf = cmd.transform(pd.DataFrame())
+
+                self.assertEqual(["_time"], list(ndf.columns))
+                self.assertEqual("`_time` BIGINT", ndf.schema.ddl)
+
+    def test_sys_read_interproc_filter(self):
+        self.df["_time"] += np.arange(len(self.df))  # All the rows of the resource have the same _time
+        write_jsonl_with_schema(self.df,
+                                os.path.join(self.ips, "read_input_jsonl", "jsonl", DEFAULT_SCHEMA_PATH),
+                                os.path.join(self.ips, "read_input_jsonl", "jsonl", DEFAULT_DATA_PATH))
+        write_parquet_with_schema(self.df,
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_SCHEMA_PATH),
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_DATA_PATH))
+        args = {
+            'path': [{'value': '', 'key': 'path', 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}],
+            'filter': [{'value': f'_time >= {self.df["_time"].iloc[-2]}', 'key': 'filter', 'type': 'term',
+                        'named_as': '', 'group_by': [], 'arg_type': 'arg'}]
+        }
+        expected = self.df.iloc[-2:].reset_index(drop=True)
+        expected.index.name = "Index"
+
+        for file_format in ["parquet", "jsonl"]:
+            with self.subTest(file_format=file_format):
+                args["path"][0]["value"] = f"read_input_{file_format}"
+                get_arg = GetArg(None, args)
+
+                cmd = SysReadInterProcCommand(get_arg, None)
+                ndf = cmd.transform(pd.DataFrame())
+
+                self.assertTrue(ndf.equals(expected))
+                self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
+
+    def test_sys_write_interproc_parts(self):
+        def arg(name, value):
+            return [{'value': value, 'key': name, 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}]
+
+        read_args = {'path': arg('path', 'output_data')}
+        expected = SysReadInterProcCommand(GetArg(None, {'path': arg('path', 'read_input_parquet')}), None)\
+            .transform(pd.DataFrame())
+
+        for keywords, parts in [({'part_rows': arg('part_rows', 5)}, 3),
+                                ({'partition_by': arg('partition_by', '_time'),
+                                  'partition_interval': arg('partition_interval', 10 ** 10)}, 1)]:
+            with self.subTest(keywords=list(keywords)):
+                write_args = {'path': arg('path', 'output_data'), 'storage_type': arg('storage_type', IPS), **keywords}
+                SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+
+                data_path = os.path.join(self.ips, "output_data", "parquet", DEFAULT_DATA_PATH)
+                self.assertTrue(os.path.isdir(data_path))
+                self.assertEqual(parts, len(os.listdir(data_path)))
+                self.assertEqual(parts, interproc_stats(self.ips, "output_data")["files"])
+
+                ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+                self.assertTrue(ndf.equals(expected))
+                self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
+
+        write_args = {'path': arg('path', 'output_data'), 'storage_type': arg('storage_type', IPS)}
+        SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+        self.assertTrue(os.path.isfile(os.path.join(self.ips, "output_data", "parquet", DEFAULT_DATA_PATH)))
+
+    def test_sys_write_interproc_arrow(self):
+        def arg(name, value):
+            return [{'value': value, 'key': name, 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}]
+
+        read_args = {'path': arg('path', 'output_data')}
+        write_args = {'path': arg('path', 'output_data'), 'storage_type': arg('storage_type', IPS)}
+        SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+        expected = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+
+        write_args['format'] = arg('format', 'arrow')
+        SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+        self.assertEqual(["arrow"], os.listdir(os.path.join(self.ips, "output_data")))
+        self.assertEqual(("arrow", len(self.df)), (interproc_stats(self.ips, "output_data")["format"],
+                                                   interproc_stats(self.ips, "output_data")["rows"]))
+
+        ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+        self.assertTrue(ndf.equals(expected))
+        self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
+
+        writer = BackgroundWriter()
+        with mock.patch.object(SysWriteInterProcCommand, "writer", writer):
+            for storage_format in ["parquet", "arrow", "parquet"]:
+                write_args['format'] = arg('format', storage_format)
+                SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+            writer.wait()
+        writer.shutdown()
+        self.assertEqual(["parquet"], os.listdir(os.path.join(self.ips, "output_data")))
+
+    def test_shared_memory_background_write(self):
+        def arg(name, value):
+            return [{'value': value, 'key': name, 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}]
+
+        read_args = {'path': arg('path', 'output_data')}
+        write_args = {'path': arg('path', 'output_data'), 'storage_type': arg('storage_type', IPS)}
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        store = SharedMemoryStore(root, ttl=60, max_bytes=1024 * 1024 * 1024)
+        writer = BackgroundWriter()
+        self.addCleanup(writer.shutdown)
+        with mock.patch.object(SysReadInterProcCommand, "shared", store), \
+                mock.patch.object(SysWriteInterProcCommand, "shared", store):
+            SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+
+            with mock.patch.object(SysReadInterProcCommand, "writer", writer), \
+                    mock.patch.object(SysWriteInterProcCommand, "writer", writer):
+                unblock = threading.Event()
+                writer.submit(os.path.join(self.ips, "output_data"), unblock.wait)  # Holds the writes back
+                SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df.iloc[:1])
+                threading.Timer(0.1, unblock.set).start()
+                ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+        self.assertEqual(1, len(ndf))
+
+    def test_shared_memory_store(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        size = self.df.memory_usage(deep=True).sum()
+        store = SharedMemoryStore(root, ttl=60, max_bytes=int(size * 1.5))
+        with open(os.path.join(root, "crashed.reserved"), "w") as file:  # Reserved by another publisher
+            file.write(str(size))
+        self.assertFalse(store.publish("first", self.df))
+        os.remove(os.path.join(root, "crashed.reserved"))
+        self.assertTrue(store.publish("first", self.df))
+        self.assertFalse(store.publish("second", self.df))
+        self.assertEqual([], [name for name in os.listdir(root) if name.endswith(".reserved")])
+
+        with mock.patch("time.time", return_value=time.time() + 50):
+            self.assertIsNotNone(store.read("first"))
+        with mock.patch("time.time", return_value=time.time() + 70):  # Reads do not extend the TTL
+            self.assertIsNone(store.read("first"))
+
+        store.invalidate("first")
+        self.assertTrue(store.publish("second", self.df))
+        segment, = [name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name))]
+        with open(os.path.join(root, segment, "data"), "r+b") as file:  # Left broken by a crashed publisher
+            file.truncate(16)
+        with self.assertLogs(level="WARNING"):
+            self.assertIsNone(store.read("second"))
+        self.assertEqual(0, store.stats()["entries"])
+
+    def test_interproc_stats(self):
+        self.df["extra"] = self.df["_time"] * 2
+        write_parquet_with_schema(self.df,
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_SCHEMA_PATH),
+                                  os.path.join(self.ips, "read_input_parquet", "parquet", DEFAULT_DATA_PATH))
+
+        stats = interproc_stats(self.ips, "read_input_parquet")
+        self.assertEqual(("parquet", len(self.df)), (stats["format"], stats["rows"]))
+        self.assertEqual(["_time", "extra"], list(stats["columns"]))
+
+        projected = interproc_stats(self.ips, "read_input_parquet", columns=["_time"])
+        self.assertEqual({"_time": "BIGINT"}, projected["columns"])
+        self.assertLess(projected["bytes"], stats["bytes"])
+
+        with self.assertRaises(ValueError):
+            interproc_stats(self.ips, "missing")
+
+    def test_sys_read_interproc_cache(self):
+        read_args = {
+            'path': [{'value': 'read_input_parquet', 'key': 'path', 'type': 'term', 'named_as': '', 'group_by': [],
+                      'arg_type': 'arg'}]
+        }
+        write_args = {
+            'path': [{'value': 'read_input_parquet', 'key': 'path', 'type': 'term', 'named_as': '', 'group_by': [],
+                      'arg_type': 'arg'}],
+            'storage_type': [{'value': IPS, 'key': 'storage_type', 'type': 'term', 'named_as': '', 'group_by': [],
+                              'arg_type': 'arg'}]
+        }
+        cache = FrameCache(max_bytes=1024 * 1024 * 1024)
+        with mock.patch.object(SysReadInterProcCommand, "cache", cache), \
+                mock.patch.object(SysWriteInterProcCommand, "cache", cache):
+            ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+            ndf["_time"] = 0  # Modifications must not reach the cached DataFrame
+            ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+            self.assertTrue(ndf.equals(self.df))
+            self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
+            self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+            SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df.iloc[:1])
+            self.assertEqual(0, cache.stats()["entries"])
+            ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+            self.assertEqual(1, len(ndf))
+            self.assertEqual((1, 2), (cache.hits, cache.misses))
+
+    def test_sys_read_interproc_shared_memory(self):
+        def arg(name, value):
+            return [{'value': value, 'key': name, 'type': 'term', 'named_as': '', 'group_by': [], 'arg_type': 'arg'}]
+
+        read_args = {'path': arg('path', 'output_data')}
+        write_args = {'path': arg('path', 'output_data'), 'storage_type': arg('storage_type', IPS)}
+        root = tempfile.mkdtemp()
+        store = SharedMemoryStore(root, ttl=60, max_bytes=1024 * 1024 * 1024)
+        try:
+            with mock.patch.object(SysReadInterProcCommand, "shared", store), \
+                    mock.patch.object(SysWriteInterProcCommand, "shared", store):
+                SysWriteInterProcCommand(GetArg(None, write_args), None).transform(self.df)
+                ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+                self.assertTrue(ndf.equals(self.df))
+                self.assertEqual(self.df.schema.ddl, ndf.schema.ddl)
+                ndf.loc[ndf.index[0], "_time"] = 0  # Memory-mapped data must not be read-only
+                self.assertEqual((1, 0, 1), (store.hits, store.misses, store.published))
+
+                storage_path = os.path.join(self.ips, "output_data", "parquet")
+                write_parquet_with_schema(self.df.iloc[:1], os.path.join(storage_path, DEFAULT_SCHEMA_PATH),
+                                          os.path.join(storage_path, DEFAULT_DATA_PATH))  # Without publishing
+                ndf = SysReadInterProcCommand(GetArg(None, read_args), None).transform(pd.DataFrame())
+                self.assertEqual(1, len(ndf))
+                self.assertEqual((1, 1), (store.hits, store.misses))
+
+                store.invalidate(os.path.join(self.ips, "output_data"))
+                self.assertEqual(0, store.stats()["entries"])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
 
 if __name__ == '__main__':
     unittest.main()